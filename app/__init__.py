@@ -1,3 +1,4 @@
+import os
 from flask import Flask, render_template, redirect, url_for, request  # ← Добавлен request
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, current_user
@@ -8,9 +9,10 @@ login_manager = LoginManager()
 login_manager.login_view = "auth.login"
 
 
-def create_app():
+def create_app(config_object=None):
     app = Flask(__name__)
-    app.config.from_object("config.Config")
+    # APP_CONFIG=config.ProductionConfig — профиль для gunicorn (WAL, пул, повторы записи)
+    app.config.from_object(config_object or os.environ.get("APP_CONFIG", "config.Config"))
     
     # Кэширование статических файлов
     @app.after_request
@@ -27,8 +29,68 @@ def create_app():
     Migrate(app, db)
     login_manager.init_app(app)
 
+    # PRAGMA SQLite на каждом соединении
+    from . import database
+    database.init_app(app)
+
+    # Метрики запросов, SQL и LLM на /metrics
+    from . import metrics
+    metrics.init_app(app)
+
+    # Профилирование по запросу и детектор N+1
+    from . import profiling
+    profiling.init_app(app)
+
+    # Колоночный кэш аналитики (включается ANALYTICS_CACHE_ENABLED=1)
+    from . import analytics_cache
+    analytics_cache.init_app(app)
+
+    # Месячные агрегаты со скетчами квантилей: команда flask rollups-rebuild
+    from . import rollups
+    rollups.init_app(app)
+
+    # Заполнение данных порциями с контрольными точками: команды flask backfill, backfill-status
+    from . import backfill
+    backfill.init_app(app)
+
+    # Подсказка категории по описанию: команда flask categorizer-train
+    from . import categorizer
+    categorizer.init_app(app)
+
+    # Советы LLM заранее: команда flask advice-pregenerate (запускать по расписанию, ночью)
+    from . import advice
+    advice.init_app(app)
+
+    # Курсы валют для операций в валюте: команда flask fx-load
+    from . import fx
+    fx.init_app(app)
+
+    # Ввод операций из Telegram: команда flask telegram-bot (отдельный процесс)
+    from . import telegram_bot
+    telegram_bot.init_app(app)
+
+    # Регулярные операции: команда flask recurring-materialize (запускать по расписанию)
+    from . import recurring
+    recurring.init_app(app)
+
+    # Архив старых операций: команда flask archive-cold
+    from . import archive
+    archive.init_app(app)
+
+    # Полнотекстовый поиск (FTS5): индекс для новой БД, команда flask search-rebuild
+    from . import search
+    search.init_app(app)
+
+    # Суммы хранятся в копейках — в рубли переводим только в шаблонах
+    from .money import format_money
+    app.add_template_filter(format_money, "money")
+    from .budgets import alert_message
+    app.add_template_filter(alert_message, "budget_alert")
+
     # Импорт моделей, чтобы Alembic их видел
     from .models import User, Family, Transaction  # noqa
+    # Номера изменений и следы удаления для офлайн-синхронизации (события ORM)
+    from . import sync  # noqa
 
     # Blueprint'ы
     from .auth_routes import auth_bp
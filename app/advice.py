@@ -0,0 +1,283 @@
+"""
+Входные данные для ai_service.generate_smart_advice
+
+build_inputs() собирает income_summary, expense_breakdown и large_expenses
+за последние ADVICE_MONTHS месяцев (включая текущий) без чтения всех
+операций: суммы по категориям — из месячных агрегатов MonthlyCategoryStat,
+крупные расходы — диапазон по индексу (контекст, type, amount_minor) от
+порога вниз, сколько бы операций ни было в истории.
+
+Категории сведены к top-N и строке «Прочее» (app/prompts.py). Результат
+детерминирован (строки упорядочены, суммы — копейки в тексте), поэтому
+cache_key() от него — ключ совета: пока данные те же, LLM повторно не
+вызывается.
+
+Советы хранятся в таблице advice, по строке на контекст. Их заранее готовит
+ночная команда flask advice-pregenerate: обходит контексты с операциями за
+окно, пропускает те, чей ключ не изменился с прошлого запуска, и вызывает
+LLM асинхронным клиентом — не больше ADVICE_CONCURRENCY запросов
+одновременно и ADVICE_RATE в секунду. Страница показывает сохранённый совет
+сразу; по кнопке совет пересчитывается, только если данные изменились.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from . import db
+from .analytics import category_names
+from .database import run_with_retry
+from .models import Advice, MonthlyCategoryStat, Transaction, User
+from .money import MINOR_PER_UNIT, format_money
+from .prompts import TOP_CATEGORIES, money_lines, top_n
+from .rollups import month_key
+from .scope import scope_key, transactions_query
+
+# крупный расход — больше 10 000 ₽, как в задании generate_smart_advice
+LARGE_EXPENSE_MINOR = 10000 * MINOR_PER_UNIT
+LARGE_EXPENSES_LIMIT = 10
+
+# готовых советов на одну транзакцию записи при пакетной генерации
+SAVE_BATCH = 50
+
+logger = logging.getLogger(__name__)
+
+
+def window(months, today=None):
+    """(первый месяц 'ГГГГ-ММ', начало первого месяца) для months месяцев по текущий"""
+    today = today or datetime.utcnow()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    start = datetime(index // 12, index % 12 + 1, 1)
+    return month_key(start), start
+
+
+def _lines(totals, whole=None):
+    """'Категория: сумма ₽ (доля%)': top-N по убыванию суммы и строка «Прочее»"""
+    return "\n".join(money_lines(top_n(totals.items(), TOP_CATEGORIES), whole))
+
+
+def build_inputs(user, months=None, today=None):
+    """Словарь для generate_smart_advice: суммы строками, порядок строк фиксирован"""
+    months = months or current_app.config["ADVICE_MONTHS"]
+    first_month, since = window(months, today)
+
+    rows = (
+        db.session.query(
+            MonthlyCategoryStat.type,
+            MonthlyCategoryStat.category_id,
+            func.sum(MonthlyCategoryStat.total_minor),
+        )
+        .filter(MonthlyCategoryStat.scope == scope_key(user), MonthlyCategoryStat.month >= first_month)
+        .group_by(MonthlyCategoryStat.type, MonthlyCategoryStat.category_id)
+        .all()
+    )
+    names = category_names(category_id for _, category_id, _ in rows)
+    totals = {"income": {}, "expense": {}}
+    for ttype, category_id, total in rows:
+        name = names.get(category_id, "Без категории")
+        totals[ttype][name] = totals[ttype].get(name, 0) + total
+    income = sum(totals["income"].values())
+    expense = sum(totals["expense"].values())
+
+    # диапазон по индексу от самых крупных: не зависит от длины истории
+    large = (
+        transactions_query(user)
+        .filter(
+            Transaction.type == "expense",
+            Transaction.amount_minor > LARGE_EXPENSE_MINOR,
+            Transaction.date >= since,
+        )
+        .order_by(Transaction.amount_minor.desc(), Transaction.id.desc())
+        .with_entities(Transaction.date, Transaction.category, Transaction.amount_minor, Transaction.description)
+        .limit(LARGE_EXPENSES_LIMIT)
+        .all()
+    )
+    large_lines = [
+        f"{day:%Y-%m-%d} {category}: {format_money(amount)} ₽" + (f" — {description}" if description else "")
+        for day, category, amount, description in large
+    ]
+
+    return {
+        "period": f"{first_month} — {month_key(today or datetime.utcnow())}",
+        "income_summary": _lines(totals["income"]) or "Нет данных",
+        "expense_breakdown": _lines(totals["expense"], expense) or "Нет данных",
+        "total_income": format_money(income),
+        "total_expense": format_money(expense),
+        "balance": format_money(income - expense),
+        "large_expenses": "\n".join(large_lines) or "Нет крупных расходов",
+    }
+
+
+def cache_key(inputs):
+    """Хэш входных данных: совпадает, пока совпадают агрегаты"""
+    payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stored(user):
+    """Сохранённый совет контекста (Advice) или None — без обращения к LLM"""
+    return db.session.get(Advice, scope_key(user))
+
+
+def _save(rows):
+    """[(контекст, ключ, текст)] -> таблица advice одной транзакцией"""
+    if not rows:
+        return
+    now = datetime.utcnow()
+    stmt = insert(Advice)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["scope"],
+        set_={"key": stmt.excluded.key, "text": stmt.excluded.text, "generated_at": stmt.excluded.generated_at},
+    )
+
+    def work():
+        db.session.execute(stmt, [
+            {"scope": scope, "key": key, "text": text, "generated_at": now} for scope, key, text in rows
+        ])
+
+    run_with_retry(work)
+
+
+def smart_advice(user):
+    """(текст совета, ключ): сохранённый, если данные не менялись, иначе новый от LLM"""
+    from .ai_service import generate_smart_advice
+
+    inputs = build_inputs(user)
+    key = cache_key(inputs)
+    row = stored(user)
+    if row is not None and row.key == key:
+        return row.text, key
+
+    text = generate_smart_advice(inputs)
+    # ошибку не сохраняем — следующий запрос попробует снова
+    if not text.startswith("Ошибка генерации"):
+        _save([(scope_key(user), key, text)])
+    return text, key
+
+
+# ---------- НОЧНАЯ ГЕНЕРАЦИЯ ----------
+
+class _RateLimiter:
+    """Не больше rate запусков в секунду, равномерно (rate 0 — без ограничения)"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next = 0.0
+
+    async def wait(self):
+        # между чтением и записью next нет await — блокировка не нужна
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next)
+        self.next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def pending(months=None, force=False):
+    """
+    Контексты с операциями за окно, чьи данные изменились с прошлого совета:
+    [(контекст, ключ, входные данные)] и число пропущенных без изменений
+    """
+    months = months or current_app.config["ADVICE_MONTHS"]
+    first_month, _ = window(months)
+
+    # любой участник семьи видит те же данные — берём первого
+    owners = {}
+    for owner in db.session.query(User.id, User.family_id).order_by(User.id):
+        owners.setdefault(scope_key(owner), owner)
+    active = (
+        db.session.query(MonthlyCategoryStat.scope)
+        .filter(MonthlyCategoryStat.month >= first_month)
+        .distinct()
+        .order_by(MonthlyCategoryStat.scope)
+        .all()
+    )
+    keys = dict(db.session.query(Advice.scope, Advice.key))
+
+    jobs = []
+    skipped = 0
+    for (scope,) in active:
+        owner = owners.get(scope)
+        if owner is None:
+            continue
+        inputs = build_inputs(owner, months)
+        key = cache_key(inputs)
+        if not force and keys.get(scope) == key:
+            skipped += 1
+            continue
+        jobs.append((scope, key, inputs))
+    db.session.rollback()  # только чтение — отпускаем снимок до долгих вызовов LLM
+    return jobs, skipped
+
+
+async def _generate(jobs, concurrency, rate, on_result):
+    """Советы по jobs через асинхронный клиент; on_result(контекст, ключ, текст | None)"""
+    from .ai_service import agenerate_smart_advice, async_client
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = _RateLimiter(rate)
+
+    async def one(scope, key, inputs):
+        async with semaphore:
+            await limiter.wait()
+            try:
+                return scope, key, await agenerate_smart_advice(aclient, inputs)
+            except Exception as exc:
+                logger.warning("Совет для %s не получен: %s", scope, exc)
+                return scope, key, None
+
+    async with async_client() as aclient:
+        for done in asyncio.as_completed([one(*job) for job in jobs]):
+            on_result(*await done)
+
+
+def pregenerate(concurrency=None, rate=None, months=None, force=False):
+    """
+    Готовит советы всех изменившихся контекстов и сохраняет их порциями
+    по SAVE_BATCH. Возвращает {'active', 'skipped', 'generated', 'failed', 'seconds'}
+    """
+    concurrency = concurrency or current_app.config["ADVICE_CONCURRENCY"]
+    rate = current_app.config["ADVICE_RATE"] if rate is None else rate
+    started = time.perf_counter()
+    jobs, skipped = pending(months, force)
+
+    batch = []
+    stats = {"active": len(jobs) + skipped, "skipped": skipped, "generated": 0, "failed": 0}
+
+    def on_result(scope, key, text):
+        if text is None:
+            stats["failed"] += 1
+            return
+        stats["generated"] += 1
+        batch.append((scope, key, text))
+        if len(batch) >= SAVE_BATCH:
+            _save(batch)
+            batch.clear()
+
+    if jobs:
+        asyncio.run(_generate(jobs, concurrency, rate, on_result))
+    _save(batch)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def init_app(app):
+    @app.cli.command("advice-pregenerate")
+    @click.option("--concurrency", type=int, default=None, help="одновременных запросов к LLM (ADVICE_CONCURRENCY)")
+    @click.option("--rate", type=float, default=None, help="запросов в секунду, 0 — без ограничения (ADVICE_RATE)")
+    @click.option("--force", is_flag=True, help="пересчитать и советы без изменений в данных")
+    def advice_pregenerate(concurrency, rate, force):
+        """Готовит советы LLM для всех активных семей (запускать по расписанию, ночью)."""
+        stats = pregenerate(concurrency, rate, force=force)
+        click.echo(
+            f"Контекстов: {stats['active']}, без изменений: {stats['skipped']}, "
+            f"готово: {stats['generated']}, ошибок: {stats['failed']}, {stats['seconds']} с"
+        )
@@ -1,59 +1,169 @@
+import logging
 import os
-from openai import OpenAI
+import time
+from openai import AsyncOpenAI, OpenAI
 from datetime import datetime
+from . import metrics
+from .prompts import TOP_CATEGORIES, Prompt, estimate_tokens, top_n
 
 client = OpenAI(
     api_key=os.getenv("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com"
+    # Можно указать локальный сервер (например, scripts/fake_llm_server.py для нагрузочных тестов)
+    base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 )
 
 
+def async_client():
+    """
+    Асинхронный клиент для пакетной генерации (app/advice.py). Создаётся на
+    каждый запуск: его соединения привязаны к циклу событий asyncio.run()
+    """
+    return AsyncOpenAI(
+        api_key=os.getenv("DEEPSEEK_API_KEY"),
+        base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+    )
+
+
+logger = logging.getLogger(__name__)
+
+# Бюджет промпта в токенах: меньше — быстрее и дешевле, больше — подробнее данные
+PROMPT_TOKENS = int(os.getenv("LLM_PROMPT_TOKENS", "700"))
+
+TOKEN_BUCKETS = (50, 100, 200, 400, 700, 1000, 1500, 2000, 4000)
+metrics.describe("llm_tokens_total", "counter", "Токены LLM (kind=prompt|completion)")
+metrics.describe("llm_prompt_tokens", "histogram", "Токенов в промпте одного вызова LLM", TOKEN_BUCKETS)
+metrics.describe("llm_completion_tokens", "histogram", "Токенов в ответе одного вызова LLM", TOKEN_BUCKETS)
+
+
+def _chat(operation, **kwargs):
+    """Вызов LLM с учётом количества, токенов и времени ответа в метриках"""
+    started = time.perf_counter()
+    status = "error"
+    usage = None
+    try:
+        response = client.chat.completions.create(**kwargs)
+        status = "ok"
+        usage = getattr(response, "usage", None)
+        return response
+    finally:
+        _record(operation, kwargs, status, usage, time.perf_counter() - started)
+
+
+async def _achat(aclient, operation, **kwargs):
+    """То же, что _chat, через асинхронный клиент"""
+    started = time.perf_counter()
+    status = "error"
+    usage = None
+    try:
+        response = await aclient.chat.completions.create(**kwargs)
+        status = "ok"
+        usage = getattr(response, "usage", None)
+        return response
+    finally:
+        _record(operation, kwargs, status, usage, time.perf_counter() - started)
+
+
+def _record(operation, kwargs, status, usage, elapsed):
+    """Количество, токены (из usage ответа) и время вызова — в метрики и лог"""
+    estimated = sum(estimate_tokens(m["content"]) for m in kwargs.get("messages", ()))
+    metrics.inc("llm_requests_total", operation=operation, status=status)
+    metrics.observe("llm_request_duration_seconds", elapsed, operation=operation)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if prompt_tokens is not None:
+        metrics.inc("llm_tokens_total", prompt_tokens, operation=operation, kind="prompt")
+        metrics.observe("llm_prompt_tokens", prompt_tokens, operation=operation)
+    if completion_tokens is not None:
+        metrics.inc("llm_tokens_total", completion_tokens, operation=operation, kind="completion")
+        metrics.observe("llm_completion_tokens", completion_tokens, operation=operation)
+    logger.info(
+        "LLM %s: %s, промпт %s ток. (оценка %s), ответ %s ток., %.2f с",
+        operation, status, prompt_tokens, estimated, completion_tokens, elapsed,
+    )
+
+
+def _lines(value):
+    """Многострочное поле входных данных (app/advice.py) -> список строк"""
+    if not value:
+        return []
+    return [line for line in str(value).splitlines() if line.strip()]
+
+
+def _smart_advice_request(user_data):
+    """Параметры вызова LLM для generate_smart_advice и agenerate_smart_advice"""
+    prompt = Prompt(PROMPT_TOKENS)
+    prompt.line(f"Данные семейного бюджета за {user_data.get('period', 'последние месяцы')}.")
+    prompt.line(
+        f"Доход {user_data.get('total_income', 0)} ₽, расход {user_data.get('total_expense', 0)} ₽, "
+        f"баланс {user_data.get('balance', 0)} ₽."
+    )
+    prompt.section("Доходы:", _lines(user_data.get('income_summary')), min_lines=1)
+    prompt.section("Расходы по категориям:", _lines(user_data.get('expense_breakdown')), min_lines=3)
+    prompt.section("Крупные расходы (>10000 ₽):", _lines(user_data.get('large_expenses')), min_lines=1)
+    prompt.line()
+    prompt.line(
+        "Задание: найди аномалии в структуре расходов и дай 3-5 конкретных советов с цифрами "
+        "(не «меньше тратьте»). Если велики траты на кафе и рестораны — посчитай долю от дохода, "
+        "предложи 2-3 домашних блюда взамен и экономию в рублях. Закончи планом на месяц."
+    )
+    return dict(
+        model="deepseek-chat",
+        messages=[
+            {"role": "system", "content": "Ты опытный финансовый консультант, который дает практичные советы с юмором и конкретными примерами."},
+            {"role": "user", "content": prompt.render()}
+        ],
+        temperature=0.8,
+        max_tokens=2000
+    )
+
+
 def generate_smart_advice(user_data):
     """
     Генерирует персонализированные советы на основе полных данных пользователя
     """
-    prompt = f"""
-Ты — финансовый аналитик-консультант. Проанализируй следующие данные о семейном бюджете:
-
-📊 ДОХОДЫ:
-{user_data.get('income_summary', 'Нет данных')}
+    try:
+        response = _chat("smart_advice", **_smart_advice_request(user_data))
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"Ошибка генерации советов: {str(e)}"
 
-💸 РАСХОДЫ ПО КАТЕГОРИЯМ:
-{user_data.get('expense_breakdown', 'Нет данных')}
 
-💰 ОБЩАЯ ИНФОРМАЦИЯ:
-- Общий доход: {user_data.get('total_income', 0)} ₽
-- Общий расход: {user_data.get('total_expense', 0)} ₽
-- Баланс: {user_data.get('balance', 0)} ₽
+async def agenerate_smart_advice(aclient, user_data):
+    """
+    То же через асинхронный клиент (пакетная генерация, app/advice.py).
+    Ошибку не прячет в текст: вызывающий решает, сохранять ли результат
+    """
+    response = await _achat(aclient, "smart_advice", **_smart_advice_request(user_data))
+    return response.choices[0].message.content
 
-🎯 КРУПНЫЕ РАСХОДЫ (>10000 ₽):
-{user_data.get('large_expenses', 'Нет крупных расходов')}
 
-ЗАДАНИЕ:
-1. Проанализируй структуру расходов и найди аномалии
-2. Дай 3-5 КОНКРЕТНЫХ, ОРИГИНАЛЬНЫХ советов (не банальные "меньше тратьте")
-3. Если есть категория "Рестораны/Еда вне дома" с большими тратами:
-   - Посчитай процент от дохода
-   - Предложи 2-3 вкусных домашних рецепта как альтернативу
-   - Покажи экономию в цифрах
-4. Предложи реалистичный план оптимизации на месяц
+def comment_insights(insights):
+    """
+    Короткий комментарий к готовым наблюдениям app/insights.py.
+    Не блокирует страницу: её показывают сразу, комментарий догружается.
+    None, если LLM недоступна
+    """
+    if not insights:
+        return None
+    prompt = Prompt(PROMPT_TOKENS)
+    prompt.section("Наблюдения по семейному бюджету:", [item["text"] for item in insights], min_lines=3)
+    prompt.line(
+        "Дай 2-3 конкретных совета (по одному предложению) именно по этим наблюдениям, с цифрами из них. "
+        "Не повторяй наблюдения и не добавляй общих фраз."
+    )
+    prompt = prompt.render()
 
-Ответ должен быть практичным, мотивирующим и с конкретными цифрами!
-"""
-    
     try:
-        response = client.chat.completions.create(
+        response = _chat(
+            "insights_comment",
             model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "Ты опытный финансовый консультант, который дает практичные советы с юмором и конкретными примерами."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.8,
-            max_tokens=2000
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.5,
+            max_tokens=300
         )
         return response.choices[0].message.content
-    except Exception as e:
-        return f"Ошибка генерации советов: {str(e)}"
+    except Exception:
+        return None
 
 
 def analyze_transaction(transaction_data):
@@ -86,7 +196,8 @@ def analyze_transaction(transaction_data):
 """
     
     try:
-        response = client.chat.completions.create(
+        response = _chat(
+            "transaction_tip",
             model="deepseek-chat",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
@@ -137,53 +248,40 @@ def simulate_budget_changes(current_data, changes):
     category_info = f"{category}" if category else "не выбрана"
     reduction_info = f"{reduce_percent}%" if reduce_percent > 0 else "0%"
     
-    # Детализация экономии
+    prompt = Prompt(PROMPT_TOKENS)
+    prompt.line(
+        f"Сейчас: доход {current_data['avg_monthly_income']:.0f} ₽/мес, расход {current_data['avg_monthly_expense']:.0f} ₽/мес, "
+        f"баланс {current_balance:.0f} ₽."
+    )
+    prompt.line(
+        f"Изменения: доход +{changes.get('increase_income', 0):.0f} ₽, "
+        f"сокращение «{category_info}» на {reduction_info}, период {months} мес."
+    )
     if reduction_amount > 0 and category:
-        monthly_saving = reduction_amount
-        yearly_saving = monthly_saving * 12
-        saving_details = f"💰 Экономия в категории «{category}»: {monthly_saving:.0f} ₽/мес ({yearly_saving:.0f} ₽/год)"
-    else:
-        saving_details = "📉 Сокращение расходов не запланировано"
-    
-    # GPT анализ
-    prompt = f"""
-Проанализируй финансовую симуляцию:
-
-📊 ТЕКУЩЕЕ СОСТОЯНИЕ:
-• Средний доход: {current_data['avg_monthly_income']:.0f} ₽/мес
-• Средний расход: {current_data['avg_monthly_expense']:.0f} ₽/мес
-• Текущий баланс: {current_balance:.0f} ₽
-
-🔄 ПЛАНИРУЕМЫЕ ИЗМЕНЕНИЯ:
-• Увеличение дохода: +{changes.get('increase_income', 0):.0f} ₽
-• Сокращение расходов в категории «{category_info}»: -{reduction_info}
-• Период симуляции: {months} месяцев
-
-{saving_details}
-
-📈 ПРОГНОЗ:
-• Новый доход: {new_income:.0f} ₽/мес
-• Новый расход: {new_expenses:.0f} ₽/мес  
-• Новый баланс: {new_balance:.0f} ₽/мес
-• Накопления за {months} мес: {projected_savings:.0f} ₽
-• Изменение баланса: {savings_increase_percent:+.1f}%
-
-🎯 ЗАДАНИЕ:
-1. ОЦЕНКА РЕАЛИСТИЧНОСТИ: Поставь оценку от 1 до 10 и объясни почему
-2. КОНКРЕТНЫЕ ШАГИ: Дай 3-4 практических совета для достижения этой цели
-3. АЛЬТЕРНАТИВЫ: Предложи 2 других способа увеличить накопления
-4. РИСКИ: Укажи возможные препятствия и как их избежать
-5. МОТИВАЦИЯ: Напиши короткое вдохновляющее резюме
-
-Ответ оформи красиво, используй эмодзи и четкую структуру.
-Будь практичным, как опытный financial advisor!
-"""
-    
+        prompt.line(f"Экономия в «{category}»: {reduction_amount:.0f} ₽/мес ({reduction_amount * 12:.0f} ₽/год).")
+    prompt.line(
+        f"Прогноз: доход {new_income:.0f} ₽/мес, расход {new_expenses:.0f} ₽/мес, баланс {new_balance:.0f} ₽/мес, "
+        f"накопления за {months} мес {projected_savings:.0f} ₽, изменение баланса {savings_increase_percent:+.1f}%."
+    )
+    by_category = top_n(current_data.get('expense_by_category', {}).items(), TOP_CATEGORIES)
+    prompt.section(
+        f"Расходы по категориям за {current_data.get('months_count', 1)} мес.:",
+        [f"{name}: {value:.0f} ₽" for name, value in by_category],
+        min_lines=3,
+    )
+    prompt.line()
+    prompt.line(
+        "Ответь по пунктам: 1) реалистичность от 1 до 10 и почему; 2) 3-4 практических шага; "
+        "3) 2 других способа увеличить накопления; 4) риски и как их обойти; 5) короткое резюме."
+    )
+    prompt = prompt.render()
+
     try:
-        response = client.chat.completions.create(
+        response = _chat(
+            "budget_simulation",
             model="deepseek-chat",
             messages=[
-                {"role": "system", "content": "Ты финансовый советник с 15-летним опытом. Помогаешь людям достигать финансовых целей. Даешь только конкретные, выполнимые советы с цифрами. Используешь эмодзи для наглядности."},
+                {"role": "system", "content": "Ты финансовый советник. Даёшь только конкретные, выполнимые советы с цифрами."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
@@ -228,7 +326,8 @@ def analyze_financial_health(user_data):
 4. 3 главные цели на ближайший год
 """
     try:
-        response = client.chat.completions.create(
+        response = _chat(
+            "financial_health",
             model="deepseek-chat",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
@@ -1,69 +1,116 @@
-from flask import Blueprint, render_template, request
+from flask import Blueprint, current_app, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
-from sqlalchemy import func
 from datetime import datetime, timedelta
-from .models import Transaction
+from .models import Transaction, Category
+from .scope import transactions_query
+from .money import to_units
+from . import advice, analytics, charts, insights, recurring
 
 analysis_bp = Blueprint("analysis", __name__, url_prefix="/analysis")
 
 
-@analysis_bp.route("/smart")
+@analysis_bp.route("/api/series")
 @login_required
-def smart():
-    # семейный или личный контекст
-    if current_user.family_id:
-        q = Transaction.query.filter_by(family_id=current_user.family_id)
-    else:
-        q = Transaction.query.filter_by(user_id=current_user.id)
-
-    # агрегируем по типу и категории
-    rows = (
-        q.with_entities(
-            Transaction.type,
-            Transaction.category,
-            func.sum(Transaction.amount).label("total"),
+def series_api():
+    """Ряды по периодам: ?from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД&granularity=day|week|month|year"""
+    try:
+        since, until, granularity = analytics.parse_range(request.args)
+        data = analytics.series(current_user, since, until, granularity)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(data)
+
+
+@analysis_bp.route("/api/chart")
+@login_required
+def chart_api():
+    """
+    Дневной ряд, прореженный до points точек:
+    ?metric=balance|income|expense|net&points=600&method=lttb|minmax&from=&to=
+    """
+    try:
+        since, until, _ = analytics.parse_range(request.args)
+        data = charts.chart_series(
+            current_user,
+            request.args.get("metric", "balance"),
+            since,
+            until,
+            request.args.get("points", 500, type=int),
+            request.args.get("method", "lttb"),
         )
-        .group_by(Transaction.type, Transaction.category)
-        .all()
-    )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(data)
 
-    insights = []
-    for ttype, cat, total in rows:
-        if ttype == "expense":
-            insights.append(f"Расходы на «{cat}»: {total:.2f} ₽.")
-        else:
-            insights.append(f"Доходы из источника «{cat}»: {total:.2f} ₽.")
 
-    return render_template("analysis/smart.html", rows=rows, insights=insights)
+@analysis_bp.route("/smart")
+@login_required
+def smart():
+    try:
+        since, until, granularity = analytics.parse_range(request.args)
+        data = analytics.series(current_user, since, until, granularity)
+    except ValueError as exc:
+        flash(str(exc))
+        return redirect(url_for("analysis.smart"))
+
+    # итоги по типу и категории за выбранный диапазон
+    rows = [
+        (c["type"], c["name"], sum(p["total"] for p in c["points"]))
+        for c in data["categories"]
+    ]
+
+    # правила по тем же агрегатам и заранее готовый совет — страница не ждёт LLM
+    llm_enabled = current_app.config["INSIGHTS_LLM_ENABLED"]
+    return render_template("analysis/smart.html", rows=rows, insights=insights.build(data),
+                           periods=data["periods"], granularity=granularity,
+                           llm_comment=llm_enabled,
+                           saved_advice=advice.stored(current_user) if llm_enabled else None)
+
+
+@analysis_bp.route("/api/insights/comment")
+@login_required
+def insights_comment():
+    """Комментарий LLM к наблюдениям за тот же диапазон (запрашивается страницей после загрузки)"""
+    if not current_app.config["INSIGHTS_LLM_ENABLED"]:
+        return jsonify({"comment": None})
+    from app.ai_service import comment_insights
+
+    try:
+        since, until, granularity = analytics.parse_range(request.args)
+        data = analytics.series(current_user, since, until, granularity)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"comment": comment_insights(insights.build(data))})
 
 
 @analysis_bp.route("/stats")
 @login_required
 def stats():
-    # семейный или личный контекст
-    if current_user.family_id:
-        q = Transaction.query.filter_by(family_id=current_user.family_id)
-    else:
-        q = Transaction.query.filter_by(user_id=current_user.id)
-
-    # статистика только по расходам
-    rows = (
-        q.filter_by(type="expense")
-         .with_entities(
-             Transaction.category,
-             func.count(Transaction.id).label("n"),
-             func.avg(Transaction.amount).label("avg"),
-             func.min(Transaction.amount).label("min"),
-             func.max(Transaction.amount).label("max"),
-             func.sum(Transaction.amount).label("total"),
-         )
-         .group_by(Transaction.category)
-         .all()
-    )
+    try:
+        since, until, _ = analytics.parse_range(request.args)
+    except ValueError as exc:
+        flash(str(exc))
+        return redirect(url_for("analysis.stats"))
+
+    # статистика только по расходам: (имя, n, среднее, мин, макс, сумма)
+    rows = analytics.expense_category_stats(current_user, since, until)
 
     return render_template("analysis/stats.html", rows=rows)
 
 
+@analysis_bp.route("/api/smart-advice")
+@login_required
+def smart_advice():
+    """
+    Подробные советы LLM по агрегатам последних месяцев (generate_smart_advice).
+    Страница запрашивает их по кнопке; при неизменных данных ответ — сохранённый совет
+    """
+    if not current_app.config["INSIGHTS_LLM_ENABLED"]:
+        return jsonify({"advice": None})
+    text, key = advice.smart_advice(current_user)
+    return jsonify({"advice": text, "key": key})
+
+
 # ---------- МЕНЮ СИМУЛЯТОРА ----------
 
 @analysis_bp.route("/simulator")
@@ -81,117 +128,96 @@ def simulator_gpt():
     """Интерактивный симулятор бюджета с GPT"""
     from app.ai_service import simulate_budget_changes
     
+    # Текущие данные пользователя нужны и форме, и симуляции
+    current_data = get_user_financial_data(current_user.id)
+    current_stats = {
+        'avg_income': round(current_data['avg_monthly_income'], 2),
+        'avg_expense': round(current_data['avg_monthly_expense'], 2),
+        'balance': round(current_data['avg_monthly_income'] - current_data['avg_monthly_expense'], 2),
+        'expense_by_category': current_data['expense_by_category'],
+        'categories': get_expense_categories(current_user.id),
+        # регулярные операции следующих 30 дней — вычислены по правилам, в БД их ещё нет
+        'upcoming': recurring.upcoming(current_user),
+    }
+
     if request.method == 'POST':
-        # Получаем данные из формы
+        # Получаем данные из формы (имена полей — как в шаблоне)
         changes = {
-            'reduce_category': request.form.get('category'),
-            'reduce_percent': float(request.form.get('reduce_percent', 0)),
-            'increase_income': float(request.form.get('increase_income', 0)),
+            'reduce_category': request.form.get('reduce_category'),
+            'reduce_percent': float(request.form.get('reduce_percent') or 0),
+            'increase_income': float(request.form.get('increase_income') or 0),
             'new_expense': request.form.get('new_expense'),
-            'simulation_months': int(request.form.get('months', 6))
+            'simulation_months': int(request.form.get('simulation_months') or 6)
         }
         
-        # Получаем текущие данные пользователя
-        current_data = get_user_financial_data(current_user.id)
-        
         # GPT анализирует изменения
         simulation_result = simulate_budget_changes(current_data, changes)
         
-        # Получаем категории для отображения формы после POST
-        categories = get_expense_categories(current_user.id)
-        current_stats = get_current_month_stats(current_user.id)
-        
         return render_template('analysis/simulator_gpt.html', 
                              result=simulation_result,
                              changes=changes,
-                             categories=categories,
-                             stats=current_stats)
+                             current_stats=current_stats)
     
     # GET - показываем форму
-    categories = get_expense_categories(current_user.id)
-    current_stats = get_current_month_stats(current_user.id)
-    
     return render_template('analysis/simulator_gpt.html', 
-                         categories=categories,
-                         stats=current_stats,
+                         current_stats=current_stats,
                          result=None,
                          changes=None)
 
 
 def get_user_financial_data(user_id):
-    """Получает полные финансовые данные пользователя"""
-    # Доходы и расходы за последние 3 месяца
-    three_months_ago = datetime.utcnow() - timedelta(days=90)
+    """
+    Получает финансовые данные пользователя для симулятора.
+    Агрегирует в БД целыми копейками, наружу отдаёт рубли — это вход для ai_service
+    """
+    # Доходы и расходы за последние 3 месяца (с начала дня)
+    three_months_ago = datetime.combine((datetime.utcnow() - timedelta(days=90)).date(), datetime.min.time())
     
     # Учитываем семейный контекст
-    if current_user.family_id:
-        q = Transaction.query.filter_by(family_id=current_user.family_id)
-    else:
-        q = Transaction.query.filter_by(user_id=user_id)
-    
-    transactions = q.filter(
-        Transaction.date >= three_months_ago
-    ).all()
+    data = analytics.series(current_user, since=three_months_ago, granularity='month')
     
-    income_total = sum(t.amount for t in transactions if t.type == 'income')
-    expense_total = sum(t.amount for t in transactions if t.type == 'expense')
+    income_total = sum(p['income'] for p in data['periods'])
+    expense_total = sum(p['expense'] for p in data['periods'])
     
     # Группировка расходов по категориям
-    expense_by_category = {}
-    for t in transactions:
-        if t.type == 'expense':
-            if t.category not in expense_by_category:
-                expense_by_category[t.category] = 0
-            expense_by_category[t.category] += t.amount
+    expense_by_category = {
+        c['name']: to_units(sum(p['total'] for p in c['points']))
+        for c in data['categories'] if c['type'] == 'expense'
+    }
     
-    # Безопасное деление
-    months_set = set()
-    for t in transactions:
-        months_set.add(t.date.strftime('%Y-%m'))
-    months_count = max(1, len(months_set) or 1)
+    # Безопасное деление: считаем только месяцы, в которых были операции
+    months_count = max(1, sum(1 for p in data['periods'] if p['income'] or p['expense']))
+
+    # Регулярные операции в среднем месяце — известная часть будущего бюджета
+    scheduled = recurring.monthly_estimate(current_user)
     
     return {
-        'total_income': income_total,
-        'total_expense': expense_total,
-        'balance': income_total - expense_total,
+        'total_income': to_units(income_total),
+        'total_expense': to_units(expense_total),
+        'balance': to_units(income_total - expense_total),
         'expense_by_category': expense_by_category,
-        'avg_monthly_income': income_total / months_count,
-        'avg_monthly_expense': expense_total / months_count,
-        'months_count': months_count
+        'avg_monthly_income': to_units(income_total) / months_count,
+        'avg_monthly_expense': to_units(expense_total) / months_count,
+        'months_count': months_count,
+        'scheduled_monthly_income': to_units(scheduled['income']),
+        'scheduled_monthly_expense': to_units(scheduled['expense']),
     }
 
 
 def get_expense_categories(user_id):
     """Получает список категорий расходов пользователя"""
-    if current_user.family_id:
-        q = Transaction.query.filter_by(family_id=current_user.family_id, type='expense')
-    else:
-        q = Transaction.query.filter_by(user_id=user_id, type='expense')
-    
-    categories = q.with_entities(Transaction.category).distinct().all()
-    return [c[0] for c in categories]
-
-
-def get_current_month_stats(user_id):
-    """Получает статистику за текущий месяц"""
-    now = datetime.utcnow()
-    month_start = datetime(now.year, now.month, 1)
-    
-    if current_user.family_id:
-        q = Transaction.query.filter_by(family_id=current_user.family_id)
-    else:
-        q = Transaction.query.filter_by(user_id=user_id)
-    
-    transactions = q.filter(Transaction.date >= month_start).all()
-    
-    income = sum(t.amount for t in transactions if t.type == 'income')
-    expense = sum(t.amount for t in transactions if t.type == 'expense')
-    
-    return {
-        'income': income,
-        'expense': expense,
-        'balance': income - expense
-    }
+    category_ids = (
+        transactions_query(current_user)
+        .filter_by(type='expense')
+        .with_entities(Transaction.category_id)
+        .distinct()
+    )
+    categories = (
+        Category.query.filter(Category.id.in_(category_ids.scalar_subquery()))
+        .order_by(Category.name_norm)
+        .all()
+    )
+    return [c.name for c in categories]
 
 
 # ---------- ВКЛАД: ПРОСТЫЕ / СЛОЖНЫЕ ПРОЦЕНТЫ ----------
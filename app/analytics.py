@@ -0,0 +1,274 @@
+"""
+Агрегаты для страниц аналитики и дашборда
+
+Каждая функция считает либо по колоночному кэшу процесса (если включён
+ANALYTICS_CACHE_ENABLED), либо SQL-запросом, и добавляет месячные итоги
+архивных операций (app/archive.py). Суммы — в копейках.
+series() — общий API рядов по периодам: произвольный диапазон дат и шаг
+day / week / month / year, один SQL-запрос с оконными функциями.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, text
+
+from . import analytics_cache, archive, db, rollups
+from .models import Transaction, Category
+from .money import div_round
+from .scope import scope_key, transactions_query
+
+GRANULARITIES = ("day", "week", "month", "year")
+
+# Начало периода, в который попадает дата (неделя — с понедельника)
+_BUCKET = {
+    "day": "date({col})",
+    "week": "date({col}, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01', {col})",
+    "year": "strftime('%Y-01-01', {col})",
+}
+# Шаг календаря периодов
+_STEP = {"day": "+1 day", "week": "+7 days", "month": "+1 month", "year": "+1 year"}
+
+# Защита от ряда по дням за десятилетия
+MAX_PERIODS = 5000
+
+
+def category_names(ids):
+    """{category_id: имя} одним запросом"""
+    ids = [i for i in set(ids) if i]
+    if not ids:
+        return {}
+    return dict(Category.query.filter(Category.id.in_(ids)).with_entities(Category.id, Category.name))
+
+
+def totals(user, since=None, until=None):
+    """{'income': ..., 'expense': ...} за период [since, until) или за всё время"""
+    archived = archive.totals(user, since, until)
+    ledger = analytics_cache.ledger_for(user)
+    if ledger is not None:
+        hot = ledger.totals(since, until)
+    else:
+        q = _period(transactions_query(user), since, until)
+        rows = dict(
+            q.with_entities(Transaction.type, func.sum(Transaction.amount_minor))
+             .group_by(Transaction.type)
+             .all()
+        )
+        hot = {"income": rows.get("income") or 0, "expense": rows.get("expense") or 0}
+    return {ttype: hot[ttype] + archived[ttype] for ttype in ("income", "expense")}
+
+
+def expense_category_stats(user, since=None, until=None):
+    """
+    [(имя, n, среднее, мин, макс, сумма, медиана, P90, размах)] по категориям расходов.
+    Квантили — из месячных скетчей (app/rollups.py), размах — межквартильный
+    """
+    ledger = analytics_cache.ledger_for(user)
+    if ledger is not None:
+        agg = ledger.category_stats("expense", since, until)
+    else:
+        q = _period(transactions_query(user).filter_by(type="expense"), since, until)
+        agg = (
+            q.with_entities(
+                 Transaction.category_id,
+                 func.count(Transaction.id),
+                 func.min(Transaction.amount_minor),
+                 func.max(Transaction.amount_minor),
+                 func.sum(Transaction.amount_minor),
+             )
+             .group_by(Transaction.category_id)
+             .all()
+        )
+    agg = _merge_stats(agg, archive.category_stats(user, "expense", since, until))
+    names = category_names(cid for cid, *_ in agg)
+    quantiles = rollups.quantiles(user, "expense", since, until)
+    # AVG по целым дал бы float, поэтому среднее считаем из суммы и количества
+    return [
+        (names.get(cid, "?"), n, div_round(total, n), lo, hi, total, *quantiles.get(cid, (None, None, None)))
+        for cid, n, lo, hi, total in agg
+    ]
+
+
+def parse_range(args, default_granularity="month"):
+    """
+    (since, until, granularity) из query string: from / to (ГГГГ-ММ-ДД,
+    обе границы включительно) и granularity. Пустые границы — None,
+    некорректные значения — ValueError
+    """
+    bounds = []
+    for name in ("from", "to"):
+        value = args.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            bounds.append(datetime.strptime(value, "%Y-%m-%d"))
+        except ValueError as exc:
+            raise ValueError("Дата должна быть в формате ГГГГ-ММ-ДД") from exc
+    since, until = bounds
+    if until is not None:
+        until += timedelta(days=1)
+    if since is not None and until is not None and since >= until:
+        raise ValueError("Начало периода позже конца")
+
+    granularity = args.get("granularity") or default_granularity
+    if granularity not in GRANULARITIES:
+        raise ValueError("Шаг должен быть одним из: " + ", ".join(GRANULARITIES))
+    return since, until, granularity
+
+
+def series(user, since=None, until=None, granularity="month"):
+    """
+    Ряды по периодам за [since, until) одним SQL-запросом.
+
+    periods — все периоды диапазона (и пустые): доходы, расходы, сальдо,
+    накопленный баланс с учётом остатка до since и изменения к прошлому периоду.
+    categories — ряды по (type, категория) только для периодов с операциями;
+    delta — изменение к соседнему предыдущему периоду (отсутствие = 0).
+    У первого периода диапазона изменения нет — None.
+    Без since ряд начинается с первой операции, без until — заканчивается сегодня
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Неизвестный шаг: {granularity}")
+
+    if user.family_id:
+        scope_sql, params = "t.family_id = :scope_id", {"scope_id": user.family_id}
+    else:
+        scope_sql, params = "t.user_id = :scope_id", {"scope_id": user.id}
+
+    if since is None:
+        starts = [
+            transactions_query(user).with_entities(func.min(Transaction.date)).scalar(),
+            archive.first_month(user),
+        ]
+        starts = [d for d in starts if d is not None]
+        if not starts:
+            return {"granularity": granularity, "periods": [], "categories": []}
+        since = datetime.combine(min(starts).date(), datetime.min.time())
+    if until is None:
+        until = datetime.combine(datetime.utcnow().date() + timedelta(days=1), datetime.min.time())
+
+    days = (until - since).days
+    approx = {"day": days, "week": days // 7, "month": days // 28, "year": days // 365}[granularity]
+    if approx > MAX_PERIODS:
+        raise ValueError("Слишком много периодов — увеличьте шаг или сократите диапазон")
+
+    bucket = _BUCKET[granularity].format(col="t.date")
+    step = _STEP[granularity]
+    # даты в SQLite — строки ISO, сравниваем в том же формате
+    params.update(since=since.isoformat(sep=" "), until=until.isoformat(sep=" "), step=step,
+                  scope=scope_key(user))
+
+    rows = db.session.execute(text(f"""
+        WITH RECURSIVE
+        cal(period) AS (
+            SELECT {_BUCKET[granularity].format(col=":since")}
+            UNION ALL
+            SELECT date(period, :step) FROM cal WHERE date(period, :step) < date(:until)
+        ),
+        steps AS (
+            SELECT period, lag(period) OVER (ORDER BY period) AS prev FROM cal
+        ),
+        rows AS (
+            SELECT t.date, t.type, t.category_id, t.amount_minor AS total, 1 AS n
+            FROM "transaction" t
+            WHERE {scope_sql} AND t.date >= :since AND t.date < :until
+            UNION ALL
+            -- архивный месяц — одной строкой на первое число
+            SELECT a.month || '-01 00:00:00', a.type, a.category_id, a.total_minor, a.count
+            FROM archive_month_stat a
+            WHERE a.scope = :scope AND a.month || '-01 00:00:00' >= :since
+              AND a.month || '-01 00:00:00' < :until
+        ),
+        b AS (
+            SELECT {bucket} AS period, t.type, t.category_id,
+                   sum(t.total) AS total, sum(t.n) AS n
+            FROM rows t
+            GROUP BY 1, 2, 3
+        ),
+        p AS (
+            SELECT cal.period,
+                   coalesce(sum(CASE WHEN b.type = 'income' THEN b.total END), 0) AS income,
+                   coalesce(sum(CASE WHEN b.type = 'expense' THEN b.total END), 0) AS expense
+            FROM cal LEFT JOIN b ON b.period = cal.period
+            GROUP BY cal.period
+        ),
+        opening AS (
+            SELECT (
+                SELECT coalesce(sum(CASE WHEN t.type = 'income' THEN t.amount_minor
+                                         ELSE -t.amount_minor END), 0)
+                FROM "transaction" t
+                WHERE {scope_sql} AND t.date < :since
+            ) + (
+                SELECT coalesce(sum(CASE WHEN a.type = 'income' THEN a.total_minor
+                                         ELSE -a.total_minor END), 0)
+                FROM archive_month_stat a
+                WHERE a.scope = :scope AND a.month || '-01 00:00:00' < :since
+            ) AS balance
+        ),
+        pw AS (
+            SELECT p.period, p.income, p.expense, p.income - p.expense AS net,
+                   (SELECT balance FROM opening)
+                     + sum(p.income - p.expense) OVER (ORDER BY p.period) AS balance,
+                   p.income - lag(p.income) OVER (ORDER BY p.period) AS income_delta,
+                   p.expense - lag(p.expense) OVER (ORDER BY p.period) AS expense_delta
+            FROM p
+        )
+        SELECT 'p' AS kind, pw.period, NULL, NULL, NULL, NULL, NULL,
+               pw.income, pw.expense, pw.net, pw.balance, pw.income_delta, pw.expense_delta
+        FROM pw
+        UNION ALL
+        SELECT 'c', b.period, b.type, b.category_id, c.name, b.total, b.n,
+               CASE WHEN s.prev IS NOT NULL THEN b.total - coalesce(prev.total, 0) END, NULL, NULL, NULL, NULL, NULL
+        FROM b
+        JOIN steps s ON s.period = b.period
+        LEFT JOIN b AS prev
+               ON prev.period = s.prev AND prev.type = b.type
+              AND prev.category_id IS b.category_id
+        LEFT JOIN category c ON c.id = b.category_id
+        ORDER BY 1 DESC, 2
+    """), params).all()
+
+    periods, categories = [], {}
+    for row in rows:
+        if row[0] == "p":
+            _, period, *_, income, expense, net, balance, income_delta, expense_delta = row
+            periods.append({
+                "period": period, "income": income, "expense": expense, "net": net,
+                "balance": balance, "income_delta": income_delta, "expense_delta": expense_delta,
+            })
+        else:
+            _, period, ttype, category_id, name, total, n, delta = row[:8]
+            entry = categories.setdefault((ttype, category_id), {
+                "type": ttype, "category_id": category_id, "name": name or "?", "points": [],
+            })
+            entry["points"].append({"period": period, "total": total, "count": n, "delta": delta})
+
+    return {
+        "granularity": granularity,
+        "since": since.date().isoformat(),
+        "until": (until - timedelta(days=1)).date().isoformat(),
+        "periods": periods,
+        "categories": sorted(categories.values(), key=lambda c: (c["type"], c["name"])),
+    }
+
+
+def _merge_stats(*parts):
+    """Сливает [(category_id, n, мин, макс, сумма)] горячих строк и архива"""
+    merged = {}
+    for rows in parts:
+        for cid, n, lo, hi, total in rows:
+            if cid in merged:
+                n0, lo0, hi0, total0 = merged[cid]
+                merged[cid] = (n0 + n, min(lo0, lo), max(hi0, hi), total0 + total)
+            else:
+                merged[cid] = (n, lo, hi, total)
+    return [(cid, *values) for cid, values in merged.items()]
+
+
+def _period(q, since, until):
+    if since is not None:
+        q = q.filter(Transaction.date >= since)
+    if until is not None:
+        q = q.filter(Transaction.date < until)
+    return q
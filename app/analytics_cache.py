@@ -0,0 +1,301 @@
+"""
+Колоночный кэш операций для аналитики (в памяти процесса)
+
+Для каждого активного контекста (семья / личный учёт) держим операции
+параллельными массивами array: ординалы дат, суммы в копейках, коды
+категорий и флаг типа — 17 байт на строку, около 1.7 МБ на 100 тыс.
+операций (плюс запас роста array). Если установлен NumPy, агрегаты
+считаются векторно поверх тех же буферов без копирования.
+
+Кэш догружает только новые строки (id > последнего загруженного), так
+что изменения из других воркеров gunicorn подхватываются при следующем
+чтении одним дешёвым запросом по диапазону первичного ключа. Память
+ограничена ANALYTICS_CACHE_MAX_BYTES, вытесняются давно не читанные
+контексты (LRU).
+"""
+
+import threading
+from array import array
+from collections import OrderedDict
+
+import click
+from flask import current_app
+
+from . import db, metrics
+from .models import Transaction
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен: без него считаем циклами
+    np = None
+
+INCOME, EXPENSE = 1, 0
+
+metrics.describe("analytics_cache_bytes", "gauge", "Память колоночного кэша аналитики")
+metrics.describe("analytics_cache_rows", "gauge", "Строк в колоночном кэше аналитики")
+metrics.describe("analytics_cache_scopes", "gauge", "Контекстов в колоночном кэше аналитики")
+metrics.describe("analytics_cache_requests_total", "counter", "Обращения к кэшу аналитики")
+
+
+class ColumnarLedger:
+    """Операции одного контекста в виде параллельных массивов"""
+
+    # байт на строку без учёта запаса роста array
+    BYTES_PER_ROW = (
+        array("i").itemsize + array("q").itemsize + array("i").itemsize + array("b").itemsize
+    )
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.lock = threading.RLock()
+        self.last_id = 0           # до какого id строки догружены из БД
+        self.archive_version = 0   # версия архива контекста при загрузке (app/archive.py)
+        self.local_ids = set()     # добавленные этим процессом сверх last_id
+        self.days = array("i")        # date.toordinal()
+        self.amounts = array("q")     # копейки
+        self.categories = array("i")  # category_id (0 — без категории)
+        self.kinds = array("b")       # INCOME / EXPENSE
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @property
+    def nbytes(self):
+        return sum(a.buffer_info()[1] * a.itemsize for a in (self.days, self.amounts, self.categories, self.kinds))
+
+    def _append(self, day, amount_minor, category_id, ttype):
+        self.days.append(day.toordinal())
+        self.amounts.append(amount_minor)
+        self.categories.append(category_id or 0)
+        self.kinds.append(INCOME if ttype == "income" else EXPENSE)
+
+    def append_loaded(self, tx_id, day, amount_minor, category_id, ttype):
+        """Строка, прочитанная из БД по возрастанию id"""
+        with self.lock:
+            if tx_id <= self.last_id:
+                return
+            if tx_id not in self.local_ids:
+                self._append(day, amount_minor, category_id, ttype)
+            self.last_id = tx_id
+
+    def append_local(self, tx_id, day, amount_minor, category_id, ttype):
+        """
+        Операция, только что сохранённая этим процессом. last_id не двигаем:
+        между ним и tx_id могут быть строки других воркеров, их догрузит чтение
+        """
+        with self.lock:
+            if tx_id <= self.last_id or tx_id in self.local_ids:
+                return
+            self._append(day, amount_minor, category_id, ttype)
+            self.local_ids.add(tx_id)
+
+    def forget_loaded_local_ids(self):
+        with self.lock:
+            self.local_ids = {i for i in self.local_ids if i > self.last_id}
+
+    # ---------- агрегаты ----------
+
+    def _columns(self, since=None, until=None):
+        """Векторные представления колонок (NumPy) с фильтром по датам [since, until)"""
+        if not len(self.amounts):
+            # frombuffer на пустом буфере в старых NumPy падает
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty, empty.astype(np.int8)
+        days = np.frombuffer(self.days, dtype=np.int32)
+        amounts = np.frombuffer(self.amounts, dtype=np.int64)
+        categories = np.frombuffer(self.categories, dtype=np.int32)
+        kinds = np.frombuffer(self.kinds, dtype=np.int8)
+        if since is None and until is None:
+            return days, amounts, categories, kinds
+        mask = np.ones(len(days), dtype=bool)
+        if since is not None:
+            mask &= days >= since.toordinal()
+        if until is not None:
+            mask &= days < until.toordinal()
+        return days[mask], amounts[mask], categories[mask], kinds[mask]
+
+    def _rows(self, since=None, until=None):
+        lo = since.toordinal() if since is not None else None
+        hi = until.toordinal() if until is not None else None
+        for row in zip(self.days, self.amounts, self.categories, self.kinds):
+            if (lo is None or row[0] >= lo) and (hi is None or row[0] < hi):
+                yield row
+
+    def totals(self, since=None, until=None):
+        """{'income': копейки, 'expense': копейки}"""
+        with self.lock:
+            if np is not None:
+                _, amounts, _, kinds = self._columns(since, until)
+                income = int(amounts[kinds == INCOME].sum())
+                expense = int(amounts[kinds == EXPENSE].sum())
+            else:
+                income = expense = 0
+                for _, amount, _, kind in self._rows(since, until):
+                    if kind == INCOME:
+                        income += amount
+                    else:
+                        expense += amount
+        return {"income": income, "expense": expense}
+
+    def category_stats(self, ttype="expense", since=None, until=None):
+        """[(category_id, n, min, max, total)] по одному типу операций"""
+        flag = INCOME if ttype == "income" else EXPENSE
+        with self.lock:
+            if np is not None:
+                _, amounts, categories, kinds = self._columns(since, until)
+                mask = kinds == flag
+                amounts, categories = amounts[mask], categories[mask]
+                if not len(amounts):
+                    return []
+                codes, inverse = np.unique(categories, return_inverse=True)
+                counts = np.bincount(inverse, minlength=len(codes))
+                totals = np.zeros(len(codes), dtype=np.int64)
+                np.add.at(totals, inverse, amounts)
+                mins = np.full(len(codes), np.iinfo(np.int64).max, dtype=np.int64)
+                np.minimum.at(mins, inverse, amounts)
+                maxs = np.full(len(codes), np.iinfo(np.int64).min, dtype=np.int64)
+                np.maximum.at(maxs, inverse, amounts)
+                return [
+                    (int(c), int(n), int(lo), int(hi), int(t))
+                    for c, n, lo, hi, t in zip(codes, counts, mins, maxs, totals)
+                ]
+
+            stats = {}
+            for _, amount, category, kind in self._rows(since, until):
+                if kind != flag:
+                    continue
+                s = stats.get(category)
+                if s is None:
+                    stats[category] = [1, amount, amount, amount]
+                else:
+                    s[0] += 1
+                    s[1] = min(s[1], amount)
+                    s[2] = max(s[2], amount)
+                    s[3] += amount
+            return [(c, n, lo, hi, t) for c, (n, lo, hi, t) in sorted(stats.items())]
+
+
+class AnalyticsCache:
+    """LRU контекстов с ограничением по памяти"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ledgers = OrderedDict()
+
+    def _load_new_rows(self, ledger, scope_filter):
+        rows = (
+            db.session.query(
+                Transaction.id, Transaction.date, Transaction.amount_minor,
+                Transaction.category_id, Transaction.type,
+            )
+            .filter(scope_filter, Transaction.id > ledger.last_id)
+            .order_by(Transaction.id)
+            .yield_per(10000)
+        )
+        for tx_id, day, amount, category_id, ttype in rows:
+            ledger.append_loaded(tx_id, day, amount, category_id, ttype)
+        ledger.forget_loaded_local_ids()
+
+    def get(self, scope, scope_filter, max_bytes, archive_version=0):
+        with self.lock:
+            ledger = self.ledgers.get(scope)
+            if ledger is None or ledger.archive_version != archive_version:
+                # часть строк ушла в архив (в любом воркере) — загружаем контекст заново
+                ledger = self.ledgers[scope] = ColumnarLedger(scope)
+                ledger.archive_version = archive_version
+                metrics.inc("analytics_cache_requests_total", result="miss")
+            else:
+                metrics.inc("analytics_cache_requests_total", result="hit")
+            self.ledgers.move_to_end(scope)
+
+        # догружаем строки, добавленные после прошлого чтения (в т.ч. другими воркерами)
+        with ledger.lock:
+            self._load_new_rows(ledger, scope_filter)
+
+        self._evict(max_bytes, keep=scope)
+        return ledger
+
+    def append(self, scope, transaction):
+        with self.lock:
+            ledger = self.ledgers.get(scope)
+        if ledger is not None:
+            ledger.append_local(transaction.id, transaction.date, transaction.amount_minor,
+                                transaction.category_id, transaction.type)
+
+    def _evict(self, max_bytes, keep):
+        with self.lock:
+            total = sum(l.nbytes for l in self.ledgers.values())
+            while total > max_bytes and len(self.ledgers) > 1:
+                scope, ledger = next(iter(self.ledgers.items()))
+                if scope == keep:
+                    self.ledgers.move_to_end(scope)
+                    continue
+                del self.ledgers[scope]
+                total -= ledger.nbytes
+            metrics.set_gauge("analytics_cache_bytes", total)
+            metrics.set_gauge("analytics_cache_rows", sum(len(l) for l in self.ledgers.values()))
+            metrics.set_gauge("analytics_cache_scopes", len(self.ledgers))
+
+    def clear(self):
+        with self.lock:
+            self.ledgers.clear()
+
+
+cache = AnalyticsCache()
+
+
+def enabled():
+    return current_app.config.get("ANALYTICS_CACHE_ENABLED", False)
+
+
+def ledger_for(user):
+    """Колоночный кэш контекста пользователя или None, если кэш выключен"""
+    if not enabled():
+        return None
+    from . import archive
+    from .scope import scope_key
+    if user.family_id:
+        scope_filter = Transaction.family_id == user.family_id
+    else:
+        scope_filter = Transaction.user_id == user.id
+    scope = scope_key(user)
+    return cache.get(scope, scope_filter, current_app.config.get("ANALYTICS_CACHE_MAX_BYTES"),
+                     archive.version(scope))
+
+
+def record(user, transaction):
+    """Добавляет только что сохранённую операцию в кэш этого процесса"""
+    if enabled():
+        from .scope import scope_key
+        cache.append(scope_key(user), transaction)
+
+
+def init_app(app):
+    @app.cli.command("analytics-cache-footprint")
+    @click.option("--limit", default=10, help="сколько самых больших контекстов загрузить")
+    def analytics_cache_footprint(limit):
+        """Загружает крупнейшие контексты в кэш и печатает расход памяти."""
+        from sqlalchemy import func
+
+        largest = (
+            db.session.query(Transaction.family_id, Transaction.user_id, func.count(Transaction.id))
+            .group_by(Transaction.family_id, Transaction.user_id)
+            .order_by(func.count(Transaction.id).desc())
+            .limit(limit)
+            .all()
+        )
+        seen = set()
+        for family_id, user_id, _ in largest:
+            scope_filter = (Transaction.family_id == family_id) if family_id else (Transaction.user_id == user_id)
+            scope = f"f{family_id}" if family_id else f"u{user_id}"
+            if scope in seen:
+                continue
+            seen.add(scope)
+            ledger = cache.get(scope, scope_filter, float("inf"))
+            rows = len(ledger)
+            per_100k = ledger.nbytes / rows * 100_000 if rows else 0
+            click.echo(f"{scope:>10}: {rows:>9} строк, {ledger.nbytes / 1024:>9.1f} КиБ, "
+                       f"{per_100k / 1024 / 1024:.2f} МиБ на 100 тыс. строк")
+        click.echo(f"Теоретический минимум: {ColumnarLedger.BYTES_PER_ROW} байт на строку, "
+                   f"{ColumnarLedger.BYTES_PER_ROW * 100_000 / 1024 / 1024:.2f} МиБ на 100 тыс. строк; "
+                   f"NumPy: {'да' if np is not None else 'нет'}")
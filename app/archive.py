@@ -0,0 +1,192 @@
+"""
+Архив старых операций
+
+Команда flask archive-cold переносит операции старше ARCHIVE_AFTER_MONTHS
+месяцев (граница — начало месяца) из горячей таблицы transaction в
+transaction_archive. Перенос — заполнение "archive-cold" из app/backfill.py:
+порции по первичному ключу, каждая — отдельная короткая транзакция записи:
+копия строк (товары чека — JSON), итоги по месяцам в ArchiveMonthStat,
+удаление из горячих таблиц. Между порциями — пауза ARCHIVE_PAUSE, чтобы
+запись пользователей не ждала. Прерванный перенос просто продолжается
+следующим запуском.
+
+Месячные агрегаты MonthlyCategoryStat (и скетчи квантилей) не трогаются.
+Аналитика складывает горячие строки с ArchiveMonthStat: архивный месяц
+попадает в диапазон, если в него попадает первое число месяца, а в рядах
+по дням и неделям его сумма стоит на первом числе. История и поиск
+показывают только горячие операции.
+"""
+
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import func, text
+
+from . import db, backfill
+from .models import ArchiveMonthStat, ArchiveState, Transaction
+from .rollups import month_key
+from .scope import scope_key
+
+_SCOPE = "CASE WHEN {t}.family_id IS NOT NULL THEN 'f' || {t}.family_id ELSE 'u' || {t}.user_id END"
+_CHUNK = "{t}.id > :lo AND {t}.id <= :hi AND {t}.date < :cutoff"
+
+_COLUMNS = (
+    "id, user_id, family_id, type, amount_minor, category, category_id, description, date, "
+    "currency, original_minor, receipt_image, merchant_name, updated_at, sync_seq, client_id, recurring_rule_id"
+)
+
+_STATEMENTS = [
+    # копия строк с товарами чека
+    f"""
+    INSERT INTO transaction_archive ({_COLUMNS}, items, archived_at)
+    SELECT {", ".join("t." + c for c in _COLUMNS.split(", "))},
+           (SELECT json_group_array(json_object('item_name', i.item_name, 'quantity', i.quantity,
+                                                'price_minor', i.price_minor))
+            FROM transaction_item i WHERE i.transaction_id = t.id HAVING count(*) > 0),
+           :now
+    FROM "transaction" t
+    WHERE {_CHUNK.format(t="t")}
+    """,
+    # итоги по месяцам — то, что читает аналитика
+    f"""
+    INSERT INTO archive_month_stat (scope, month, type, category_id, count, total_minor, min_minor, max_minor)
+    SELECT {_SCOPE.format(t="t")}, strftime('%Y-%m', t.date), t.type, t.category_id,
+           count(*), sum(t.amount_minor), min(t.amount_minor), max(t.amount_minor)
+    FROM "transaction" t
+    WHERE {_CHUNK.format(t="t")}
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (scope, month, type, category_id) DO UPDATE SET
+        count = count + excluded.count,
+        total_minor = total_minor + excluded.total_minor,
+        min_minor = min(min_minor, excluded.min_minor),
+        max_minor = max(max_minor, excluded.max_minor)
+    """,
+    # новая версия архива контекста — кэши аналитики других воркеров перечитают данные
+    f"""
+    INSERT INTO archive_state (scope, version, rows, updated_at)
+    SELECT {_SCOPE.format(t="t")}, 1, count(*), :now
+    FROM "transaction" t
+    WHERE {_CHUNK.format(t="t")}
+    GROUP BY 1
+    ON CONFLICT (scope) DO UPDATE SET
+        version = version + 1,
+        rows = rows + excluded.rows,
+        updated_at = excluded.updated_at
+    """,
+    f"""
+    DELETE FROM transaction_item WHERE transaction_id IN (
+        SELECT t.id FROM "transaction" t WHERE {_CHUNK.format(t="t")}
+    )
+    """,
+    # триггеры полнотекстового индекса удаляют и строки поиска
+    f"""DELETE FROM "transaction" WHERE {_CHUNK.format(t='"transaction"')}""",
+]
+
+
+def cutoff(months, now=None):
+    """Начало месяца, раньше которого операции уходят в архив"""
+    now = now or datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _default_params():
+    return {"cutoff": cutoff(current_app.config["ARCHIVE_AFTER_MONTHS"]).isoformat(sep=" ")}
+
+
+@backfill.register("archive-cold", "transaction", where="date < :cutoff", params=_default_params)
+def _move(connection, lo, hi, cutoff):
+    """Перенос операций старше ARCHIVE_AFTER_MONTHS в архив с месячными итогами"""
+    params = {"lo": lo, "hi": hi, "cutoff": cutoff, "now": datetime.utcnow().isoformat(sep=" ")}
+    for statement in _STATEMENTS:
+        result = connection.execute(text(statement), params)
+    return result.rowcount
+
+
+def archive(before, chunk_size=None, pause=None, progress=None):
+    """Переносит операции с date < before порциями; возвращает число перенесённых"""
+    # перенесённые строки уходят из таблицы, поэтому каждый запуск начинается
+    # с начала: прерванный проход продолжится сам, а другая граница не пропустит строк
+    return backfill.run(
+        "archive-cold",
+        chunk_size or current_app.config["ARCHIVE_CHUNK_SIZE"],
+        current_app.config["ARCHIVE_PAUSE"] if pause is None else pause,
+        params={"cutoff": before.isoformat(sep=" ")},
+        restart=True,
+        progress=progress and (lambda last_id, end_id, moved, size: progress(moved)),
+    )
+
+
+# ---------- ЧТЕНИЕ ИТОГОВ ----------
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value):
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _summary(user, since=None, until=None):
+    """Строки ArchiveMonthStat контекста, у которых первое число месяца в [since, until)"""
+    q = ArchiveMonthStat.query.filter_by(scope=scope_key(user))
+    if since is not None:
+        first = since if since == _month_start(since) else _next_month(since)
+        q = q.filter(ArchiveMonthStat.month >= month_key(first))
+    if until is not None:
+        last = until if until == _month_start(until) else _next_month(until)
+        q = q.filter(ArchiveMonthStat.month < month_key(last))
+    return q
+
+
+def version(scope):
+    """Версия архива контекста (0 — ничего не архивировано)"""
+    return db.session.query(ArchiveState.version).filter_by(scope=scope).scalar() or 0
+
+
+def totals(user, since=None, until=None):
+    rows = dict(
+        _summary(user, since, until)
+        .with_entities(ArchiveMonthStat.type, func.sum(ArchiveMonthStat.total_minor))
+        .group_by(ArchiveMonthStat.type)
+    )
+    return {"income": rows.get("income") or 0, "expense": rows.get("expense") or 0}
+
+
+def category_stats(user, ttype, since=None, until=None):
+    """[(category_id, n, мин, макс, сумма)] — как агрегат горячих строк в analytics"""
+    return (
+        _summary(user, since, until)
+        .filter(ArchiveMonthStat.type == ttype)
+        .with_entities(
+            ArchiveMonthStat.category_id,
+            func.sum(ArchiveMonthStat.count),
+            func.min(ArchiveMonthStat.min_minor),
+            func.max(ArchiveMonthStat.max_minor),
+            func.sum(ArchiveMonthStat.total_minor),
+        )
+        .group_by(ArchiveMonthStat.category_id)
+        .all()
+    )
+
+
+def first_month(user):
+    """Первое число самого раннего архивного месяца или None"""
+    month = _summary(user).with_entities(func.min(ArchiveMonthStat.month)).scalar()
+    return datetime.strptime(month, "%Y-%m") if month else None
+
+
+def init_app(app):
+    @app.cli.command("archive-cold")
+    @click.option("--months", type=int, default=None, help="старше скольких месяцев (ARCHIVE_AFTER_MONTHS)")
+    @click.option("--chunk-size", type=int, default=None, help="строк в одной транзакции")
+    @click.option("--pause", type=float, default=None, help="пауза между порциями, секунд")
+    def archive_cold(months, chunk_size, pause):
+        """Переносит старые операции в архив, оставляя месячные итоги."""
+        months = app.config["ARCHIVE_AFTER_MONTHS"] if months is None else months
+        before = cutoff(months)
+        click.echo(f"Архивируем операции до {before:%Y-%m-%d}")
+        moved = archive(before, chunk_size, pause, progress=lambda n: click.echo(f"  перенесено: {n}"))
+        hot = db.session.query(func.count(Transaction.id)).scalar()
+        click.echo(f"Перенесено операций: {moved}; в горячей таблице: {hot}")
@@ -1,8 +1,8 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import login_user, logout_user, login_required
-from .models import User
-from . import db
+from flask_login import login_user, logout_user, login_required, current_user
+from .models import TelegramLink, User
+from . import db, telegram_bot
 import re
 from functools import wraps
 from datetime import datetime, timedelta
@@ -48,6 +48,10 @@ def rate_limit(max_attempts=5, window_minutes=15):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            # Нагрузочный тест ходит с одного IP — ему ограничение отключают
+            if not current_app.config.get("LOGIN_RATE_LIMIT_ENABLED", True):
+                return f(*args, **kwargs)
+
             ip = request.remote_addr
             now = datetime.now()
             
@@ -180,6 +184,24 @@ def logout():
     flash("Вы успешно вышли из системы", "success")
     return redirect(url_for("index"))
 
+
+@auth_bp.route("/telegram", methods=["GET", "POST"])
+@login_required
+def telegram():
+    """Привязка чата Telegram для быстрого ввода операций (app/telegram_bot.py)"""
+    if request.method == "POST":
+        if request.form.get("action") == "unlink":
+            telegram_bot.unlink(current_user)
+            flash("Чат Telegram отвязан", "success")
+        else:
+            telegram_bot.link_code(current_user)
+        return redirect(url_for("auth.telegram"))
+
+    link = db.session.get(TelegramLink, current_user.id)
+    code = link.code if link and link.code and link.code_expires_at > datetime.utcnow() else None
+    return render_template("auth/telegram.html", link=link, code=code,
+                           bot_username=current_app.config["TELEGRAM_BOT_USERNAME"])
+
 # API для проверки пароля в реальном времени
 @auth_bp.route("/api/check-password", methods=["POST"])
 def check_password_strength():
@@ -0,0 +1,246 @@
+"""
+Заполнение данных порциями по первичному ключу (backfill)
+
+Долгое UPDATE/INSERT ... SELECT по всей таблице в одной транзакции держит
+блокировку записи SQLite минутами — пользователи в это время не могут
+добавить операцию. Здесь та же работа режется на порции по id: каждая
+порция — отдельная короткая транзакция, в которой вместе с данными
+сохраняется контрольная точка BackfillCheckpoint, так что остановленное
+(Ctrl+C, ошибка, лимит времени) заполнение продолжается с места остановки
+и ни одна порция не выполняется дважды.
+
+Размер порции подстраивается под BACKFILL_TARGET_SECONDS: долгая порция —
+следующая вдвое меньше, быстрая — в полтора раза больше. Между порциями
+пауза BACKFILL_PAUSE, при «database is locked» порция повторяется.
+
+Заполнение объявляется в модуле, которому принадлежат данные:
+
+    @backfill.register("sync-seq", "transaction", where="sync_seq IS NULL")
+    def _fill(connection, lo, hi):
+        return connection.execute(text("UPDATE ... WHERE id > :lo AND id <= :hi"), ...).rowcount
+
+и запускается командой `flask backfill sync-seq` или из миграции:
+backfill.run_from_migration("sync-seq") после изменения схемы.
+"""
+
+import random
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.exc import OperationalError
+
+from . import db, metrics
+from .database import is_lock_error
+from .models import BackfillCheckpoint
+
+metrics.describe("backfill_rows_total", "counter", "Строки, обработанные заполнением данных")
+metrics.describe("backfill_chunk_size", "gauge", "Текущий размер порции заполнения")
+
+MIN_CHUNK = 100
+MAX_CHUNK = 50000
+
+_checkpoints = BackfillCheckpoint.__table__
+
+
+class Backfill:
+    """Объявленное заполнение: таблица, шаг по диапазону id и фильтр подходящих строк"""
+
+    def __init__(self, name, table, step, where=None, params=None, reset=None, description=""):
+        self.name = name
+        self.table = table
+        self.step = step
+        self.where = where      # SQL-условие на строки таблицы; может ссылаться на :параметры
+        self.params = params    # функция -> параметры по умолчанию (вызывается в контексте приложения)
+        self.reset = reset      # reset(connection, **params) — очистка перед новым проходом
+        self.description = description
+
+
+_registry = {}
+
+
+def register(name, table, where=None, params=None, reset=None):
+    """
+    Декоратор шага step(connection, lo, hi, **params) -> число обработанных строк.
+    Шаг обрабатывает строки с lo < id <= hi и не делает commit.
+    reset(connection, **params) выполняется в начале нового прохода (не при
+    продолжении) в одной транзакции с фиксацией end_id: строки после end_id
+    уже учитывает путь записи
+    """
+    def decorator(step):
+        _registry[name] = Backfill(name, table, step, where, params, reset, (step.__doc__ or "").strip())
+        return step
+    return decorator
+
+
+def registered():
+    return dict(_registry)
+
+
+# ---------- КОНТРОЛЬНЫЕ ТОЧКИ ----------
+
+def _checkpoint(connection, name):
+    return connection.execute(select(_checkpoints).where(_checkpoints.c.name == name)).first()
+
+
+def status():
+    """[(заполнение, контрольная точка или None)] для всех объявленных"""
+    with db.engine.connect() as connection:
+        return [(b, _checkpoint(connection, name)) for name, b in sorted(_registry.items())]
+
+
+def _start(backfill, restart, params):
+    """(last_id, end_id) — продолжение или новый проход"""
+    with db.engine.begin() as connection:
+        point = _checkpoint(connection, backfill.name)
+        if point is not None and not restart and point.finished_at is None:
+            return point.last_id, point.end_id
+
+        if backfill.reset is not None:
+            # очистка берёт блокировку записи до чтения end_id: новые строки не проскочат между ними
+            backfill.reset(connection, **params)
+        end_id = connection.execute(text(f'SELECT max(id) FROM "{backfill.table}"')).scalar() or 0
+        now = datetime.utcnow()
+        values = dict(last_id=0, end_id=end_id, rows=0, started_at=now, updated_at=now, finished_at=None)
+        if point is None:
+            connection.execute(insert(_checkpoints).values(name=backfill.name, **values))
+        else:
+            connection.execute(update(_checkpoints).where(_checkpoints.c.name == backfill.name).values(**values))
+        return 0, end_id
+
+
+# ---------- ПРОХОД ----------
+
+def _next_boundary(backfill, lo, end_id, size, params):
+    """Верхняя граница порции: size-я подходящая строка после lo (или последняя подходящая)"""
+    where = f" AND ({backfill.where})" if backfill.where else ""
+    sql = f'SELECT id FROM "{backfill.table}" WHERE id > :lo AND id <= :end{where} ORDER BY id'
+    args = {**params, "lo": lo, "end": end_id}
+    with db.engine.connect() as connection:
+        hi = connection.execute(text(f"{sql} LIMIT 1 OFFSET :off"), {**args, "off": size - 1}).scalar()
+        if hi is None:
+            hi = connection.execute(
+                text(f'SELECT max(id) FROM "{backfill.table}" WHERE id > :lo AND id <= :end{where}'), args
+            ).scalar()
+    return hi
+
+
+def _chunk(backfill, lo, hi, params, retries, base_delay):
+    """Порция и контрольная точка в одной транзакции; повтор при блокировке"""
+    attempt = 0
+    while True:
+        try:
+            with db.engine.begin() as connection:
+                count = backfill.step(connection, lo, hi, **params) or 0
+                connection.execute(
+                    update(_checkpoints)
+                    .where(_checkpoints.c.name == backfill.name)
+                    .values(last_id=hi, rows=_checkpoints.c.rows + count, updated_at=datetime.utcnow())
+                )
+            return count
+        except OperationalError as e:
+            if not is_lock_error(e) or attempt >= retries:
+                raise
+            time.sleep(base_delay * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+
+def run(name, chunk_size=None, pause=None, target_seconds=None, params=None,
+        restart=False, time_budget=None, progress=None):
+    """
+    Выполняет заполнение name до конца (или до time_budget секунд).
+    restart=True начинает заново, иначе продолжает с контрольной точки.
+    Возвращает число строк, обработанных в этом запуске
+    """
+    backfill = _registry[name]
+    config = current_app.config
+    size = chunk_size or config["BACKFILL_CHUNK_SIZE"]
+    pause = config["BACKFILL_PAUSE"] if pause is None else pause
+    target = target_seconds or config["BACKFILL_TARGET_SECONDS"]
+    retries = config.get("DB_LOCK_RETRIES", 3)
+    base_delay = config.get("DB_LOCK_RETRY_DELAY", 0.05)
+    params = {**(backfill.params() if backfill.params else {}), **(params or {})}
+
+    lo, end_id = _start(backfill, restart, params)
+    deadline = time.monotonic() + time_budget if time_budget else None
+    done = 0
+    while True:
+        hi = _next_boundary(backfill, lo, end_id, size, params)
+        if hi is None:
+            with db.engine.begin() as connection:
+                connection.execute(
+                    update(_checkpoints).where(_checkpoints.c.name == name)
+                    .values(finished_at=datetime.utcnow(), updated_at=datetime.utcnow())
+                )
+            break
+
+        started = time.monotonic()
+        count = _chunk(backfill, lo, hi, params, retries, base_delay)
+        elapsed = time.monotonic() - started
+        done += count
+        lo = hi
+        metrics.inc("backfill_rows_total", count, backfill=name)
+
+        # порция держала блокировку дольше цели — уменьшаем, заметно быстрее — растим
+        if elapsed > target:
+            size = max(MIN_CHUNK, size // 2)
+        elif elapsed < target / 2:
+            size = min(MAX_CHUNK, int(size * 1.5))
+        metrics.set_gauge("backfill_chunk_size", size, backfill=name)
+
+        if progress:
+            progress(lo, end_id, done, size)
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        if pause:
+            time.sleep(pause)
+    return done
+
+
+def run_from_migration(name, **options):
+    """
+    Заполнение из Alembic-миграции: транзакция миграции фиксируется
+    (autocommit_block), чтобы порции шли своими короткими транзакциями
+    и не ждали блокировки, которую держит сама миграция
+    """
+    from alembic import op
+
+    with op.get_context().autocommit_block():
+        return run(name, **options)
+
+
+def init_app(app):
+    @app.cli.command("backfill")
+    @click.argument("name")
+    @click.option("--chunk-size", type=int, default=None, help="начальный размер порции (BACKFILL_CHUNK_SIZE)")
+    @click.option("--pause", type=float, default=None, help="пауза между порциями, секунд (BACKFILL_PAUSE)")
+    @click.option("--target-seconds", type=float, default=None, help="желаемая длительность порции")
+    @click.option("--time-budget", type=float, default=None, help="остановиться через столько секунд")
+    @click.option("--restart", is_flag=True, help="начать заново, а не с контрольной точки")
+    def backfill_command(name, chunk_size, pause, target_seconds, time_budget, restart):
+        """Выполняет объявленное заполнение данных порциями (см. backfill-status)."""
+        if name not in _registry:
+            raise click.BadParameter(f"неизвестное заполнение; доступны: {', '.join(sorted(_registry))}")
+
+        def report(last_id, end_id, done, size):
+            click.echo(f"  id {last_id}/{end_id}, строк: {done}, порция: {size}")
+
+        done = run(name, chunk_size, pause, target_seconds, restart=restart,
+                   time_budget=time_budget, progress=report)
+        click.echo(f"{name}: обработано строк: {done}")
+
+    @app.cli.command("backfill-status")
+    def backfill_status():
+        """Объявленные заполнения и их контрольные точки."""
+        for backfill, point in status():
+            if point is None:
+                state = "не запускалось"
+            elif point.finished_at:
+                state = f"готово {point.finished_at:%Y-%m-%d %H:%M}, строк: {point.rows}"
+            else:
+                state = f"остановлено на id {point.last_id}/{point.end_id}, строк: {point.rows}"
+            click.echo(f"{backfill.name} ({backfill.table}): {state}")
+            if backfill.description:
+                click.echo(f"    {backfill.description}")
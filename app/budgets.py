@@ -0,0 +1,188 @@
+"""
+Месячные лимиты расходов по категориям и уведомления о них
+
+Решение об уведомлении принимается на пути записи за O(1): rollups.apply()
+уже держит в MonthlyCategoryStat текущую сумму расходов (контекст, месяц,
+категория) и обновляет её в той же транзакции, поэтому check() сравнивает
+с лимитом готовое число, а не пересчитывает месяц. Каждый порог
+срабатывает не больше одного раза за месяц (уникальный индекс BudgetAlert).
+"""
+
+from datetime import datetime
+
+from flask import current_app
+
+from . import db, categories
+from .models import Budget, BudgetAlert, Category, MonthlyCategoryStat
+from .money import format_money
+from .rollups import month_key
+from .scope import scope_key, transaction_scope
+
+MAX_THRESHOLD = 1000
+
+
+def parse_thresholds(value):
+    """'80, 100' -> [80, 100]; ValueError для нечисел и процентов вне 1..1000"""
+    try:
+        result = sorted({int(part) for part in str(value).replace(" ", "").split(",") if part})
+    except ValueError as exc:
+        raise ValueError("Пороги — проценты через запятую, например 80,100") from exc
+    if not result or result[0] < 1 or result[-1] > MAX_THRESHOLD:
+        raise ValueError(f"Пороги — проценты от 1 до {MAX_THRESHOLD}")
+    return result
+
+
+def thresholds_of(budget):
+    return parse_thresholds(budget.thresholds or current_app.config["BUDGET_ALERT_THRESHOLDS"])
+
+
+def _evaluate(budget, month, spent, transaction_id=None):
+    """Новые BudgetAlert для порогов, которые сумма spent достигла впервые за месяц"""
+    reached = [t for t in thresholds_of(budget) if spent * 100 >= budget.limit_minor * t]
+    if not reached:
+        return []
+    known = {
+        threshold for (threshold,) in
+        BudgetAlert.query.filter_by(scope=budget.scope, month=month, category_id=budget.category_id)
+        .with_entities(BudgetAlert.threshold)
+    }
+    alerts = [
+        BudgetAlert(
+            scope=budget.scope, month=month, category_id=budget.category_id, threshold=t,
+            spent_minor=spent, limit_minor=budget.limit_minor, transaction_id=transaction_id,
+        )
+        for t in reached if t not in known
+    ]
+    db.session.add_all(alerts)
+    return alerts
+
+
+def check(transaction, stat):
+    """
+    Вызывается после rollups.apply() в транзакции записи; stat — обновлённая
+    строка месячного агрегата этой операции. Возвращает новые уведомления
+    """
+    if transaction.type != "expense":
+        return []
+    budget = Budget.query.filter_by(
+        scope=transaction_scope(transaction), category_id=transaction.category_id
+    ).first()
+    if budget is None:
+        return []
+    return _evaluate(budget, stat.month, stat.total_minor, transaction.id)
+
+
+def set_budget(user, category_name, limit_minor, thresholds=None):
+    """
+    Создаёт или меняет лимит категории (внутри work() для run_with_retry).
+    Уже потраченное в текущем месяце сразу сверяется с новыми порогами
+    """
+    if limit_minor <= 0:
+        raise ValueError("Лимит должен быть больше нуля")
+    if thresholds:
+        thresholds = ",".join(map(str, parse_thresholds(thresholds)))
+
+    scope = scope_key(user)
+    category = categories.get_or_create(scope, category_name)
+    budget = Budget.query.filter_by(scope=scope, category_id=category.id).first()
+    if budget is None:
+        budget = Budget(scope=scope, category_id=category.id)
+        db.session.add(budget)
+    budget.limit_minor = limit_minor
+    budget.thresholds = thresholds or None
+    db.session.flush()
+
+    month = month_key(datetime.utcnow())
+    stat = MonthlyCategoryStat.query.filter_by(
+        scope=scope, month=month, type="expense", category_id=category.id
+    ).first()
+    if stat is not None:
+        _evaluate(budget, month, stat.total_minor)
+    return budget
+
+
+def remove_budget(user, budget_id):
+    """Удаляет лимит контекста; False, если такого нет"""
+    deleted = Budget.query.filter_by(id=budget_id, scope=scope_key(user)).delete()
+    return bool(deleted)
+
+
+def status(user, month=None):
+    """Лимиты контекста с расходами за месяц (по умолчанию текущий) одним запросом"""
+    month = month or month_key(datetime.utcnow())
+    scope = scope_key(user)
+    rows = (
+        db.session.query(Budget, Category.name, MonthlyCategoryStat.total_minor)
+        .join(Category, Category.id == Budget.category_id)
+        .outerjoin(
+            MonthlyCategoryStat,
+            (MonthlyCategoryStat.scope == Budget.scope)
+            & (MonthlyCategoryStat.month == month)
+            & (MonthlyCategoryStat.type == "expense")
+            & (MonthlyCategoryStat.category_id == Budget.category_id),
+        )
+        .filter(Budget.scope == scope)
+        .order_by(Category.name_norm)
+        .all()
+    )
+    result = []
+    for budget, name, spent in rows:
+        spent = spent or 0
+        result.append({
+            "id": budget.id,
+            "category": name,
+            "category_id": budget.category_id,
+            "limit_minor": budget.limit_minor,
+            "spent_minor": spent,
+            "remaining_minor": budget.limit_minor - spent,
+            "percent": round(spent * 100 / budget.limit_minor, 1),
+            "thresholds": thresholds_of(budget),
+        })
+    return result
+
+
+def alerts(user, month=None, limit=20):
+    """Уведомления контекста за месяц, новые сначала"""
+    month = month or month_key(datetime.utcnow())
+    return (
+        BudgetAlert.query.filter_by(scope=scope_key(user), month=month)
+        .order_by(BudgetAlert.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def alert_message(alert):
+    name = alert.category.name if alert.category else "Без категории"
+    if alert.threshold >= 100:
+        head = f"{name}: лимит превышен" if alert.spent_minor > alert.limit_minor else f"{name}: лимит исчерпан"
+    else:
+        head = f"{name}: потрачено {alert.threshold}% лимита"
+    return f"{head} ({format_money(alert.spent_minor)} из {format_money(alert.limit_minor)} ₽)"
+
+
+def serialize_status(row):
+    return {
+        "id": row["id"],
+        "category": row["category"],
+        "category_id": row["category_id"],
+        "limit": format_money(row["limit_minor"]),
+        "spent": format_money(row["spent_minor"]),
+        "remaining": format_money(row["remaining_minor"]),
+        "percent": row["percent"],
+        "thresholds": row["thresholds"],
+    }
+
+
+def serialize_alert(alert):
+    return {
+        "id": alert.id,
+        "month": alert.month,
+        "category_id": alert.category_id,
+        "threshold": alert.threshold,
+        "spent": format_money(alert.spent_minor),
+        "limit": format_money(alert.limit_minor),
+        "transaction_id": alert.transaction_id,
+        "created_at": alert.created_at.isoformat() if alert.created_at else None,
+        "message": alert_message(alert),
+    }
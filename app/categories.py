@@ -0,0 +1,57 @@
+"""
+Справочник категорий: один Category на (контекст, нормализованное имя)
+
+"Еда", "еда " и "ЕДА" сводятся к одной записи, а группировки в аналитике
+идут по целому category_id, а не по произвольной строке.
+"""
+
+import re
+
+from sqlalchemy.dialects.sqlite import insert
+
+from . import db
+from .models import Category
+
+_SPACES = re.compile(r"\s+")
+
+
+def clean_name(name):
+    """Имя для отображения: без лишних пробелов, с заглавной буквы"""
+    name = _SPACES.sub(" ", (name or "").strip())[:64]
+    return name[:1].upper() + name[1:]
+
+
+def normalize_name(name):
+    """Ключ сравнения: регистр, пробелы и «ё» не важны"""
+    return _SPACES.sub(" ", (name or "").strip()).casefold().replace("ё", "е")[:64]
+
+
+def get_or_create(scope, name):
+    """
+    Возвращает Category для имени, создавая её при первом использовании.
+    Работает внутри текущей транзакции; гонку двух воркеров разрешает
+    уникальный индекс (scope, name_norm) и INSERT ... ON CONFLICT DO NOTHING
+    """
+    norm = normalize_name(name)
+    if not norm:
+        raise ValueError("Пустое название категории")
+
+    category = Category.query.filter_by(scope=scope, name_norm=norm).first()
+    if category is not None:
+        return category
+
+    db.session.execute(
+        insert(Category)
+        .values(scope=scope, name=clean_name(name), name_norm=norm)
+        .on_conflict_do_nothing(index_elements=["scope", "name_norm"])
+    )
+    return Category.query.filter_by(scope=scope, name_norm=norm).one()
+
+
+def autocomplete(scope, prefix, limit=10):
+    """Категории контекста, начинающиеся с prefix (диапазон по индексу, без LIKE)"""
+    norm = normalize_name(prefix)
+    q = Category.query.filter_by(scope=scope)
+    if norm:
+        q = q.filter(Category.name_norm >= norm, Category.name_norm < norm + "\U0010ffff")
+    return [c.name for c in q.order_by(Category.name_norm).limit(limit)]
@@ -0,0 +1,267 @@
+"""
+Подсказка категории по описанию и магазину — наивный Байес без сети
+
+Модель контекста — счётчики CategorizerToken: в скольких операциях типа
+(расход/доход) каждой категории встретилось слово описания или магазина
+(пустое слово — число операций категории). learn() вызывается на пути
+записи из ledger.new_transaction(): одна вставка-upsert на слово в той же
+транзакции, что и операция, так что модель учится на каждой новой операции.
+
+suggest() считает по модели в памяти процесса: LRU до CATEGORIZER_CACHE_SCOPES
+контекстов, проверка актуальности — чтение версии CategorizerState по
+первичному ключу. Операции этого процесса доливаются в модель в памяти после
+коммита, изменения других воркеров — перечитыванием счётчиков контекста.
+
+Слова — буквенные, от 2 символов, обрезанные до 6 символов: грубая основа,
+чтобы «продукты» и «продуктов» были одним словом. Обучение с нуля по
+истории — flask categorizer-train (заполнение "categorizer", app/backfill.py).
+"""
+
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.sqlite import insert
+
+from . import db, backfill, metrics
+from .models import CategorizerState, CategorizerToken, Category
+from .scope import transaction_scope
+
+metrics.describe(
+    "categorizer_suggest_seconds", "histogram", "Подсказка категории по описанию",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+)
+
+DOCS = ""          # слово-счётчик операций категории
+STEM = 6           # длина грубой основы слова
+MAX_TOKENS = 24    # слов с одной операции
+ALPHA = 1.0        # сглаживание Лапласа
+MIN_PROBABILITY = 0.05
+
+_WORD = re.compile(r"[^\W\d_]{2,}")
+
+
+def features(description, merchant_name=None):
+    """Слова операции: основы описания и (с префиксом m:) магазина, без повторов"""
+    words = {w[:STEM] for w in _WORD.findall((description or "").casefold().replace("ё", "е"))}
+    words.update("m:" + w[:STEM] for w in _WORD.findall((merchant_name or "").casefold().replace("ё", "е")))
+    return sorted(words)[:MAX_TOKENS]
+
+
+# ---------- МОДЕЛЬ В ПАМЯТИ ----------
+
+class _Model:
+    """Счётчики одного контекста: docs[type][category_id], counts[type][слово][category_id]"""
+
+    __slots__ = ("version", "docs", "counts", "names")
+
+    def __init__(self, version):
+        self.version = version
+        self.docs = {}
+        self.counts = {}
+        self.names = {}    # category_id -> имя
+
+    def add(self, ttype, category_id, token, n):
+        if token == DOCS:
+            docs = self.docs.setdefault(ttype, {})
+            docs[category_id] = docs.get(category_id, 0) + n
+            return
+        by_category = self.counts.setdefault(ttype, {}).setdefault(token, {})
+        by_category[category_id] = by_category.get(category_id, 0) + n
+
+    def predict(self, ttype, tokens, limit):
+        """
+        [(category_id, вероятность)] по убыванию; [] если ни одно слово не знакомо.
+        Вероятность слова в категории — доля её операций с этим словом
+        (счётчики бинарные), учитываются только слова из запроса
+        """
+        docs = self.docs.get(ttype)
+        counts = self.counts.get(ttype, {})
+        known = [counts[t] for t in tokens if t in counts]
+        if not docs or not known:
+            return []
+        prior = math.log(sum(docs.values()))
+        scores = {}
+        for category_id, n_docs in docs.items():
+            denominator = math.log(n_docs + 2 * ALPHA)
+            score = math.log(n_docs) - prior
+            for by_category in known:
+                score += math.log(by_category.get(category_id, 0) + ALPHA) - denominator
+            scores[category_id] = score
+        top = max(scores.values())
+        weights = {category_id: math.exp(s - top) for category_id, s in scores.items()}
+        norm = sum(weights.values())
+        ranked = sorted(weights.items(), key=lambda item: -item[1])[:limit]
+        return [(category_id, w / norm) for category_id, w in ranked if w / norm >= MIN_PROBABILITY]
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _version(scope):
+    return db.session.query(CategorizerState.version).filter_by(scope=scope).scalar() or 0
+
+
+def _load(scope, version):
+    model = _Model(version)
+    rows = db.session.query(
+        CategorizerToken.type, CategorizerToken.category_id, CategorizerToken.token, CategorizerToken.count
+    ).filter_by(scope=scope)
+    for ttype, category_id, token, n in rows:
+        model.add(ttype, category_id, token, n)
+    model.names = dict(db.session.query(Category.id, Category.name).filter_by(scope=scope))
+    return model
+
+
+def _model(scope):
+    version = _version(scope)
+    with _lock:
+        model = _cache.get(scope)
+        if model is not None and model.version == version:
+            _cache.move_to_end(scope)
+            return model
+    model = _load(scope, version)
+    with _lock:
+        _cache[scope] = model
+        _cache.move_to_end(scope)
+        while len(_cache) > current_app.config["CATEGORIZER_CACHE_SCOPES"]:
+            _cache.popitem(last=False)
+    return model
+
+
+def suggest(scope, ttype, description, merchant_name=None, limit=3):
+    """
+    Вероятные категории для операции:
+    [{'category_id', 'category', 'probability'}] — пусто, если подсказать нечего
+    """
+    tokens = features(description, merchant_name)
+    if not tokens:
+        return []
+    started = time.perf_counter()
+    model = _model(scope)
+    ranked = model.predict(ttype, tokens, limit)
+    metrics.observe("categorizer_suggest_seconds", time.perf_counter() - started)
+    result = []
+    for category_id, probability in ranked:
+        name = model.names.get(category_id)
+        if name is None:
+            category = db.session.get(Category, category_id)
+            if category is None:
+                continue
+            name = model.names[category_id] = category.name
+        result.append({"category_id": category_id, "category": name, "probability": round(probability, 3)})
+    return result
+
+
+# ---------- ОБУЧЕНИЕ ----------
+
+def _upsert_tokens():
+    stmt = insert(CategorizerToken)
+    return stmt.on_conflict_do_update(
+        index_elements=["scope", "type", "category_id", "token"],
+        set_={"count": CategorizerToken.count + stmt.excluded.count},
+    )
+
+
+def _bump_version():
+    stmt = insert(CategorizerState)
+    return stmt.on_conflict_do_update(
+        index_elements=["scope"],
+        set_={"version": CategorizerState.version + 1, "updated_at": stmt.excluded.updated_at},
+    )
+
+
+def learn(transaction):
+    """
+    Учит модель контекста на новой операции (внутри транзакции записи,
+    после flush). Изменение для кэша этого процесса — в t.categorizer_update
+    """
+    tokens = features(transaction.description, transaction.merchant_name)
+    if not tokens or transaction.category_id is None:
+        return
+    scope = transaction_scope(transaction)
+    db.session.execute(_upsert_tokens(), [
+        {"scope": scope, "type": transaction.type, "category_id": transaction.category_id, "token": token, "count": 1}
+        for token in [DOCS] + tokens
+    ])
+    version = db.session.execute(
+        _bump_version().returning(CategorizerState.version),
+        {"scope": scope, "version": 1, "updated_at": datetime.utcnow()},
+    ).scalar()
+    transaction.categorizer_update = (scope, version, tokens)
+
+
+def after_commit(transactions):
+    """Доливает закоммиченные операции в модели кэша, если между ними не было чужих изменений"""
+    with _lock:
+        for t in transactions:
+            update_ = getattr(t, "categorizer_update", None)
+            if update_ is None:
+                continue
+            scope, version, tokens = update_
+            model = _cache.get(scope)
+            if model is None or model.version != version - 1:
+                continue  # модели нет или она отстала — следующая подсказка перечитает счётчики
+            for token in [DOCS] + tokens:
+                model.add(t.type, t.category_id, token, 1)
+            model.names.setdefault(t.category_id, t.category)
+            model.version = version
+
+
+def _wipe(connection):
+    # в одной транзакции с end_id прохода: операции после него модель выучит на пути записи
+    connection.execute(delete(CategorizerToken))
+    connection.execute(update(CategorizerState).values(version=CategorizerState.version + 1))
+
+
+@backfill.register("categorizer", "transaction", where="description IS NOT NULL OR merchant_name IS NOT NULL",
+                   reset=_wipe)
+def _train(connection, lo, hi):
+    """Обучение модели категорий по истории операций (новый проход стирает модель)"""
+    counts = Counter()
+    scopes = set()
+    rows = connection.execute(
+        db.text(
+            'SELECT user_id, family_id, type, category_id, description, merchant_name FROM "transaction" '
+            "WHERE id > :lo AND id <= :hi AND category_id IS NOT NULL"
+        ),
+        {"lo": lo, "hi": hi},
+    )
+    docs = 0
+    for user_id, family_id, ttype, category_id, description, merchant_name in rows:
+        tokens = features(description, merchant_name)
+        if not tokens:
+            continue
+        scope = f"f{family_id}" if family_id else f"u{user_id}"
+        scopes.add(scope)
+        docs += 1
+        for token in [DOCS] + tokens:
+            counts[(scope, ttype, category_id, token)] += 1
+
+    if counts:
+        connection.execute(_upsert_tokens(), [
+            {"scope": scope, "type": ttype, "category_id": category_id, "token": token, "count": n}
+            for (scope, ttype, category_id, token), n in counts.items()
+        ])
+        now = datetime.utcnow()
+        connection.execute(_bump_version(), [{"scope": scope, "version": 1, "updated_at": now} for scope in scopes])
+    return docs
+
+
+def init_app(app):
+    @app.cli.command("categorizer-train")
+    @click.option("--resume", is_flag=True, help="продолжить прерванное обучение")
+    def categorizer_train(resume):
+        """Обучает модель подсказки категорий заново по всей истории операций."""
+        docs = backfill.run(
+            "categorizer", restart=not resume,
+            progress=lambda last_id, end_id, done, size: click.echo(f"  id {last_id}/{end_id}, операций: {done}"),
+        )
+        click.echo(f"Обучено на операциях: {docs}")
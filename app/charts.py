@@ -0,0 +1,70 @@
+"""
+Ряды для графиков с прореживанием на сервере
+
+Дневной ряд (баланс, доходы, расходы, сальдо) берётся из analytics.series()
+и прореживается до бюджета точек, который передаёт клиент (обычно ширина
+графика в пикселях). Готовые ответы кэшируются в процессе по
+(контекст, метрика, диапазон, бюджет, метод): запись этого процесса
+сбрасывает кэш контекста сразу, записи других воркеров — через CHART_CACHE_TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from . import analytics, metrics
+from .downsample import METHODS
+from .scope import scope_key
+
+METRICS_ALLOWED = ("balance", "income", "expense", "net")
+MAX_POINTS = 5000
+
+metrics.describe("chart_cache_requests_total", "counter", "Обращения к кэшу рядов для графиков")
+
+_lock = threading.Lock()
+_cache = OrderedDict()   # ключ -> (время, ответ)
+_versions = {}           # контекст -> номер версии, растёт при записи
+
+
+def invalidate(scope):
+    with _lock:
+        _versions[scope] = _versions.get(scope, 0) + 1
+
+
+def chart_series(user, metric, since, until, points, method="lttb"):
+    """{'metric', 'method', 'total_points', 'points': [[день, копейки], ...]}"""
+    if metric not in METRICS_ALLOWED:
+        raise ValueError("Метрика должна быть одной из: " + ", ".join(METRICS_ALLOWED))
+    if method not in METHODS:
+        raise ValueError("Метод должен быть одним из: " + ", ".join(METHODS))
+    points = max(3, min(points, MAX_POINTS))
+
+    scope = scope_key(user)
+    ttl = current_app.config.get("CHART_CACHE_TTL", 60)
+    with _lock:
+        key = (scope, _versions.get(scope, 0), metric, since, until, points, method)
+        cached = _cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            _cache.move_to_end(key)
+            metrics.inc("chart_cache_requests_total", result="hit")
+            return cached[1]
+    metrics.inc("chart_cache_requests_total", result="miss")
+
+    periods = analytics.series(user, since, until, "day")["periods"]
+    xs = list(range(len(periods)))
+    ys = [p[metric] for p in periods]
+    keep = METHODS[method](xs, ys, points)
+    result = {
+        "metric": metric,
+        "method": method,
+        "total_points": len(periods),
+        "points": [[periods[i]["period"], ys[i]] for i in keep],
+    }
+
+    with _lock:
+        _cache[key] = (time.monotonic(), result)
+        while len(_cache) > current_app.config.get("CHART_CACHE_SIZE", 256):
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,83 @@
+"""
+Настройка SQLite и повтор записи при блокировке БД
+
+PRAGMA из SQLITE_PRAGMAS выполняются на каждом новом соединении
+(WAL, synchronous, cache_size, mmap_size, busy_timeout). При нескольких
+воркерах gunicorn запись всё равно сериализуется, поэтому коммиты на
+горячих путях идут через run_with_retry(): при «database is locked»
+транзакция откатывается и повторяется с экспоненциальной паузой.
+"""
+
+import random
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from . import db, metrics
+
+metrics.describe("db_lock_retries_total", "counter", "Повторы записи из-за блокировки SQLite")
+metrics.describe("db_lock_failures_total", "counter", "Записи, не прошедшие после всех повторов")
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def init_app(app):
+    pragmas = app.config.get("SQLITE_PRAGMAS") or {}
+    if not pragmas:
+        return
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != "sqlite":
+            return
+        event.listen(engine, "connect", _apply_pragmas(pragmas))
+        # соединения, открытые до подписки (create_all и т.п.), пересоздаём
+        engine.dispose()
+
+
+def is_lock_error(exc):
+    message = str(getattr(exc, "orig", exc)).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def run_with_retry(work, retries=None, base_delay=None):
+    """
+    Выполняет work() и commit с повтором при блокировке SQLite.
+
+    work() должна сама создавать и добавлять объекты в сессию: после
+    rollback несохранённые объекты удаляются из сессии, и следующая
+    попытка начинает с чистого листа. Возвращает результат work().
+    """
+    if retries is None:
+        retries = current_app.config.get("DB_LOCK_RETRIES", 3)
+    if base_delay is None:
+        base_delay = current_app.config.get("DB_LOCK_RETRY_DELAY", 0.05)
+
+    attempt = 0
+    while True:
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_lock_error(e):
+                raise
+            if attempt >= retries:
+                metrics.inc("db_lock_failures_total")
+                raise
+            metrics.inc("db_lock_retries_total")
+            # экспоненциальная пауза со случайным разбросом, чтобы воркеры не просыпались разом
+            time.sleep(base_delay * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
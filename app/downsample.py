@@ -0,0 +1,66 @@
+"""
+Прореживание временных рядов для графиков
+
+lttb() — Largest-Triangle-Three-Buckets: из каждой корзины берётся точка,
+образующая наибольший треугольник с соседями, так что форма ряда
+сохраняется. minmax() — минимум и максимум каждой корзины: не теряет
+пиков, удобно для расходов. Обе функции возвращают индексы выбранных
+точек по возрастанию; первая и последняя точка всегда сохраняются.
+"""
+
+
+def lttb(xs, ys, threshold):
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # среднее следующей корзины (для последней — последняя точка)
+        next_start, next_end = end, min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            avg_x, avg_y = xs[-1], ys[-1]
+        else:
+            span = next_end - next_start
+            avg_x = sum(xs[next_start:next_end]) / span
+            avg_y = sum(ys[next_start:next_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, min(end, n - 1)):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def minmax(xs, ys, threshold):
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+
+    buckets = max(1, (threshold - 2) // 2)
+    bucket_size = (n - 2) / buckets
+    selected = {0, n - 1}
+    for i in range(buckets):
+        start = int(i * bucket_size) + 1
+        end = min(int((i + 1) * bucket_size) + 1, n - 1)
+        if start >= end:
+            continue
+        window = range(start, end)
+        selected.add(min(window, key=ys.__getitem__))
+        selected.add(max(window, key=ys.__getitem__))
+    return sorted(selected)
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
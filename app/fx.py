@@ -0,0 +1,187 @@
+"""
+Курсы валют и перевод сумм в базовую валюту (BASE_CURRENCY)
+
+Операция в валюте хранит исходную сумму (original_minor, currency), а
+amount_minor — сумму в базовой валюте по курсу на дату операции. Поэтому
+агрегаты, бюджеты и аналитика суммируют одно целое поле, как и раньше, а
+перевод происходит один раз — при записи.
+
+Курсы загружаются из локального CSV (flask fx-load) в таблицу fx_rate: курс
+на дату — базовых единиц за единицу валюты, целым числом миллионных
+(rate_micro). В памяти процесса курсы лежат по валюте двумя
+отсортированными массивами (дни, курсы): курс на дату — бинарный поиск
+последнего дня не позже её (выходные, праздники). Кэш сверяется с таблицей
+не чаще раза в FX_CACHE_SECONDS.
+
+to_base_many() переводит пачку сумм: курс ищется один раз на пару
+(валюта, день), а не на каждую строку.
+"""
+
+import bisect
+import csv
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+import click
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from . import db
+from .database import run_with_retry
+from .models import FxRate
+from .money import div_round
+
+RATE_SCALE = 1_000_000
+LOAD_CHUNK = 1000
+
+_lock = threading.Lock()
+_cache = {"signature": None, "checked": 0.0, "rates": {}}   # rates: {валюта: (дни, курсы)}
+
+
+def base_currency():
+    return current_app.config["BASE_CURRENCY"]
+
+
+def normalize(code):
+    """'usd ' -> 'USD'; None/'' и базовая валюта -> None (суммы в базовой валюте)"""
+    code = (code or "").strip().upper()
+    if not code or code == base_currency():
+        return None
+    if len(code) != 3 or not code.isalpha():
+        raise ValueError(f"Неизвестная валюта: {code}")
+    return code
+
+
+def _signature():
+    # правка старого курса тоже меняет сумму курсов
+    return db.session.query(func.count(), func.max(FxRate.date), func.total(FxRate.rate_micro)).one()
+
+
+def _rates():
+    """{валюта: (дни (ordinal), курсы)} с перечитыванием после загрузки курсов"""
+    now = time.monotonic()
+    with _lock:
+        if now - _cache["checked"] < current_app.config["FX_CACHE_SECONDS"]:
+            return _cache["rates"]
+    signature = tuple(_signature())
+    with _lock:
+        if signature != _cache["signature"]:
+            rates = {}
+            rows = (
+                db.session.query(FxRate.currency, FxRate.date, FxRate.rate_micro)
+                .order_by(FxRate.currency, FxRate.date)
+            )
+            for currency, day, rate in rows:
+                days, values = rates.setdefault(currency, ([], []))
+                days.append(day.toordinal())
+                values.append(rate)
+            _cache["rates"] = rates
+            _cache["signature"] = signature
+        _cache["checked"] = now
+        return _cache["rates"]
+
+
+def invalidate():
+    with _lock:
+        _cache["checked"] = 0.0
+
+
+def currencies():
+    """Валюты, для которых есть курсы (для выбора в формах)"""
+    return sorted(_rates())
+
+
+def _day(value):
+    if value is None:
+        value = datetime.utcnow()
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal()
+
+
+def to_base_many(items):
+    """
+    [(валюта | None, дата | None, сумма в копейках валюты)] -> [сумма в копейках
+    базовой валюты | None]. None — курса на эту дату или раньше нет
+    """
+    rates = _rates()
+    found = {}
+    result = []
+    for currency, day, minor in items:
+        if currency is None:
+            result.append(minor)
+            continue
+        key = (currency, _day(day))
+        if key not in found:
+            days, values = rates.get(currency, ((), ()))
+            i = bisect.bisect_right(days, key[1]) - 1
+            found[key] = values[i] if i >= 0 else None
+        rate = found[key]
+        result.append(None if rate is None else div_round(minor * rate, RATE_SCALE))
+    return result
+
+
+def to_base(currency, day, minor):
+    """Одна сумма в базовую валюту; ValueError, если курса нет"""
+    converted = to_base_many([(currency, day, minor)])[0]
+    if converted is None:
+        raise ValueError(f"Нет курса {currency} на {date.fromordinal(_day(day)):%d.%m.%Y}")
+    return converted
+
+
+# ---------- ЗАГРУЗКА ----------
+
+def _parse_row(line, row):
+    """CSV-строка date,currency,rate[,nominal] -> (дата, валюта, rate_micro)"""
+    try:
+        nominal = int(row.get("nominal") or 1)
+        rate = Decimal(row["rate"].strip().replace(",", "."))
+        day = date.fromisoformat(row["date"].strip())
+    except (KeyError, AttributeError, ValueError, InvalidOperation) as exc:
+        raise ValueError(f"Строка {line}: ожидается date,currency,rate[,nominal]") from exc
+    currency = (row.get("currency") or "").strip().upper()
+    if len(currency) != 3 or not currency.isalpha() or rate <= 0 or nominal <= 0:
+        raise ValueError(f"Строка {line}: некорректная валюта или курс")
+    return day, currency, int((rate * RATE_SCALE / nominal).to_integral_value())
+
+
+def load_csv(path):
+    """
+    Курсы из CSV с заголовком date,currency,rate[,nominal] (курс — базовых единиц
+    за nominal единиц валюты, как у ЦБ). Повторная загрузка обновляет курсы.
+    Возвращает число строк
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [_parse_row(line, row) for line, row in enumerate(csv.DictReader(f), start=2)]
+
+    stmt = insert(FxRate)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["date", "currency"],
+        set_={"rate_micro": stmt.excluded.rate_micro},
+    )
+    for i in range(0, len(rows), LOAD_CHUNK):
+        chunk = rows[i:i + LOAD_CHUNK]
+
+        def work():
+            db.session.execute(stmt, [
+                {"date": day, "currency": currency, "rate_micro": rate} for day, currency, rate in chunk
+            ])
+
+        run_with_retry(work)
+    invalidate()
+    return len(rows)
+
+
+def init_app(app):
+    @app.cli.command("fx-load")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    def fx_load(path):
+        """Загружает курсы валют из CSV: date,currency,rate[,nominal]."""
+        try:
+            count = load_csv(path)
+        except ValueError as exc:
+            raise click.ClickException(str(exc))
+        click.echo(f"Загружено курсов: {count}, валюты: {', '.join(currencies()) or '—'}")
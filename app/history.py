@@ -0,0 +1,93 @@
+"""
+История операций с keyset-пагинацией по (date, id)
+
+Следующая страница запрашивается не через OFFSET, а условием
+(date, id) < (дата и id последней строки) по составному индексу
+контекста — страница N стоит столько же, сколько первая.
+Курсор — непрозрачная строка, клиенту разбирать её не нужно.
+"""
+
+import base64
+from datetime import datetime, timedelta
+
+from sqlalchemy import tuple_
+
+from .models import Transaction
+from .scope import transactions_query
+
+TYPES = ("income", "expense")
+
+
+def encode_cursor(transaction):
+    raw = f"{transaction.date.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(date, id) из курсора; ValueError для испорченного значения"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        day, tx_id = raw.split("|")
+        return datetime.fromisoformat(day), int(tx_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Некорректный курсор") from exc
+
+
+def parse_filters(args):
+    """
+    Фильтры из query string: type, category (id), member (id пользователя),
+    date_from / date_to (ГГГГ-ММ-ДД, обе границы включительно).
+    Пустые значения пропускаются, некорректные — ValueError
+    """
+    filters = {}
+    ttype = args.get("type")
+    if ttype:
+        if ttype not in TYPES:
+            raise ValueError("Неизвестный тип операции")
+        filters["type"] = ttype
+    for name in ("category", "member"):
+        if args.get(name):
+            try:
+                filters[name] = int(args[name])
+            except ValueError as exc:
+                raise ValueError(f"Некорректный параметр {name}") from exc
+    for name in ("date_from", "date_to"):
+        if args.get(name):
+            try:
+                filters[name] = datetime.strptime(args[name], "%Y-%m-%d")
+            except ValueError as exc:
+                raise ValueError("Дата должна быть в формате ГГГГ-ММ-ДД") from exc
+    return filters
+
+
+def filtered_query(user, filters):
+    q = transactions_query(user).filter(Transaction.date.isnot(None))
+    if "type" in filters:
+        q = q.filter(Transaction.type == filters["type"])
+    if "category" in filters:
+        q = q.filter(Transaction.category_id == filters["category"])
+    if "member" in filters:
+        q = q.filter(Transaction.user_id == filters["member"])
+    if "date_from" in filters:
+        q = q.filter(Transaction.date >= filters["date_from"])
+    if "date_to" in filters:
+        q = q.filter(Transaction.date < filters["date_to"] + timedelta(days=1))
+    return q
+
+
+def page(user, filters, cursor=None, limit=50):
+    """
+    Страница истории от новых к старым.
+    Возвращает (операции, курсор следующей страницы или None)
+    """
+    q = filtered_query(user, filters)
+    if cursor:
+        q = q.filter(tuple_(Transaction.date, Transaction.id) < decode_cursor(cursor))
+
+    rows = (
+        q.order_by(Transaction.date.desc(), Transaction.id.desc())
+         .limit(limit + 1)
+         .all()
+    )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,157 @@
+"""
+Наблюдения для страницы «Умный анализ» без LLM
+
+build() получает готовый результат analytics.series() — агрегаты по
+периодам и категориям — и за один проход по его точкам считает для каждой
+категории сумму, сумму квадратов и Σ(номер периода × сумма). Отсюда
+последний и предыдущий период, среднее и разброс истории (аномалии),
+наклон линейного тренда (рост) — без повторного чтения операций.
+
+Результат детерминирован: одни и те же агрегаты дают те же наблюдения в том
+же порядке. Комментарий LLM (ai_service.comment_insights) страница
+запрашивает отдельно, уже после отрисовки.
+"""
+
+import math
+
+from .money import MINOR_PER_UNIT, format_money
+
+# изменение меньше этой суммы не считаем заметным (копейки)
+MIN_DELTA_MINOR = 1000 * MINOR_PER_UNIT
+SPIKE_RATIO = 1.5     # последний период к предыдущему
+ANOMALY_Z = 2.0       # отклонение от среднего истории в стандартных отклонениях
+MIN_HISTORY = 3       # периодов истории для аномалий и тренда
+TOP_GROWTH = 3
+LOW_SAVINGS_PERCENT = 10
+
+_LAST = {"day": "последний день", "week": "последнюю неделю", "month": "последний месяц", "year": "последний год"}
+_PREV = {"day": "предыдущий", "week": "предыдущую", "month": "предыдущий", "year": "предыдущий"}
+_PER = {"day": "день", "week": "неделю", "month": "месяц", "year": "год"}
+
+# порядок вывода: сначала то, что требует внимания
+_LEVELS = {"warning": 0, "info": 1, "good": 2}
+
+
+def _rub(minor):
+    return f"{format_money(minor)} ₽"
+
+
+class _Acc:
+    """Суммы по точкам одного ряда: хватает для последних значений, среднего и тренда"""
+
+    __slots__ = ("total", "squares", "weighted", "last", "prev")
+
+    def __init__(self):
+        self.total = self.squares = self.weighted = 0
+        self.last = self.prev = 0
+
+    def add(self, i, value, n):
+        self.total += value
+        self.squares += value * value
+        self.weighted += i * value
+        if i == n - 1:
+            self.last = value
+        elif i == n - 2:
+            self.prev = value
+
+    def history(self, n):
+        """(среднее, стандартное отклонение) периодов до последнего, пустые — нули"""
+        k = n - 1
+        mean = (self.total - self.last) / k
+        variance = max(0.0, (self.squares - self.last * self.last) / k - mean * mean)
+        return mean, math.sqrt(variance)
+
+    def slope(self, n):
+        """Наклон МНК-прямой по всем периодам, копеек за период"""
+        sx = n * (n - 1) / 2
+        sxx = (n - 1) * n * (2 * n - 1) / 6
+        return (n * self.weighted - sx * self.total) / (n * sxx - sx * sx)
+
+
+def _item(kind, level, text, category=None, value=None):
+    return {"kind": kind, "level": level, "text": text, "category": category, "value": value}
+
+
+def build(data):
+    """
+    Наблюдения по результату analytics.series():
+    [{'kind', 'level': warning|info|good, 'text', 'category', 'value'}]
+    """
+    periods = data["periods"]
+    n = len(periods)
+    if not n:
+        return []
+    granularity = data["granularity"]
+    index = {p["period"]: i for i, p in enumerate(periods)}
+
+    # единственный проход по точкам категорий
+    accs = {}
+    for c in data["categories"]:
+        acc = accs[(c["type"], c["name"])] = _Acc()
+        for point in c["points"]:
+            acc.add(index[point["period"]], point["total"], n)
+
+    income = sum(p["income"] for p in periods)
+    expense = sum(p["expense"] for p in periods)
+    result = []
+
+    # доля дохода, которая остаётся
+    if income:
+        saved = income - expense
+        percent = round(saved * 100 / income)
+        if saved < 0:
+            result.append(_item("income_ratio", "warning",
+                                f"Расходы превысили доходы на {_rub(-saved)} ({-percent}% дохода).", value=percent))
+        elif percent < LOW_SAVINGS_PERCENT:
+            result.append(_item("income_ratio", "warning",
+                                f"Остаётся только {percent}% дохода ({_rub(saved)}).", value=percent))
+        else:
+            result.append(_item("income_ratio", "good",
+                                f"Остаётся {percent}% дохода — {_rub(saved)} за период.", value=percent))
+    elif expense:
+        result.append(_item("income_ratio", "warning",
+                            f"Доходов за период нет, расходы — {_rub(expense)}.", value=None))
+
+    expenses = {name: acc for (ttype, name), acc in accs.items() if ttype == "expense"}
+
+    # крупнейшая статья расходов
+    if expense and expenses:
+        name, acc = max(expenses.items(), key=lambda item: (item[1].total, item[0]))
+        share = round(acc.total * 100 / expense)
+        result.append(_item("top_share", "info",
+                            f"Больше всего уходит на «{name}» — {share}% расходов ({_rub(acc.total)}).",
+                            category=name, value=share))
+
+    growth = []
+    for name, acc in sorted(expenses.items()):
+        if n > MIN_HISTORY:
+            mean, std = acc.history(n)
+            if acc.last - mean >= MIN_DELTA_MINOR and acc.last > mean + ANOMALY_Z * std:
+                result.append(_item(
+                    "anomaly", "warning",
+                    f"«{name}»: необычно много — {_rub(acc.last)} за {_LAST[granularity]} "
+                    f"при обычных {_rub(round(mean))} за {_PER[granularity]}.",
+                    category=name, value=acc.last - round(mean),
+                ))
+                continue  # аномалия уже говорит о скачке
+        if n > 1 and acc.prev and acc.last - acc.prev >= MIN_DELTA_MINOR and acc.last >= acc.prev * SPIKE_RATIO:
+            result.append(_item(
+                "spike", "warning",
+                f"«{name}»: {_rub(acc.last)} за {_LAST[granularity]} — "
+                f"в {acc.last / acc.prev:.1f} раза больше, чем за {_PREV[granularity]}.",
+                category=name, value=acc.last - acc.prev,
+            ))
+        if n > MIN_HISTORY:
+            slope = acc.slope(n)
+            if slope * n >= MIN_DELTA_MINOR:
+                growth.append((slope, name))
+
+    # категории с самым быстрым ростом по тренду всего диапазона
+    if growth:
+        growth.sort(key=lambda item: (-item[0], item[1]))
+        parts = [f"«{name}» (+{_rub(round(slope))} за {_PER[granularity]})" for slope, name in growth[:TOP_GROWTH]]
+        result.append(_item("growth", "info", "Быстрее всего растут расходы: " + ", ".join(parts) + ".",
+                            value=[name for _, name in growth[:TOP_GROWTH]]))
+
+    result.sort(key=lambda item: _LEVELS[item["level"]])
+    return result
@@ -0,0 +1,131 @@
+"""
+Общий путь записи операций
+
+new_transaction() вызывается внутри work() для run_with_retry(): категория,
+строка операции, месячный агрегат и уведомления о бюджете попадают в один
+коммит, как и счётчики модели подсказки категорий и событие для открытых
+дашбордов (app/live.py). after_commit() делает то, что нужно только после
+успешного коммита: кэш аналитики и модели категорий этого процесса и кэш
+графиков.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db, analytics_cache, budgets, categories, categorizer, charts, fx, live, rollups
+from .models import Transaction, User
+from .money import format_money
+from .scope import scope_key, transaction_scope
+
+TYPES = ("income", "expense")
+
+# сколько строк класть в одно SSE-событие (дашборд показывает последние 10)
+LIVE_ROWS = 10
+
+
+def new_transaction(user, ttype, amount_minor, category_name, description=None, date=None,
+                    currency=None, base_minor=None, **fields):
+    """
+    Добавляет операцию в текущую транзакцию и возвращает её (id уже есть).
+    Новые уведомления о бюджете — в t.budget_alerts.
+
+    amount_minor — в валюте currency (None — базовая). Сумму в базовой валюте
+    пакетная запись передаёт готовой в base_minor (fx.to_base_many),
+    иначе она считается здесь по курсу на дату
+    """
+    currency = fx.normalize(currency)
+    original_minor = None
+    if currency is not None:
+        original_minor = amount_minor
+        amount_minor = base_minor if base_minor is not None else fx.to_base(currency, date, amount_minor)
+    category = categories.get_or_create(scope_key(user), category_name)
+    t = Transaction(
+        user_id=user.id,
+        family_id=user.family_id,  # если нет семьи — будет None
+        type=ttype,
+        amount_minor=amount_minor,
+        currency=currency,
+        original_minor=original_minor,
+        category=category.name,
+        category_id=category.id,
+        description=description,
+        **fields,
+    )
+    if date is not None:
+        t.date = date
+    db.session.add(t)
+    db.session.flush()
+    # месячный агрегат и скетч квантилей — в той же транзакции,
+    # по его сумме за месяц сразу сверяем лимит категории
+    stat = rollups.apply(t)
+    t.budget_alerts = budgets.check(t, stat)
+    # модель подсказки категорий учится на каждой операции с описанием
+    categorizer.learn(t)
+    stage_live([t])
+    return t
+
+
+def format_totals(totals):
+    return {
+        "income": format_money(totals["income"]),
+        "expense": format_money(totals["expense"]),
+        "balance": format_money(totals["income"] - totals["expense"]),
+    }
+
+
+def after_commit(user, transactions):
+    """Обновления после коммита новых операций пользователя"""
+    if not transactions:
+        return
+    for t in transactions:
+        analytics_cache.record(user, t)
+    charts.invalidate(scope_key(user))
+    categorizer.after_commit(transactions)
+    live.notify()
+
+
+# ---------- СОБЫТИЯ ДЛЯ ДАШБОРДОВ ----------
+
+def stage_live(transactions):
+    """Новые операции текущей транзакции: событие дашбордам запишется в том же коммите"""
+    db.session.info.setdefault("live_pending", []).extend(transactions)
+
+
+@event.listens_for(Session, "before_commit")
+def _publish_live(session):
+    pending = session.info.pop("live_pending", None)
+    if not pending:
+        return
+    by_scope = {}
+    for t in pending:
+        by_scope.setdefault(transaction_scope(t), []).append(t)
+    for scope, transactions in by_scope.items():
+        authors = {t.user_id: session.get(User, t.user_id) for t in transactions}
+        # открытым дашбордам семьи — новые строки и итоги, без перезагрузки страницы
+        live.publish(session, scope, "transaction", {
+            "transactions": [
+                {
+                    "id": t.id,
+                    "date": t.date.strftime("%d.%m.%Y"),
+                    "type": t.type,
+                    "amount": format_money(t.amount_minor),
+                    "category": t.category,
+                    "description": t.description,
+                    "author": authors[t.user_id].name or authors[t.user_id].email,
+                }
+                for t in sorted(transactions, key=lambda t: (t.date, t.id))[-LIVE_ROWS:]
+            ],
+            # под блокировкой записи — не агрегат по всем операциям, а месячные строки,
+            # уже обновлённые в этой транзакции (rollups.apply)
+            "totals": format_totals(rollups.totals(scope)),
+            "alerts": [
+                budgets.serialize_alert(alert)
+                for t in transactions for alert in getattr(t, "budget_alerts", ())
+            ],
+        })
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_live(session):
+    # повтор run_with_retry заново создаст операции и заново их отметит
+    session.info.pop("live_pending", None)
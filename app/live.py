@@ -0,0 +1,185 @@
+"""
+Живые обновления дашборда семьи
+
+Коммит новых операций кладёт в той же транзакции небольшое событие (новые
+строки и итоги) в таблицу live_event — отдельной записи и лишнего захвата
+блокировки SQLite нет. Дашборд забирает события одним из двух способов:
+
+- по умолчанию опрашивает /app/live/events?after=<id> раз в
+  LIVE_CLIENT_POLL_SECONDS: короткий запрос, воркер не занят;
+- при LIVE_SSE_ENABLED=1 держит EventSource (Server-Sent Events). В каждом
+  процессе один фоновый поток опрашивает таблицу по первичному ключу
+  (id > последнего увиденного) и раздаёт события локальным подпискам через
+  очереди — межворкерная рассылка через общий файл SQLite; запись в этом
+  же процессе будит поток сразу. SSE-соединение занимает поток воркера,
+  поэтому включать его стоит только под gunicorn с
+  --worker-class gthread (или gevent) и запасом потоков.
+"""
+
+import json
+import queue
+import random
+import threading
+
+from flask import current_app
+from sqlalchemy import text
+
+from . import db, metrics
+from .models import LiveEvent
+
+metrics.describe("live_subscribers", "gauge", "Открытые SSE-подписки процесса")
+metrics.describe("live_events_total", "counter", "События, разосланные подписчикам")
+
+PRUNE_CHANCE = 0.01
+
+
+class Broker:
+    """Подписки процесса: контекст -> множество очередей"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.last_id = None
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def subscribe(self, scope, app):
+        q = queue.Queue(maxsize=100)
+        with self.lock:
+            if not self.subscribers:
+                # рассылка начинается с событий после подписки, а не после первого опроса
+                self.last_id = last_id()
+            self.subscribers.setdefault(scope, set()).add(q)
+            self._ensure_thread(app)
+            metrics.set_gauge("live_subscribers", self._count())
+        return q
+
+    def unsubscribe(self, scope, q):
+        with self.lock:
+            queues = self.subscribers.get(scope)
+            if queues is not None:
+                queues.discard(q)
+                if not queues:
+                    del self.subscribers[scope]
+            metrics.set_gauge("live_subscribers", self._count())
+
+    def _count(self):
+        return sum(len(qs) for qs in self.subscribers.values())
+
+    def dispatch(self, event_id, scope, kind, payload):
+        with self.lock:
+            queues = list(self.subscribers.get(scope, ()))
+        for q in queues:
+            try:
+                q.put_nowait((event_id, kind, payload))
+                metrics.inc("live_events_total")
+            except queue.Full:
+                # вкладка не читает — пропускаем, она догонит по Last-Event-ID
+                pass
+
+    def _ensure_thread(self, app):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._poll_loop, args=(app,), daemon=True,
+                                           name="live-event-poller")
+            self.thread.start()
+
+    def _poll_loop(self, app):
+        interval = app.config.get("LIVE_POLL_INTERVAL", 0.5)
+        with app.app_context():
+            while True:
+                with self.lock:
+                    # подписчиков нет — не опрашиваем; курсор выставит следующая подписка
+                    idle = not self.subscribers
+                    last = self.last_id
+                if idle:
+                    self.wakeup.wait(interval)
+                    self.wakeup.clear()
+                    continue
+                try:
+                    with db.engine.connect() as conn:
+                        rows = conn.execute(
+                            text("SELECT id, scope, kind, payload FROM live_event WHERE id > :last ORDER BY id"),
+                            {"last": last},
+                        ).all()
+                    for event_id, scope, kind, payload in rows:
+                        self.dispatch(event_id, scope, kind, payload)
+                    if rows:
+                        with self.lock:
+                            # за время опроса могла появиться новая первая подписка со своим курсором
+                            self.last_id = max(self.last_id or 0, rows[-1][0])
+                except Exception:
+                    app.logger.exception("live: ошибка опроса событий")
+                self.wakeup.wait(interval)
+                self.wakeup.clear()
+
+
+broker = Broker()
+
+
+def last_id():
+    """Последний номер события: с него начинают подписка и опрос дашборда"""
+    with db.engine.connect() as conn:
+        return conn.execute(text("SELECT coalesce(max(id), 0) FROM live_event")).scalar()
+
+
+def publish(session, scope, kind, payload):
+    """
+    Добавляет событие в текущую транзакцию session: подписчики увидят его
+    только вместе с закоммиченными операциями. Изредка заодно удаляет старые
+    события, которые уже не нужны даже для догоняния
+    """
+    session.add(LiveEvent(scope=scope, kind=kind, payload=json.dumps(payload, ensure_ascii=False)))
+    if random.random() < PRUNE_CHANCE:
+        session.execute(
+            text("DELETE FROM live_event WHERE id <= (SELECT max(id) FROM live_event) - :keep"),
+            {"keep": current_app.config.get("LIVE_EVENT_KEEP", 10000)},
+        )
+
+
+def notify():
+    """После коммита: будит поток рассылки этого процесса, не дожидаясь интервала опроса"""
+    broker.wakeup.set()
+
+
+def missed_events(scope, last_event_id):
+    """События контекста после last_event_id — для переподключения EventSource и опроса"""
+    rows = (
+        LiveEvent.query.filter(LiveEvent.scope == scope, LiveEvent.id > last_event_id)
+        .order_by(LiveEvent.id)
+        .limit(100)
+        .all()
+    )
+    return [(e.id, e.kind, e.payload) for e in rows]
+
+
+def stream(scope, last_event_id=None):
+    """Генератор SSE: пропущенные события, затем живые; комментарий-пульс раз в LIVE_HEARTBEAT"""
+    app = current_app._get_current_object()
+    heartbeat = app.config.get("LIVE_HEARTBEAT", 15)
+    # подписываемся до чтения пропущенного, чтобы не потерять событие между ними
+    q = broker.subscribe(scope, app)
+    backlog = missed_events(scope, last_event_id) if last_event_id is not None else []
+    # соединение с БД на время долгого ответа не держим
+    db.session.remove()
+
+    def generate():
+        last_sent = last_event_id or 0
+        try:
+            yield "retry: 3000\n\n"
+            for event_id, kind, payload in backlog:
+                last_sent = event_id
+                yield f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+            while True:
+                try:
+                    event_id, kind, payload = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if event_id <= last_sent:
+                    continue
+                last_sent = event_id
+                yield f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+        finally:
+            broker.unsubscribe(scope, q)
+
+    return generate()
@@ -0,0 +1,273 @@
+"""
+Метрики приложения в текстовом формате Prometheus (/metrics)
+
+Каждый процесс копит счётчики и гистограммы в памяти. Под gunicorn
+воркеры периодически сбрасывают свой снимок в METRICS_DIR
+(metrics-<pid>.json), а /metrics складывает снимки всех воркеров —
+поэтому не важно, какой воркер обслужил запрос к /metrics.
+"""
+
+import json
+import os
+import threading
+import time
+
+from flask import g, request, current_app, Response, has_request_context, abort
+from sqlalchemy import event
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# name -> (тип, описание, корзины)
+METRICS = {
+    "http_requests_total": ("counter", "Количество HTTP-запросов", None),
+    "http_request_duration_seconds": ("histogram", "Время обработки HTTP-запроса", LATENCY_BUCKETS),
+    "db_queries_total": ("counter", "Количество SQL-запросов", None),
+    "db_queries_per_request": ("histogram", "SQL-запросов на один HTTP-запрос", QUERY_COUNT_BUCKETS),
+    "db_time_per_request_seconds": ("histogram", "Время в БД на один HTTP-запрос", LATENCY_BUCKETS),
+    "llm_requests_total": ("counter", "Количество обращений к LLM", None),
+    "llm_request_duration_seconds": ("histogram", "Время ответа LLM", LATENCY_BUCKETS),
+}
+
+
+def describe(name, kind, help_text, buckets=None):
+    """Регистрирует метрику (для модулей, которые добавляют свои)"""
+    METRICS[name] = (kind, help_text, tuple(buckets) if buckets else None)
+
+
+class Registry:
+    """Потокобезопасное хранилище метрик одного процесса"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                # [счётчики по корзинам..., +Inf], сумма
+                h = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    h[0][i] += 1
+                    break
+            else:
+                h[0][-1] += 1
+            h[1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                "gauges": [[n, list(l), v] for (n, l), v in self.gauges.items()],
+                "histograms": [[n, list(l), list(h[0]), h[1]] for (n, l), h in self.histograms.items()],
+            }
+
+
+registry = Registry()
+
+# Короткие функции для остального кода
+inc = registry.inc
+observe = registry.observe
+set_gauge = registry.set
+
+
+# ---------- ОБЪЕДИНЕНИЕ СНИМКОВ ВОРКЕРОВ ----------
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_snapshots(snapshots):
+    """Складывает снимки: счётчики и гистограммы суммируются, gauge — только живых процессов"""
+    counters, gauges, histograms = {}, {}, {}
+    for snap in snapshots:
+        alive = snap["pid"] == os.getpid() or _pid_alive(snap["pid"])
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        if alive:
+            for name, labels, value in snap["gauges"]:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+        for name, labels, counts, total in snap["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            h = histograms.get(key)
+            if h is None or len(h[0]) != len(counts):
+                histograms[key] = [list(counts), total]
+            else:
+                h[0] = [a + b for a, b in zip(h[0], counts)]
+                h[1] += total
+    return counters, gauges, histograms
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f"metrics-{pid}.json")
+
+
+def flush(directory):
+    """Атомарно записывает снимок текущего процесса в общий каталог"""
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory, os.getpid())
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(registry.snapshot(), fh)
+    os.replace(tmp, path)
+
+
+def collect(directory=None):
+    """Снимки всех процессов (или только текущего, если каталог не задан)"""
+    if not directory:
+        return [registry.snapshot()]
+
+    flush(directory)
+    snapshots = []
+    for filename in os.listdir(directory):
+        if not (filename.startswith("metrics-") and filename.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, filename), encoding="utf-8") as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            # файл мог быть удалён или переписан между listdir и open
+            continue
+    return snapshots
+
+
+# ---------- ТЕКСТОВЫЙ ФОРМАТ ----------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs, extra=None):
+    items = list(pairs) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+def render(snapshots):
+    counters, gauges, histograms = merge_snapshots(snapshots)
+
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append(("value", labels, value))
+    for (name, labels), value in gauges.items():
+        by_name.setdefault(name, []).append(("value", labels, value))
+    for (name, labels), h in histograms.items():
+        by_name.setdefault(name, []).append(("histogram", labels, h))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text, buckets = METRICS.get(name, ("untyped", "", None))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_kind, labels, value in sorted(by_name[name], key=lambda s: s[1]):
+            if sample_kind == "value":
+                lines.append(f"{name}{_labels(labels)} {_fmt(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, n in zip(list(buckets) + [float("inf")], counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels, ('le', _fmt(float(bound))))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_fmt(float(total))}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- ПОДКЛЮЧЕНИЕ К ПРИЛОЖЕНИЮ ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    if has_request_context() and "metrics_started" in g:
+        g.metrics_queries += 1
+        g.metrics_db_time += elapsed
+    else:
+        # запросы вне HTTP-запроса (CLI-команды, фоновые потоки)
+        inc("db_queries_total", endpoint="-")
+
+
+def init_app(app):
+    from . import db
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(db.engine, "after_cursor_execute", _after_cursor_execute)
+
+    state = {"last_flush": 0.0}
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_time = 0.0
+
+    @app.after_request
+    def record_request_metrics(response):
+        if "metrics_started" not in g:
+            return response
+
+        endpoint = request.endpoint or str(response.status_code)
+        elapsed = time.perf_counter() - g.metrics_started
+
+        inc("http_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+        observe("http_request_duration_seconds", elapsed, endpoint=endpoint, method=request.method)
+        observe("db_queries_per_request", g.metrics_queries, endpoint=endpoint)
+        observe("db_time_per_request_seconds", g.metrics_db_time, endpoint=endpoint)
+        if g.metrics_queries:
+            inc("db_queries_total", g.metrics_queries, endpoint=endpoint)
+
+        directory = app.config.get("METRICS_DIR")
+        now = time.monotonic()
+        if directory and now - state["last_flush"] >= app.config.get("METRICS_FLUSH_INTERVAL", 1.0):
+            state["last_flush"] = now
+            try:
+                flush(directory)
+            except OSError:
+                app.logger.warning("Не удалось сохранить метрики в %s", directory, exc_info=True)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        token = current_app.config.get("METRICS_TOKEN")
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            abort(403)
+        body = render(collect(current_app.config.get("METRICS_DIR")))
+        return Response(body, mimetype="text/plain; version=0.0.4; charset=utf-8")
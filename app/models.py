@@ -31,18 +31,292 @@ class Transaction(db.Model):
     
     # Основные поля
     type = db.Column(db.String(10), nullable=False)  # 'income' / 'expense'
-    amount = db.Column(db.Float, nullable=False)
-    category = db.Column(db.String(64), nullable=False)
+    amount_minor = db.Column(db.BigInteger, nullable=False)  # в копейках, см. app/money.py
+    category = db.Column(db.String(64), nullable=False)  # имя категории для отображения
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
     description = db.Column(db.String(255))
     date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Операция в валюте (app/fx.py): amount_minor — в базовой валюте по курсу на дату,
+    # здесь — исходная сумма. NULL — операция в базовой валюте
+    currency = db.Column(db.String(3))
+    original_minor = db.Column(db.BigInteger)
     
     # НОВЫЕ ПОЛЯ ДЛЯ ЧЕКОВ
     receipt_image = db.Column(db.String(512))  # Путь к скану чека
     merchant_name = db.Column(db.String(128))  # Название магазина/ресторана
     
+    # Синхронизация офлайн-клиентов (app/sync.py): номер изменения растёт при каждой
+    # вставке/правке, client_id — ключ идемпотентности операции, созданной на клиенте
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sync_seq = db.Column(db.BigInteger)
+    client_id = db.Column(db.String(64))
+
+    # Операция, созданная по регулярному правилу (app/recurring.py); одна на (правило, дату)
+    recurring_rule_id = db.Column(db.Integer)
+
     # Связь с товарами из чека
     items = db.relationship("TransactionItem", backref="transaction", lazy=True, cascade="all, delete-orphan")
 
+    # Keyset-пагинация истории идёт по (date, id) внутри контекста или фильтра,
+    # см. app/history.py; индекс по category_id заменён составным.
+    # (контекст, type, amount_minor) — крупные расходы диапазоном по сумме (app/advice.py)
+    __table_args__ = (
+        db.Index("ix_transaction_family_date_id", "family_id", "date", "id"),
+        db.Index("ix_transaction_family_type_date_id", "family_id", "type", "date", "id"),
+        db.Index("ix_transaction_user_date_id", "user_id", "date", "id"),
+        db.Index("ix_transaction_category_date_id", "category_id", "date", "id"),
+        db.Index("ix_transaction_family_sync_seq", "family_id", "sync_seq"),
+        db.Index("ix_transaction_user_sync_seq", "user_id", "sync_seq"),
+        db.Index("uq_transaction_sync_seq", "sync_seq", unique=True),
+        db.Index("uq_transaction_user_client_id", "user_id", "client_id", unique=True),
+        db.Index("uq_transaction_recurring_date", "recurring_rule_id", "date", unique=True),
+        db.Index("ix_transaction_family_type_amount", "family_id", "type", "amount_minor"),
+        db.Index("ix_transaction_user_type_amount", "user_id", "type", "amount_minor"),
+    )
+
+
+class Category(db.Model):
+    """Справочник категорий в пределах семьи (или личного учёта)"""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(24), nullable=False)  # "f<family_id>" / "u<user_id>", см. app/scope.py
+    name = db.Column(db.String(64), nullable=False)
+    name_norm = db.Column(db.String(64), nullable=False)  # нижний регистр, без лишних пробелов
+
+    # Индекс служит и для поиска при добавлении, и для автодополнения по префиксу
+    __table_args__ = (db.UniqueConstraint("scope", "name_norm", name="uq_category_scope_name"),)
+
+
+class MonthlyCategoryStat(db.Model):
+    """
+    Месячный агрегат по (контекст, месяц, тип, категория), см. app/rollups.py.
+    Обновляется в той же транзакции, что и операция
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(24), nullable=False)  # "f<family_id>" / "u<user_id>"
+    month = db.Column(db.String(7), nullable=False)   # "ГГГГ-ММ"
+    type = db.Column(db.String(10), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_minor = db.Column(db.BigInteger, nullable=False, default=0)
+    min_minor = db.Column(db.BigInteger)
+    max_minor = db.Column(db.BigInteger)
+    sketch = db.Column(db.LargeBinary)  # QuantileSketch.to_bytes(), см. app/sketch.py
+
+    __table_args__ = (
+        db.UniqueConstraint("scope", "month", "type", "category_id", name="uq_monthly_category_stat"),
+    )
+
+
+class Budget(db.Model):
+    """Месячный лимит расходов по категории в контексте, см. app/budgets.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(24), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"), nullable=False)
+    limit_minor = db.Column(db.BigInteger, nullable=False)
+    thresholds = db.Column(db.String(64))  # проценты через запятую, "80,100"; пусто — из конфига
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    category = db.relationship("Category")
+
+    __table_args__ = (db.UniqueConstraint("scope", "category_id", name="uq_budget_scope_category"),)
+
+
+class BudgetAlert(db.Model):
+    """Пересечение порога бюджета; по одному на (контекст, месяц, категория, порог)"""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(24), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # "ГГГГ-ММ"
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"), nullable=False)
+    threshold = db.Column(db.Integer, nullable=False)  # в процентах от лимита
+    spent_minor = db.Column(db.BigInteger, nullable=False)
+    limit_minor = db.Column(db.BigInteger, nullable=False)
+    transaction_id = db.Column(db.Integer)  # операция, на которой порог пересечён
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    category = db.relationship("Category")
+
+    __table_args__ = (
+        db.UniqueConstraint("scope", "month", "category_id", "threshold", name="uq_budget_alert"),
+    )
+
+
+class RecurringRule(db.Model):
+    """
+    Регулярная операция (аренда, зарплата, подписка): каждые interval
+    дней/недель/месяцев/лет начиная со start_date, см. app/recurring.py
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(24), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)  # от чьего имени операции
+    family_id = db.Column(db.Integer, db.ForeignKey("family.id"))
+    type = db.Column(db.String(10), nullable=False)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"), nullable=False)
+    description = db.Column(db.String(255))
+    freq = db.Column(db.String(8), nullable=False)  # day / week / month / year
+    interval = db.Column(db.Integer, nullable=False, default=1)
+    start_date = db.Column(db.Date, nullable=False)
+    until_date = db.Column(db.Date)
+    materialized_through = db.Column(db.Date)  # операции по эту дату включительно уже созданы
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    category = db.relationship("Category")
+
+    __table_args__ = (
+        db.Index("ix_recurring_rule_due", "active", "materialized_through"),
+        db.Index("ix_recurring_rule_scope", "scope"),
+    )
+
+
+class ArchivedTransaction(db.Model):
+    """
+    Операция, перенесённая из горячей таблицы командой flask archive-cold
+    (app/archive.py): те же столбцы и id, товары чека — JSON в items
+    """
+    __tablename__ = "transaction_archive"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    family_id = db.Column(db.Integer)
+    type = db.Column(db.String(10), nullable=False)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+    category = db.Column(db.String(64), nullable=False)
+    category_id = db.Column(db.Integer)
+    description = db.Column(db.String(255))
+    date = db.Column(db.DateTime)
+    currency = db.Column(db.String(3))
+    original_minor = db.Column(db.BigInteger)
+    receipt_image = db.Column(db.String(512))
+    merchant_name = db.Column(db.String(128))
+    updated_at = db.Column(db.DateTime)
+    sync_seq = db.Column(db.BigInteger)
+    client_id = db.Column(db.String(64))
+    recurring_rule_id = db.Column(db.Integer)
+    items = db.Column(db.Text)  # [{"item_name", "quantity", "price_minor"}, ...] или NULL
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_transaction_archive_family_date", "family_id", "date"),
+        db.Index("ix_transaction_archive_user_date", "user_id", "date"),
+    )
+
+
+class ArchiveMonthStat(db.Model):
+    """
+    Итоги архивных операций по (контекст, месяц, тип, категория): аналитика
+    складывает их с горячими строками вместо чтения архива
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(24), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # "ГГГГ-ММ"
+    type = db.Column(db.String(10), nullable=False)
+    category_id = db.Column(db.Integer)
+    count = db.Column(db.Integer, nullable=False)
+    total_minor = db.Column(db.BigInteger, nullable=False)
+    min_minor = db.Column(db.BigInteger)
+    max_minor = db.Column(db.BigInteger)
+
+    __table_args__ = (
+        db.UniqueConstraint("scope", "month", "type", "category_id", name="uq_archive_month_stat"),
+    )
+
+
+class ArchiveState(db.Model):
+    """Версия архива контекста: растёт с каждой порцией переноса (сброс кэшей аналитики)"""
+    scope = db.Column(db.String(24), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    rows = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class BackfillCheckpoint(db.Model):
+    """Докуда дошло заполнение данных (app/backfill.py): продолжение после остановки"""
+    name = db.Column(db.String(64), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)  # порции по id <= last_id готовы
+    end_id = db.Column(db.BigInteger)  # max(id) на момент старта; новые строки — забота пути записи
+    rows = db.Column(db.BigInteger, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+
+class CategorizerToken(db.Model):
+    """
+    Счётчик наивного Байеса (app/categorizer.py): в скольких операциях типа
+    категории встретилось слово. Пустой token — число операций категории
+    """
+    scope = db.Column(db.String(24), primary_key=True)
+    type = db.Column(db.String(10), primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(40), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CategorizerState(db.Model):
+    """Версия модели категорий контекста: кэши других процессов перечитывают счётчики"""
+    scope = db.Column(db.String(24), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Advice(db.Model):
+    """
+    Последний совет LLM контекста (app/advice.py) и ключ данных, по которым он
+    получен: страница показывает его сразу, повторная генерация — только при новом ключе
+    """
+    scope = db.Column(db.String(24), primary_key=True)
+    key = db.Column(db.String(64), nullable=False)  # advice.cache_key входных данных
+    text = db.Column(db.Text, nullable=False)
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class FxRate(db.Model):
+    """Курс валюты на дату (app/fx.py): базовых единиц за единицу валюты × 1 000 000"""
+    date = db.Column(db.Date, primary_key=True)
+    currency = db.Column(db.String(3), primary_key=True)
+    rate_micro = db.Column(db.BigInteger, nullable=False)
+
+
+class TelegramLink(db.Model):
+    """Чат Telegram пользователя (app/telegram_bot.py); до привязки — одноразовый код"""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    chat_id = db.Column(db.BigInteger, unique=True)
+    code = db.Column(db.String(16), unique=True)
+    code_expires_at = db.Column(db.DateTime)
+    linked_at = db.Column(db.DateTime)
+
+
+class SyncCounter(db.Model):
+    """Последний выданный номер изменения (app/sync.py); одна строка с id = 1"""
+    id = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class TransactionTombstone(db.Model):
+    """След удалённой операции: офлайн-клиент должен узнать об удалении при синхронизации"""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(24), nullable=False)
+    transaction_id = db.Column(db.Integer, nullable=False)
+    sync_seq = db.Column(db.BigInteger, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_transaction_tombstone_scope_seq", "scope", "sync_seq"),
+        db.Index("ix_transaction_tombstone_seq", "sync_seq"),
+    )
+
+
+class LiveEvent(db.Model):
+    """Событие для SSE-подписчиков контекста, общее для всех воркеров (app/live.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(24), nullable=False)
+    kind = db.Column(db.String(32), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON, уходит в data: как есть
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index("ix_live_event_scope_id", "scope", "id"),)
+
 
 # НОВАЯ МОДЕЛЬ для детализации чеков
 class TransactionItem(db.Model):
@@ -51,4 +325,4 @@ class TransactionItem(db.Model):
     transaction_id = db.Column(db.Integer, db.ForeignKey("transaction.id"), nullable=False)
     item_name = db.Column(db.String(128), nullable=False)
     quantity = db.Column(db.Float, default=1.0)
-    price = db.Column(db.Float, nullable=False)
+    price_minor = db.Column(db.BigInteger, nullable=False)  # в копейках
@@ -0,0 +1,50 @@
+"""
+Денежные суммы в целых минорных единицах (копейках)
+
+В БД и во всех агрегатах суммы хранятся целыми числами — SUM по целым
+точен и дешевле, чем по float. В рубли переводим только на границе:
+в шаблонах (фильтр money) и во входных данных для AI-симулятора.
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+MINOR_PER_UNIT = 100
+
+
+def to_minor(value):
+    """'1234,5' / 1234.5 / Decimal → 123450. Бросает ValueError на мусоре"""
+    if isinstance(value, int):
+        return value * MINOR_PER_UNIT
+    if isinstance(value, float):
+        # через repr: 12.345 → Decimal("12.345"), а не 12.3449999… из двоичного представления
+        value = repr(value)
+    if isinstance(value, str):
+        value = value.strip().replace("\u00a0", "").replace(" ", "").replace(",", ".")
+    try:
+        amount = Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"Некорректная сумма: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Некорректная сумма: {value!r}")
+    return int((amount * MINOR_PER_UNIT).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def to_units(minor):
+    """Копейки → рубли (float) для расчётов, где точность копеек не нужна"""
+    return (minor or 0) / MINOR_PER_UNIT
+
+
+def format_money(minor, signed=False):
+    """Копейки → строка '1234.56' без потерь точности (фильтр шаблонов money)"""
+    minor = int(minor or 0)
+    sign = "-" if minor < 0 else ("+" if signed and minor > 0 else "")
+    units, cents = divmod(abs(minor), MINOR_PER_UNIT)
+    return f"{sign}{units}.{cents:02d}"
+
+
+def div_round(total, n):
+    """Целочисленное деление с округлением к ближайшему (для средних в копейках)"""
+    if not n:
+        return 0
+    q, r = divmod(total, n)
+    return q + (1 if 2 * r >= n else 0)
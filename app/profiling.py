@@ -0,0 +1,168 @@
+"""
+Профилирование отдельных запросов и поиск N+1 запросов к БД
+
+Профилирование включается для конкретного запроса заголовком
+X-Profile с подписанным токеном (flask profile-token) или случайно
+с вероятностью PROFILE_SAMPLE_RATE. Профиль cProfile сохраняется в
+PROFILE_DIR под id запроса (заголовок ответа X-Request-ID).
+
+Детектор повторяющихся запросов работает в debug-режиме (или при
+QUERY_DETECTOR_ENABLED) и пишет в лог одинаковые SQL, выполненные
+в одном запросе QUERY_DETECTOR_THRESHOLD и более раз, с местами вызова —
+типичный пример: ленивая загрузка Transaction.items в цикле шаблона.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import time
+import traceback
+import uuid
+from collections import Counter
+
+import click
+from flask import g, request, current_app, has_request_context
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy import event
+
+from . import metrics
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.join(APP_DIR, "profiling.py"), os.path.join(APP_DIR, "metrics.py")}
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+metrics.describe("db_repeated_queries_total", "counter", "Повторяющиеся SQL внутри одного запроса (N+1)")
+metrics.describe("profiled_requests_total", "counter", "Запросы, для которых снят профиль")
+
+
+def _serializer(app):
+    return URLSafeTimedSerializer(app.config["SECRET_KEY"], salt="request-profile")
+
+
+def make_profile_token(app):
+    """Токен для заголовка X-Profile"""
+    return _serializer(app).dumps({"profile": True})
+
+
+def _profile_requested(app):
+    token = request.headers.get("X-Profile")
+    if token:
+        try:
+            _serializer(app).loads(token, max_age=app.config.get("PROFILE_TOKEN_MAX_AGE", 3600))
+            return True
+        except BadSignature:
+            app.logger.warning("Неверный токен X-Profile от %s", request.remote_addr)
+    rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _call_site():
+    """Ближайшие к месту запроса кадры кода приложения (включая шаблоны)"""
+    frames = [
+        f for f in traceback.extract_stack()[:-1]
+        if f.filename.startswith(APP_DIR) and f.filename not in _SKIP_FILES
+    ]
+    return " <- ".join(
+        f"{os.path.relpath(f.filename, APP_DIR)}:{f.lineno}" for f in reversed(frames[-3:])
+    ) or "?"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "query_log" in g:
+        g.query_log[statement] += 1
+        if g.query_log[statement] == 2 or g.query_log[statement] == current_app.config["QUERY_DETECTOR_THRESHOLD"]:
+            # места вызова запоминаем один раз для повторов, не для каждого выполнения
+            g.query_sites.setdefault(statement, set()).add(_call_site())
+
+
+def _report_repeated_queries(app):
+    threshold = app.config["QUERY_DETECTOR_THRESHOLD"]
+    for statement, count in g.query_log.most_common():
+        if count < threshold:
+            break
+        metrics.inc("db_repeated_queries_total", count, endpoint=request.endpoint or "-")
+        sql = " ".join(statement.split())
+        app.logger.warning(
+            "N+1? %s: SQL выполнен %d раз за запрос %s\n  %s\n  вызовы: %s",
+            request.endpoint, count, g.request_id, sql[:300],
+            "; ".join(sorted(g.query_sites.get(statement, ()))),
+        )
+
+
+def _dump_profile(app, profiler):
+    directory = app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    endpoint = (request.endpoint or "unknown").replace(".", "_")
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{g.request_id}-{endpoint}.prof")
+    profiler.dump_stats(path)
+    metrics.inc("profiled_requests_total", endpoint=request.endpoint or "-")
+
+    if app.debug:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+        app.logger.info("Профиль %s сохранён в %s\n%s", g.request_id, path, out.getvalue())
+    return path
+
+
+def init_app(app):
+    from . import db
+
+    app.config.setdefault("QUERY_DETECTOR_THRESHOLD", 5)
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _before_cursor_execute)
+
+    def detector_enabled():
+        # app.debug проверяем в момент запроса: run.py включает его уже после create_app()
+        enabled = app.config.get("QUERY_DETECTOR_ENABLED")
+        return app.debug if enabled is None else enabled
+
+    @app.before_request
+    def start_profiling():
+        incoming = request.headers.get("X-Request-ID", "")
+        g.request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex[:16]
+
+        if detector_enabled():
+            g.query_log = Counter()
+            g.query_sites = {}
+
+        if _profile_requested(app):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # в этом потоке уже работает другой профилировщик
+                return
+            g.profiler = profiler
+
+    @app.after_request
+    def finish_profiling(response):
+        response.headers["X-Request-ID"] = g.get("request_id", "")
+
+        # профилировщик снимает stop_profiling: он выполняется и при исключении
+        profiler = g.get("profiler")
+        if profiler is not None:
+            try:
+                _dump_profile(app, profiler)  # dump_stats сам останавливает сбор
+                response.headers["X-Profile-Id"] = g.request_id
+            except OSError:
+                app.logger.warning("Не удалось сохранить профиль", exc_info=True)
+
+        if "query_log" in g:
+            _report_repeated_queries(app)
+        return response
+
+    @app.teardown_request
+    def stop_profiling(exc):
+        # без этого после исключения профилировщик остался бы включён в потоке воркера
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+
+    @app.cli.command("profile-token")
+    def profile_token():
+        """Печатает токен для заголовка X-Profile."""
+        click.echo(make_profile_token(app))
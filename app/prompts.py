@@ -0,0 +1,112 @@
+"""
+Компактные промпты для LLM с бюджетом токенов
+
+Размер промпта не должен расти вместе с историей семьи: списки (категории,
+крупные расходы) сводятся к top-N и строке «прочее» (top_n), а Prompt
+собирает текст под бюджет: обязательные строки идут целиком, списки
+обрезаются с конца до min_lines, об опущенных строках остаётся пометка.
+
+Токены оцениваются по длине текста (CHARS_PER_TOKEN — для смеси
+кириллицы, цифр и латиницы с запасом); точное число после вызова берётся
+из usage ответа и пишется в метрики (ai_service._chat).
+"""
+
+import math
+import os
+
+from .money import format_money
+
+CHARS_PER_TOKEN = 2.5
+# категорий поимённо, остальные — одной строкой «Прочее» (общая настройка
+# для промптов ai_service и входных данных advice)
+TOP_CATEGORIES = int(os.getenv("LLM_TOP_CATEGORIES", "8"))
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def top_n(items, n, other="Прочее"):
+    """
+    [(имя, копейки)] -> первые n по убыванию суммы (при равенстве — по имени)
+    и одна строка other с суммой остальных
+    """
+    ranked = sorted(items, key=lambda item: (-item[1], item[0]))
+    head, tail = ranked[:n], ranked[n:]
+    if tail:
+        head.append((f"{other} ({len(tail)} кат.)", sum(value for _, value in tail)))
+    return head
+
+
+def money_lines(items, whole=None):
+    """[(имя, копейки)] -> ['имя: 123.45 ₽ (12%)', ...]"""
+    return [
+        f"{name}: {format_money(value)} ₽" + (f" ({round(value * 100 / whole)}%)" if whole else "")
+        for name, value in items
+    ]
+
+
+class Prompt:
+    """Текст промпта из строк и сокращаемых списков, не длиннее budget токенов"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.parts = []   # ('line', текст) | ('list', заголовок, строки, min_lines)
+
+    def line(self, text=""):
+        self.parts.append(("line", text))
+        return self
+
+    def section(self, title, lines, min_lines=1):
+        self.parts.append(("list", title, list(lines), min_lines))
+        return self
+
+    def render(self):
+        # сначала обязательное: строки, заголовки и min_lines каждого списка,
+        # плюс место под пометку об опущенных строках
+        keep = {}
+        used = 0
+        for i, part in enumerate(self.parts):
+            if part[0] == "line":
+                used += _cost(part[1])
+            else:
+                _, title, lines, min_lines = part
+                keep[i] = min(min_lines, len(lines))
+                used += _cost(title) + sum(_cost(f"- {s}") for s in lines[:keep[i]])
+                if keep[i] < len(lines):
+                    used += _cost(_omitted(len(lines)))
+
+        # остаток бюджета — спискам по порядку, строка за строкой
+        for i, part in enumerate(self.parts):
+            if part[0] != "list":
+                continue
+            lines = part[2]
+            while keep[i] < len(lines):
+                cost = _cost(f"- {lines[keep[i]]}")
+                if keep[i] + 1 == len(lines):
+                    cost -= _cost(_omitted(len(lines)))  # последняя строка заменяет пометку
+                if used + cost > self.budget:
+                    break
+                used += cost
+                keep[i] += 1
+
+        out = []
+        for i, part in enumerate(self.parts):
+            if part[0] == "line":
+                out.append(part[1])
+                continue
+            _, title, lines, _ = part
+            out.append(title)
+            out.extend(f"- {s}" for s in lines[:keep[i]])
+            if keep[i] < len(lines):
+                out.append(_omitted(len(lines) - keep[i]))
+        return "\n".join(out)
+
+
+def _cost(line):
+    # строка и её перевод строки
+    return estimate_tokens(line) + 1
+
+
+def _omitted(count):
+    return f"- … ещё {count} строк опущено"
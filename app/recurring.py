@@ -0,0 +1,318 @@
+"""
+Регулярные операции: аренда, зарплата, подписки
+
+RecurringRule задаёт расписание в духе RRULE: каждые interval дней, недель,
+месяцев или лет начиная со start_date (до until_date). Для месяцев и лет
+число месяца берётся из start_date, а в коротком месяце сдвигается на его
+последний день (31-е -> 30 апреля -> 28/29 февраля).
+
+materialize() создаёт наступившие операции всех правил одним
+INSERT ... SELECT: даты порождает рекурсивный CTE, повторы отсекает
+уникальный индекс (recurring_rule_id, date), поэтому команду можно
+перезапускать сколько угодно. materialized_through запоминает, докуда
+правило уже разложено, чтобы CTE не перебирал даты с самого начала.
+
+occurrences() и upcoming() вычисляют те же даты в Python без записи в БД —
+для симулятора и прогнозов.
+"""
+
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+
+import click
+from sqlalchemy import text
+
+from . import db, budgets, categories, ledger, rollups, sync
+from .database import run_with_retry
+from .models import RecurringRule, Transaction, User
+from .scope import scope_key
+
+FREQS = {"day": "день", "week": "неделя", "month": "месяц", "year": "год"}
+
+# сколько id операций подгружать одним IN (...)
+LOAD_CHUNK = 500
+
+# среднее число периодов в месяце — для месячной оценки правил
+_PER_MONTH = {"day": 365.25 / 12, "week": 365.25 / 12 / 7, "month": 1.0, "year": 1 / 12}
+# окно прогноза monthly_estimate: правила с until_date внутри него учитываются не полностью
+ESTIMATE_MONTHS = 12
+
+
+# ---------- ДАТЫ В PYTHON ----------
+
+def _add_months(start, months):
+    year, month = divmod(start.month - 1 + months, 12)
+    year += start.year
+    month += 1
+    return date(year, month, min(start.day, monthrange(year, month)[1]))
+
+
+def occurrence(rule, k):
+    """k-я (с нуля) дата правила"""
+    if rule.freq == "day":
+        return rule.start_date + timedelta(days=k * rule.interval)
+    if rule.freq == "week":
+        return rule.start_date + timedelta(weeks=k * rule.interval)
+    months = k * rule.interval * (12 if rule.freq == "year" else 1)
+    return _add_months(rule.start_date, months)
+
+
+def _first_index(rule, since):
+    """Номер, с которого перебирать даты >= since (может оказаться на один раньше)"""
+    if since <= rule.start_date:
+        return 0
+    if rule.freq in ("day", "week"):
+        step = rule.interval * (7 if rule.freq == "week" else 1)
+        return max(0, (since - rule.start_date).days // step)
+    months = (since.year - rule.start_date.year) * 12 + since.month - rule.start_date.month
+    return max(0, months // (rule.interval * (12 if rule.freq == "year" else 1)) - 1)
+
+
+def occurrences(rule, since, until):
+    """Даты правила в [since, until] — те же, что создаст materialize()"""
+    if rule.until_date is not None:
+        until = min(until, rule.until_date)
+    k = _first_index(rule, since)
+    result = []
+    while True:
+        day = occurrence(rule, k)
+        if day > until:
+            return result
+        if day >= since:
+            result.append(day)
+        k += 1
+
+
+def upcoming(user, since=None, until=None):
+    """
+    Будущие операции правил контекста, ещё не созданные в БД:
+    [{'rule_id', 'date', 'type', 'amount_minor', 'category', 'description'}] по дате
+    """
+    today = datetime.utcnow().date()
+    since = since or today + timedelta(days=1)
+    until = until or since + timedelta(days=30)
+    result = []
+    for rule in active_rules(user):
+        start = since
+        if rule.materialized_through is not None:
+            start = max(start, rule.materialized_through + timedelta(days=1))
+        for day in occurrences(rule, start, until):
+            result.append({
+                "rule_id": rule.id,
+                "date": day,
+                "type": rule.type,
+                "amount_minor": rule.amount_minor,
+                "category": rule.category.name,
+                "description": rule.description,
+            })
+    result.sort(key=lambda o: (o["date"], o["rule_id"]))
+    return result
+
+
+def monthly_estimate(user, today=None, months=ESTIMATE_MONTHS):
+    """
+    Ожидаемая сумма правил в среднем месяце ближайших months месяцев,
+    в копейках: {'income', 'expense'}. Закончившиеся правила не учитываются,
+    а заканчивающиеся внутри окна — только своими оставшимися датами
+    """
+    since = (today or datetime.utcnow().date()) + timedelta(days=1)
+    until = _add_months(since, months) - timedelta(days=1)
+    totals = {"income": 0.0, "expense": 0.0}
+    for rule in active_rules(user):
+        if rule.until_date is None or rule.until_date >= until:
+            totals[rule.type] += rule.amount_minor * _PER_MONTH[rule.freq] / rule.interval
+        elif rule.until_date >= since:
+            totals[rule.type] += rule.amount_minor * len(occurrences(rule, since, until)) / months
+    return {ttype: round(value) for ttype, value in totals.items()}
+
+
+def next_date(rule, today=None):
+    """Ближайшая дата правила после уже созданных (None, если расписание закончилось)"""
+    since = max(today or datetime.utcnow().date(), rule.start_date)
+    if rule.materialized_through is not None:
+        since = max(since, rule.materialized_through + timedelta(days=1))
+    dates = occurrences(rule, since, since + timedelta(days=366 * rule.interval + 31))
+    return dates[0] if dates else None
+
+
+# ---------- ПРАВИЛА ----------
+
+def active_rules(user):
+    return (
+        RecurringRule.query.filter_by(scope=scope_key(user), active=True)
+        .order_by(RecurringRule.start_date, RecurringRule.id)
+        .all()
+    )
+
+
+def create_rule(user, ttype, amount_minor, category_name, freq, start_date,
+                interval=1, until_date=None, description=None):
+    """Новое правило (внутри work() для run_with_retry)"""
+    if ttype not in ("income", "expense"):
+        raise ValueError("Неизвестный тип операции")
+    if amount_minor <= 0:
+        raise ValueError("Сумма должна быть больше нуля")
+    if freq not in FREQS:
+        raise ValueError("Период: день, неделя, месяц или год")
+    if interval < 1:
+        raise ValueError("Интервал — целое число от 1")
+    if until_date is not None and until_date < start_date:
+        raise ValueError("Дата окончания раньше даты начала")
+
+    scope = scope_key(user)
+    category = categories.get_or_create(scope, category_name)
+    rule = RecurringRule(
+        scope=scope, user_id=user.id, family_id=user.family_id, type=ttype,
+        amount_minor=amount_minor, category_id=category.id, description=description,
+        freq=freq, interval=interval, start_date=start_date, until_date=until_date,
+    )
+    db.session.add(rule)
+    db.session.flush()
+    return rule
+
+
+def deactivate(user, rule_id):
+    """Останавливает правило контекста; созданные операции остаются"""
+    return bool(
+        RecurringRule.query.filter_by(id=rule_id, scope=scope_key(user))
+        .update({"active": False}, synchronize_session=False)
+    )
+
+
+# ---------- РАЗЛОЖЕНИЕ В ОПЕРАЦИИ ----------
+
+# правила, у которых есть неразложенные даты по :today включительно
+_DUE = """
+    r.active AND r.start_date <= :today
+    AND (r.materialized_through IS NULL OR r.materialized_through < :today)
+    AND (r.until_date IS NULL OR r.materialized_through IS NULL OR r.materialized_through < r.until_date)
+    {only}
+"""
+
+# номер месяца от начала эры и шаг правила в днях/месяцах
+_MONTH_NO = "(CAST(strftime('%Y', {d}) AS INTEGER) * 12 + CAST(strftime('%m', {d}) AS INTEGER))"
+_STEP = "(r.interval * CASE r.freq WHEN 'week' THEN 7 WHEN 'year' THEN 12 ELSE 1 END)"
+
+
+def _occurrence_sql(k):
+    """SQL-выражение k-й даты правила d (столбцы freq, interval, start_date, step) — как occurrence()"""
+    month_start = f"date(d.start_date, 'start of month', '+' || ({k} * d.step) || ' months')"
+    last_day = f"CAST(strftime('%d', date({month_start}, '+1 month', '-1 day')) AS INTEGER)"
+    day = f"min(CAST(strftime('%d', d.start_date) AS INTEGER), {last_day})"
+    return (
+        f"CASE WHEN d.freq IN ('day', 'week') "
+        f"THEN date(d.start_date, '+' || ({k} * d.step) || ' days') "
+        f"ELSE date({month_start}, '+' || ({day} - 1) || ' days') END"
+    )
+
+
+_MATERIALIZE = """
+WITH RECURSIVE
+due AS (
+    SELECT r.id, r.user_id, r.family_id, r.type, r.amount_minor, r.category_id, r.description,
+           r.freq, r.start_date, r.materialized_through, {step} AS step,
+           min(:today, coalesce(r.until_date, :today)) AS bound,
+           CASE
+               WHEN r.materialized_through IS NULL THEN 0
+               WHEN r.freq IN ('day', 'week') THEN max(0, CAST(
+                   (julianday(r.materialized_through) - julianday(r.start_date)) / {step} AS INTEGER))
+               ELSE max(0, ({mt_month} - {start_month}) / {step} - 1)
+           END AS k0
+    FROM recurring_rule r
+    WHERE {due}
+),
+occ(rule_id, k, day) AS (
+    SELECT d.id, d.k0, {first} FROM due d
+    UNION ALL
+    SELECT o.rule_id, o.k + 1, {next}
+    FROM occ o JOIN due d ON d.id = o.rule_id
+    WHERE o.day <= d.bound
+)
+INSERT INTO "transaction" (user_id, family_id, type, amount_minor, category, category_id,
+                           description, date, updated_at, sync_seq, recurring_rule_id)
+SELECT d.user_id, d.family_id, d.type, d.amount_minor, c.name, d.category_id, d.description,
+       o.day || ' 00:00:00.000000', :now,
+       :seq_base + row_number() OVER (ORDER BY o.day, o.rule_id), o.rule_id
+FROM occ o
+JOIN due d ON d.id = o.rule_id
+JOIN category c ON c.id = d.category_id
+WHERE o.day <= d.bound
+  AND o.day >= d.start_date
+  AND (d.materialized_through IS NULL OR o.day > d.materialized_through)
+ON CONFLICT DO NOTHING
+RETURNING id
+"""
+
+_ADVANCE = """
+UPDATE recurring_rule AS r
+SET materialized_through = min(:today, coalesce(r.until_date, :today))
+WHERE {due}
+"""
+
+
+def _only(rule_ids):
+    if rule_ids is None:
+        return "", {}
+    params = {f"r{i}": rule_id for i, rule_id in enumerate(rule_ids)}
+    return "AND r.id IN ({})".format(", ".join(f":{name}" for name in params) or "NULL"), params
+
+
+def materialize(today=None, rule_ids=None):
+    """
+    Создаёт операции всех наступивших (по today включительно) дат правил
+    одним запросом и продвигает materialized_through. Повторный запуск
+    ничего не добавляет. Возвращает список новых операций
+    """
+    today = today or datetime.utcnow().date()
+    only, only_params = _only(rule_ids)
+    due = _DUE.format(only=only)
+    sql = _MATERIALIZE.format(
+        step=_STEP, due=due,
+        mt_month=_MONTH_NO.format(d="r.materialized_through"),
+        start_month=_MONTH_NO.format(d="r.start_date"),
+        first=_occurrence_sql("d.k0"),
+        next=_occurrence_sql("(o.k + 1)"),
+    )
+
+    def work():
+        params = {
+            "today": today.isoformat(),
+            "now": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f"),
+            "seq_base": sync.bulk_seq_base(),
+            **only_params,
+        }
+        ids = db.session.execute(text(sql), params).scalars().all()
+        sync.bulk_seq_done()
+        db.session.execute(text(_ADVANCE.format(due=due)), params)
+
+        created = []
+        for i in range(0, len(ids), LOAD_CHUNK):
+            created.extend(Transaction.query.filter(Transaction.id.in_(ids[i:i + LOAD_CHUNK])))
+        created.sort(key=lambda t: (t.date, t.id))
+        # агрегаты и бюджеты — по строке на (контекст, месяц, тип, категория), а не на операцию
+        for stat, last in rollups.apply_many(created).values():
+            last.budget_alerts = budgets.check(last, stat)
+        ledger.stage_live(created)
+        return created
+
+    created = run_with_retry(work)
+    _after_commit(created)
+    return created
+
+
+def _after_commit(created):
+    by_user = {}
+    for t in created:
+        by_user.setdefault(t.user_id, []).append(t)
+    for user_id, transactions in by_user.items():
+        ledger.after_commit(db.session.get(User, user_id), transactions)
+
+
+def init_app(app):
+    @app.cli.command("recurring-materialize")
+    @click.option("--date", "as_of", default=None, help="ГГГГ-ММ-ДД, по умолчанию сегодня")
+    def recurring_materialize(as_of):
+        """Создаёт наступившие регулярные операции всех семей (безопасно перезапускать)."""
+        today = date.fromisoformat(as_of) if as_of else None
+        created = materialize(today)
+        click.echo(f"Создано операций: {len(created)}")
@@ -0,0 +1,322 @@
+"""
+Месячные агрегаты по категориям со скетчами квантилей
+
+MonthlyCategoryStat хранит на (контекст, месяц, тип, категория) количество,
+сумму, минимум, максимум и QuantileSketch. apply() вызывается на пути записи
+в той же транзакции, что и операция, так что агрегаты не расходятся с данными.
+Статистика за произвольный диапазон собирается из полных месяцев (слияние
+скетчей) и строк только неполных крайних месяцев.
+
+Пересчёт с нуля (flask rollups-rebuild, миграция) — заполнения "rollups"
+(горячие операции; новый проход стирает агрегаты) и "rollups-archive"
+(архив) из app/backfill.py: порции по id короткими транзакциями, агрегат
+порции сливается со строкой таблицы вместе со скетчем. Операции после
+начала прохода учитывает путь записи. Одновременно с archive-cold пересчёт
+не запускают: перенесённая в архив строка попала бы в оба прохода.
+"""
+
+from datetime import datetime
+
+import click
+from sqlalchemy import bindparam, delete, func, select, text
+
+from . import db, backfill
+from .models import ArchivedTransaction, MonthlyCategoryStat, Transaction
+from .scope import scope_key, transaction_scope, transactions_query
+from .sketch import QuantileSketch
+
+
+def month_key(value):
+    return value.strftime("%Y-%m")
+
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value):
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+class _Acc:
+    """Агрегат в памяти: то же, что строка MonthlyCategoryStat"""
+
+    __slots__ = ("count", "total", "min", "max", "sketch")
+
+    def __init__(self):
+        self.count = self.total = 0
+        self.min = self.max = None
+        self.sketch = QuantileSketch()
+
+    def add(self, amount):
+        self.count += 1
+        self.total += amount
+        self.min = amount if self.min is None else min(self.min, amount)
+        self.max = amount if self.max is None else max(self.max, amount)
+        self.sketch.add(amount)
+
+    def merge_row(self, row):
+        if not row.count:
+            return
+        self.count += row.count
+        self.total += row.total_minor
+        self.min = row.min_minor if self.min is None else min(self.min, row.min_minor)
+        self.max = row.max_minor if self.max is None else max(self.max, row.max_minor)
+        self.sketch.merge(QuantileSketch.from_bytes(row.sketch))
+
+
+def _key(transaction):
+    return (transaction_scope(transaction), month_key(transaction.date),
+            transaction.type, transaction.category_id)
+
+
+def _update(key, amounts):
+    scope, month, ttype, category_id = key
+    row = MonthlyCategoryStat.query.filter_by(
+        scope=scope, month=month, type=ttype, category_id=category_id
+    ).first()
+    if row is None:
+        row = MonthlyCategoryStat(scope=scope, month=month, type=ttype, category_id=category_id,
+                                  count=0, total_minor=0)
+        db.session.add(row)
+
+    sketch = QuantileSketch.from_bytes(row.sketch)
+    for amount in amounts:
+        sketch.add(amount)
+    row.count += len(amounts)
+    row.total_minor += sum(amounts)
+    low, high = min(amounts), max(amounts)
+    row.min_minor = low if row.min_minor is None else min(row.min_minor, low)
+    row.max_minor = high if row.max_minor is None else max(row.max_minor, high)
+    row.sketch = sketch.to_bytes()
+    return row
+
+
+def apply(transaction):
+    """
+    Учитывает только что добавленную (flush уже был) операцию в месячном агрегате.
+    Вызывается внутри транзакции записи: SQLite к этому моменту держит
+    блокировку на запись, поэтому чтение-изменение строки агрегата без гонок.
+    Возвращает обновлённую строку MonthlyCategoryStat (её читают бюджеты)
+    """
+    return _update(_key(transaction), [transaction.amount_minor])
+
+
+def apply_many(transactions):
+    """
+    apply() для пачки операций: строка агрегата читается и пишется один раз
+    на ключ. Возвращает {ключ: (строка, последняя операция ключа)}
+    """
+    groups = {}
+    for t in transactions:
+        groups.setdefault(_key(t), []).append(t)
+    return {
+        key: (_update(key, [t.amount_minor for t in items]), items[-1])
+        for key, items in groups.items()
+    }
+
+
+def category_stats(user, ttype, since=None, until=None):
+    """
+    {category_id: _Acc} за [since, until): полные месяцы из агрегатов,
+    неполные крайние — по строкам операций
+    """
+    full_start = None if since is None else (
+        since if since == _month_start(since) else _next_month(since)
+    )
+    full_end = None if until is None else _month_start(until)
+
+    result = {}
+
+    def acc(category_id):
+        if category_id not in result:
+            result[category_id] = _Acc()
+        return result[category_id]
+
+    def scan(lo, hi):
+        # крайний месяц может быть уже в архиве (app/archive.py) — читаем обе таблицы
+        for model, q in (
+            (Transaction, transactions_query(user)),
+            (ArchivedTransaction, _archived_query(user)),
+        ):
+            q = q.filter(model.type == ttype)
+            if lo is not None:
+                q = q.filter(model.date >= lo)
+            if hi is not None:
+                q = q.filter(model.date < hi)
+            for category_id, amount in q.with_entities(model.category_id, model.amount_minor):
+                acc(category_id).add(amount)
+
+    if full_start is not None and full_end is not None and full_start >= full_end:
+        # диапазон внутри одного месяца
+        scan(since, until)
+        return result
+
+    rows = MonthlyCategoryStat.query.filter_by(scope=scope_key(user), type=ttype)
+    if full_start is not None:
+        rows = rows.filter(MonthlyCategoryStat.month >= month_key(full_start))
+    if full_end is not None:
+        rows = rows.filter(MonthlyCategoryStat.month < month_key(full_end))
+    for row in rows:
+        acc(row.category_id).merge_row(row)
+
+    if since is not None and since < full_start:
+        scan(since, full_start)
+    if until is not None and full_end < until:
+        scan(full_end, until)
+    return result
+
+
+def totals(scope):
+    """
+    {'income': ..., 'expense': ...} за всю историю контекста по агрегатам:
+    строк — месяцы × категории, а не операции. Агрегаты покрывают и архив
+    """
+    rows = dict(
+        db.session.query(MonthlyCategoryStat.type, func.sum(MonthlyCategoryStat.total_minor))
+        .filter(MonthlyCategoryStat.scope == scope)
+        .group_by(MonthlyCategoryStat.type)
+    )
+    return {"income": rows.get("income") or 0, "expense": rows.get("expense") or 0}
+
+
+def _archived_query(user):
+    if user.family_id:
+        return ArchivedTransaction.query.filter_by(family_id=user.family_id)
+    return ArchivedTransaction.query.filter_by(user_id=user.id)
+
+
+def quantiles(user, ttype, since=None, until=None):
+    """{category_id: (медиана, P90, межквартильный размах)} в копейках"""
+    result = {}
+    for category_id, a in category_stats(user, ttype, since, until).items():
+        s = a.sketch
+        q25, q75 = s.quantile(0.25), s.quantile(0.75)
+        result[category_id] = (s.quantile(0.5), s.quantile(0.9), q75 - q25)
+    return result
+
+
+# ---------- ПЕРЕСЧЁТ ----------
+
+_stats = MonthlyCategoryStat.__table__
+
+# все контексты или один: семья (family_id) либо личный учёт (user_id без семьи)
+_SCOPE_WHERE = (
+    "(:family_id IS NULL AND :user_id IS NULL) OR family_id = :family_id "
+    "OR (family_id IS NULL AND user_id = :user_id)"
+)
+
+
+def _all_scopes():
+    return {"family_id": None, "user_id": None}
+
+
+def _scope_params(scope):
+    if scope is None:
+        return _all_scopes()
+    scope_id = int(scope[1:])
+    return {"family_id": scope_id, "user_id": None} if scope[0] == "f" else {"family_id": None, "user_id": scope_id}
+
+
+def _reset(connection, family_id=None, user_id=None):
+    stmt = delete(_stats)
+    if family_id is not None:
+        stmt = stmt.where(_stats.c.scope == f"f{family_id}")
+    elif user_id is not None:
+        stmt = stmt.where(_stats.c.scope == f"u{user_id}")
+    connection.execute(stmt)
+
+
+def _merge(connection, accs):
+    """Сливает агрегаты порции {ключ: _Acc} со строками таблицы"""
+    months = [month for _, month, _, _ in accs]
+    existing = connection.execute(
+        select(_stats).where(
+            _stats.c.scope.in_({scope for scope, _, _, _ in accs}),
+            _stats.c.month.between(min(months), max(months)),
+        )
+    )
+    updates = []
+    for row in existing:
+        acc = accs.pop((row.scope, row.month, row.type, row.category_id), None)
+        if acc is None:
+            continue
+        acc.merge_row(row)
+        updates.append(dict(_id=row.id, count=acc.count, total_minor=acc.total,
+                            min_minor=acc.min, max_minor=acc.max, sketch=acc.sketch.to_bytes()))
+    if updates:
+        connection.execute(
+            _stats.update().where(_stats.c.id == bindparam("_id")),
+            updates,
+        )
+    if accs:
+        connection.execute(_stats.insert(), [
+            dict(scope=s, month=m, type=t, category_id=c, count=a.count, total_minor=a.total,
+                 min_minor=a.min, max_minor=a.max, sketch=a.sketch.to_bytes())
+            for (s, m, t, c), a in accs.items()
+        ])
+
+
+def _fill(connection, table, lo, hi, family_id, user_id):
+    rows = connection.execute(
+        text(
+            f'SELECT family_id, user_id, date, type, category_id, amount_minor FROM "{table}" '
+            f"WHERE id > :lo AND id <= :hi AND date IS NOT NULL AND ({_SCOPE_WHERE})"
+        ),
+        {"lo": lo, "hi": hi, "family_id": family_id, "user_id": user_id},
+    )
+    accs = {}
+    count = 0
+    for row_family_id, row_user_id, day, ttype, category_id, amount in rows:
+        scope = f"f{row_family_id}" if row_family_id else f"u{row_user_id}"
+        # даты в SQLite — строки ISO: месяц — первые 7 символов
+        key = (scope, str(day)[:7], ttype, category_id)
+        if key not in accs:
+            accs[key] = _Acc()
+        accs[key].add(amount)
+        count += 1
+    if accs:
+        _merge(connection, accs)
+    return count
+
+
+@backfill.register("rollups", "transaction", where=_SCOPE_WHERE, params=_all_scopes, reset=_reset)
+def _fill_hot(connection, lo, hi, family_id=None, user_id=None):
+    """Месячные агрегаты по операциям (новый проход стирает агрегаты; затем rollups-archive)"""
+    return _fill(connection, "transaction", lo, hi, family_id, user_id)
+
+
+@backfill.register("rollups-archive", "transaction_archive", where=_SCOPE_WHERE, params=_all_scopes)
+def _fill_archived(connection, lo, hi, family_id=None, user_id=None):
+    """Месячные агрегаты по архиву операций — после прохода rollups"""
+    return _fill(connection, "transaction_archive", lo, hi, family_id, user_id)
+
+
+def rebuild(scope=None):
+    """
+    Пересчитывает агрегаты с нуля (все контексты или один) порциями; запись
+    операций в это время не ждёт. Возвращает число учтённых операций
+    """
+    params = _scope_params(scope)
+    return sum(
+        backfill.run(name, params=params, restart=True)
+        for name in ("rollups", "rollups-archive")
+    )
+
+
+def rebuild_from_migration():
+    """rebuild() из Alembic-миграции: порции — своими транзакциями (backfill.run_from_migration)"""
+    return sum(
+        backfill.run_from_migration(name, restart=True)
+        for name in ("rollups", "rollups-archive")
+    )
+
+
+def init_app(app):
+    @app.cli.command("rollups-rebuild")
+    @click.option("--scope", default=None, help='контекст вида "f12" или "u3"; по умолчанию все')
+    def rollups_rebuild(scope):
+        """Пересчитывает месячные агрегаты и скетчи квантилей."""
+        count = rebuild(scope)
+        total = db.session.query(func.count(MonthlyCategoryStat.id)).scalar()
+        click.echo(f"Учтено операций: {count} (агрегатов в таблице: {total})")
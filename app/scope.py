@@ -0,0 +1,29 @@
+"""
+Контекст данных: семья пользователя или, если семьи нет, он сам
+
+Производные таблицы (категории, агрегаты и т.п.) хранят контекст одной
+строкой-ключом: "f<family_id>" для семьи, "u<user_id>" для личного учёта.
+"""
+
+from .models import Transaction
+
+
+def scope_key(user):
+    """Ключ контекста текущего пользователя"""
+    if user.family_id:
+        return f"f{user.family_id}"
+    return f"u{user.id}"
+
+
+def transaction_scope(transaction):
+    """Ключ контекста, к которому относится операция"""
+    if transaction.family_id:
+        return f"f{transaction.family_id}"
+    return f"u{transaction.user_id}"
+
+
+def transactions_query(user):
+    """Операции, которые видит пользователь: семейные или только свои"""
+    if user.family_id:
+        return Transaction.query.filter_by(family_id=user.family_id)
+    return Transaction.query.filter_by(user_id=user.id)
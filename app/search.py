@@ -0,0 +1,160 @@
+"""
+Полнотекстовый поиск по операциям (SQLite FTS5)
+
+Индекс transaction_fts хранит на каждую операцию (rowid = transaction.id)
+ключ контекста, описание, магазин и склеенные названия товаров из чека.
+Синхронизацию делают триггеры на transaction и transaction_item, поэтому
+любой путь записи (формы, миграции, скрипты) индекс не обходит.
+Контекст — отдельная индексируемая колонка: фильтр по семье выполняется
+внутри MATCH, а не после выборки всех совпадений.
+"""
+
+import re
+
+import click
+from sqlalchemy import event, text
+
+from . import db, backfill
+from .models import TransactionItem
+from .scope import scope_key
+
+# Строка индекса для операции :id — общая часть триггеров и перестроения
+def _fold(expr):
+    # unicode61 не снимает диакритику с кириллицы, поэтому «ё» -> «е» сводим сами
+    return f"replace(replace(coalesce({expr}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+_ROW_SELECT = f"""
+SELECT t.id,
+       CASE WHEN t.family_id IS NOT NULL THEN 'f' || t.family_id ELSE 'u' || t.user_id END,
+       {_fold('t.description')},
+       {_fold('t.merchant_name')},
+       {_fold("(SELECT group_concat(i.item_name, ' ') FROM transaction_item i WHERE i.transaction_id = t.id)")}
+FROM "transaction" t
+"""
+_INSERT = "INSERT INTO transaction_fts(rowid, scope, description, merchant_name, items)"
+
+
+def _refresh(tx_id):
+    return (
+        f"DELETE FROM transaction_fts WHERE rowid = {tx_id}; "
+        f"{_INSERT} {_ROW_SELECT} WHERE t.id = {tx_id};"
+    )
+
+
+DDL = [
+    # unicode61 приводит кириллицу к нижнему регистру, remove_diacritics — латиницу к базовым буквам
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transaction_fts USING fts5("
+    "scope, description, merchant_name, items, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_fts_ai AFTER INSERT ON \"transaction\" "
+    f"BEGIN {_INSERT} {_ROW_SELECT} WHERE t.id = new.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_fts_au "
+    "AFTER UPDATE OF description, merchant_name, family_id, user_id ON \"transaction\" "
+    f"BEGIN {_refresh('new.id')} END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_fts_ad AFTER DELETE ON \"transaction\" "
+    "BEGIN DELETE FROM transaction_fts WHERE rowid = old.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_item_fts_ai AFTER INSERT ON transaction_item "
+    f"BEGIN {_refresh('new.transaction_id')} END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_item_fts_au AFTER UPDATE ON transaction_item "
+    f"BEGIN {_refresh('old.transaction_id')} {_refresh('new.transaction_id')} END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_item_fts_ad AFTER DELETE ON transaction_item "
+    f"BEGIN {_refresh('old.transaction_id')} END",
+]
+
+_WORD = re.compile(r"\w+")
+
+
+def install(connection):
+    """Создаёт индекс и триггеры, если их ещё нет (идемпотентно)"""
+    for statement in DDL:
+        connection.execute(text(statement))
+
+
+@event.listens_for(TransactionItem.__table__, "after_create")
+def _install_on_create(target, connection, **kw):
+    # новая БД из db.create_all(): transaction_item создаётся после transaction.
+    # Существующие БД получают индекс миграцией — триггеры, созданные раньше неё,
+    # мешали бы пересборке таблицы transaction в batch-миграциях
+    install(connection)
+
+
+@backfill.register("search-index", "transaction")
+def _fill_index(connection, lo, hi):
+    """Строки полнотекстового индекса заново для диапазона операций"""
+    params = {"lo": lo, "hi": hi}
+    connection.execute(text("DELETE FROM transaction_fts WHERE rowid > :lo AND rowid <= :hi"), params)
+    return connection.execute(text(f"{_INSERT} {_ROW_SELECT} WHERE t.id > :lo AND t.id <= :hi"), params).rowcount
+
+
+def match_expression(query):
+    """
+    Строка пользователя -> выражение MATCH: каждое слово ищется по префиксу,
+    все слова обязательны. Операторы FTS5 из ввода не пропускаем
+    """
+    words = _WORD.findall((query or "").replace("ё", "е").replace("Ё", "Е"))[:16]
+    if not words:
+        return None
+    terms = " ".join(f'"{w}"*' for w in words)
+    return "{description merchant_name items} : (" + terms + ")"
+
+
+def search(user, query, page=1, per_page=20):
+    """
+    Операции контекста пользователя по релевантности (bm25).
+    Возвращает (строки, есть_ли_следующая_страница)
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return [], False
+
+    # веса колонок bm25: scope, описание, магазин, товары
+    rows = db.session.execute(
+        text(
+            'SELECT t.id, t.date, t.type, t.amount_minor, t.category, t.description, t.merchant_name, '
+            "snippet(transaction_fts, 1, '[', ']', '…', 10) AS s1, "
+            "snippet(transaction_fts, 2, '[', ']', '…', 10) AS s2, "
+            "snippet(transaction_fts, 3, '[', ']', '…', 10) AS s3 "
+            'FROM transaction_fts JOIN "transaction" t ON t.id = transaction_fts.rowid '
+            "WHERE transaction_fts MATCH :match "
+            "ORDER BY bm25(transaction_fts, 0.0, 2.0, 3.0, 1.0), t.id DESC "
+            "LIMIT :limit OFFSET :offset"
+        ),
+        {
+            "match": f'scope : "{scope_key(user)}" AND {expression}',
+            "limit": per_page + 1,
+            "offset": (page - 1) * per_page,
+        },
+    ).mappings().all()
+
+    results = []
+    for row in rows[:per_page]:
+        row = dict(row)
+        # фрагмент из первой колонки с совпадением (колонка scope совпадает всегда)
+        snippets = [row.pop(key) for key in ("s1", "s2", "s3")]
+        row["snippet"] = next((s for s in snippets if "[" in s), snippets[0])
+        results.append(row)
+    return results, len(rows) > per_page
+
+
+def init_app(app):
+    @app.cli.command("search-rebuild")
+    @click.option("--chunk-size", type=int, default=None, help="начальный размер порции (BACKFILL_CHUNK_SIZE)")
+    @click.option("--resume", is_flag=True, help="продолжить прерванную перестройку")
+    def search_rebuild(chunk_size, resume):
+        """Перестраивает полнотекстовый индекс операций порциями, не блокируя запись надолго."""
+        with db.engine.begin() as connection:
+            install(connection)
+        backfill.run("search-index", chunk_size, restart=not resume)
+        with db.engine.begin() as connection:
+            # строки индекса без операции (удалены в обход триггеров) и слияние сегментов
+            connection.execute(text('DELETE FROM transaction_fts WHERE rowid NOT IN (SELECT id FROM "transaction")'))
+            connection.execute(text("INSERT INTO transaction_fts(transaction_fts) VALUES ('optimize')"))
+            count = connection.execute(text("SELECT count(*) FROM transaction_fts")).scalar()
+        click.echo(f"Проиндексировано операций: {count}")
@@ -0,0 +1,80 @@
+"""
+Сливаемый скетч квантилей (по схеме DDSketch)
+
+Значения раскладываются по логарифмическим корзинам с шагом gamma, так
+что любой квантиль восстанавливается с относительной ошибкой не больше
+RELATIVE_ACCURACY. Скетчи с одинаковым gamma складываются покорзинно —
+квантили за год получаются слиянием двенадцати месячных скетчей без
+чтения самих операций. Хранится компактно: пары (корзина, счётчик)
+в бинарном виде, от сотен байт до нескольких КиБ на категорию за месяц.
+"""
+
+import math
+from array import array
+
+RELATIVE_ACCURACY = 0.01
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+class QuantileSketch:
+    """Скетч неотрицательных целых (копеек)"""
+
+    def __init__(self):
+        self.bins = {}   # индекс корзины -> число значений
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        if value <= 0:
+            self.zeros += count
+        else:
+            key = math.ceil(math.log(value) / _LOG_GAMMA)
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+
+    def merge(self, other):
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Значение квантиля q ∈ [0, 1] (в тех же единицах) или None для пустого скетча"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                # середина корзины (gamma^(k-1), gamma^k] в смысле относительной ошибки
+                return round(2 * _GAMMA ** key / (_GAMMA + 1))
+        return round(2 * _GAMMA ** max(self.bins) / (_GAMMA + 1))
+
+    # ---------- хранение ----------
+
+    def to_bytes(self):
+        """[zeros, k1, n1, k2, n2, ...] как int64 — формат колонки sketch"""
+        data = array("q", [self.zeros])
+        for key in sorted(self.bins):
+            data.extend((key, self.bins[key]))
+        return data.tobytes()
+
+    @classmethod
+    def from_bytes(cls, raw):
+        sketch = cls()
+        if not raw:
+            return sketch
+        data = array("q")
+        data.frombytes(raw)
+        sketch.zeros = data[0]
+        sketch.count = data[0]
+        for i in range(1, len(data), 2):
+            sketch.bins[data[i]] = data[i + 1]
+            sketch.count += data[i + 1]
+        return sketch
@@ -0,0 +1,276 @@
+"""
+Дельта-синхронизация для офлайн-клиентов
+
+Каждая вставка или правка операции получает следующий номер изменения
+sync_seq (общий счётчик для операций и следов удаления), удаление
+оставляет TransactionTombstone с таким же номером. Номера выдаёт
+однострочный счётчик sync_counter (UPDATE ... RETURNING): обновление
+счётчика берёт блокировку записи SQLite, и она держится до коммита,
+поэтому два пишущих процесса не получат одинаковый номер, а номера идут
+в порядке коммитов — клиент, запомнивший курсор, не пропустит изменение,
+закоммиченное «задним числом» (чего не гарантирует курсор по updated_at).
+Уникальный индекс по sync_seq страхует от повторов.
+
+Курсор — подписанная непрозрачная строка с номером и контекстом.
+"""
+
+from datetime import datetime
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import event, insert, text
+from sqlalchemy.exc import IntegrityError
+
+from . import db, backfill, fx, ledger
+from .database import run_with_retry
+from .models import Transaction, TransactionTombstone
+from .money import format_money, to_minor
+from .scope import scope_key, transaction_scope, transactions_query
+
+MAX_BATCH = 500
+
+
+# ---------- НОМЕРА ИЗМЕНЕНИЙ ----------
+
+_RESERVE = text("UPDATE sync_counter SET seq = seq + :n WHERE id = 1 RETURNING seq")
+_SEED = text(
+    "INSERT INTO sync_counter (id, seq) SELECT 1, coalesce(max(seq), 0) FROM ("
+    'SELECT max(sync_seq) AS seq FROM "transaction" '
+    "UNION ALL SELECT max(sync_seq) FROM transaction_tombstone"
+    ") WHERE true ON CONFLICT DO NOTHING"  # WHERE — иначе SQLite примет ON за условие JOIN
+)
+_CATCH_UP = text(
+    "UPDATE sync_counter SET seq = max(seq, "
+    '(SELECT coalesce(max(sync_seq), 0) FROM "transaction")) WHERE id = 1'
+)
+
+
+def _reserve(connection, n):
+    """
+    Резервирует n номеров, возвращает номер перед первым из них. UPDATE счётчика —
+    запись: он берёт блокировку записи SQLite, и она держится до коммита
+    """
+    last = connection.scalar(_RESERVE, {"n": n})
+    if last is None:
+        # счётчика ещё нет (база из create_all) — продолжаем после выданных номеров
+        connection.execute(_SEED)
+        last = connection.scalar(_RESERVE, {"n": n})
+    return last - n
+
+
+def _next_seq(connection):
+    return _reserve(connection, 1) + 1
+
+
+def bulk_seq_base():
+    """
+    Номер, после которого нумеровать строки вставки мимо ORM (INSERT ... SELECT
+    с base + row_number()). Берёт блокировку записи; после вставки в той же
+    транзакции нужно вызвать bulk_seq_done()
+    """
+    return _reserve(db.session.connection(), 0)
+
+
+def bulk_seq_done(connection=None):
+    """Подтягивает счётчик к максимальному номеру, записанному вставкой мимо ORM"""
+    (connection or db.session.connection()).execute(_CATCH_UP)
+
+
+@backfill.register("sync-seq", "transaction", where="sync_seq IS NULL")
+def _fill_seq(connection, lo, hi):
+    """Номера изменений для строк, вставленных мимо ORM (импорт, ручной SQL)"""
+    # номера после всех выданных: клиенты с курсором увидят эти строки как новые
+    base = _reserve(connection, 0)
+    rows = connection.execute(
+        text(
+            'UPDATE "transaction" SET sync_seq = :base + (id - :lo), updated_at = coalesce(updated_at, date) '
+            "WHERE id > :lo AND id <= :hi AND sync_seq IS NULL"
+        ),
+        {"base": base, "lo": lo, "hi": hi},
+    ).rowcount
+    bulk_seq_done(connection)
+    return rows
+
+
+@event.listens_for(Transaction, "before_insert")
+@event.listens_for(Transaction, "before_update")
+def _stamp(mapper, connection, target):
+    target.updated_at = datetime.utcnow()
+    target.sync_seq = _next_seq(connection)
+
+
+@event.listens_for(Transaction, "after_delete")
+def _tombstone(mapper, connection, target):
+    connection.execute(insert(TransactionTombstone).values(
+        scope=transaction_scope(target),
+        transaction_id=target.id,
+        sync_seq=_next_seq(connection),
+        deleted_at=datetime.utcnow(),
+    ))
+
+
+# ---------- КУРСОР ----------
+
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="sync-cursor")
+
+
+def encode_cursor(user, seq):
+    return _serializer().dumps({"s": seq, "c": scope_key(user)})
+
+
+def decode_cursor(user, cursor):
+    """Номер изменения из курсора; ValueError для чужого или испорченного курсора"""
+    if not cursor:
+        return 0
+    try:
+        data = _serializer().loads(cursor)
+    except BadSignature as exc:
+        raise ValueError("Некорректный курсор") from exc
+    if data.get("c") != scope_key(user):
+        raise ValueError("Курсор относится к другому контексту")
+    return int(data["s"])
+
+
+# ---------- ВЫДАЧА ИЗМЕНЕНИЙ ----------
+
+def serialize(t):
+    return {
+        "id": t.id,
+        "client_id": t.client_id,
+        "date": t.date.isoformat() if t.date else None,
+        "updated_at": t.updated_at.isoformat() if t.updated_at else None,
+        "type": t.type,
+        "amount": format_money(t.amount_minor),
+        "currency": t.currency,
+        "original_amount": format_money(t.original_minor) if t.currency else None,
+        "category": t.category,
+        "category_id": t.category_id,
+        "description": t.description,
+        "user_id": t.user_id,
+    }
+
+
+def changes(user, cursor=None, limit=500):
+    """
+    Изменения после курсора в порядке номеров:
+    {'changes': [...], 'deleted': [id, ...], 'cursor': ..., 'has_more': bool}
+    """
+    seq = decode_cursor(user, cursor)
+    upserts = (
+        transactions_query(user)
+        .filter(Transaction.sync_seq > seq)
+        .order_by(Transaction.sync_seq)
+        .limit(limit + 1)
+        .all()
+    )
+    tombstones = (
+        TransactionTombstone.query
+        .filter(TransactionTombstone.scope == scope_key(user), TransactionTombstone.sync_seq > seq)
+        .order_by(TransactionTombstone.sync_seq)
+        .limit(limit + 1)
+        .all()
+    )
+
+    merged = sorted(
+        [(t.sync_seq, "change", t) for t in upserts] + [(d.sync_seq, "deleted", d) for d in tombstones],
+        key=lambda item: item[0],
+    )
+    page = merged[:limit]
+    return {
+        "changes": [serialize(obj) for _, kind, obj in page if kind == "change"],
+        "deleted": [obj.transaction_id for _, kind, obj in page if kind == "deleted"],
+        "cursor": encode_cursor(user, page[-1][0] if page else seq),
+        "has_more": len(merged) > limit,
+    }
+
+
+# ---------- ПРИЁМ СОЗДАННЫХ НА КЛИЕНТЕ ----------
+
+def _parse_create(i, item):
+    if not isinstance(item, dict):
+        raise ValueError(f"creates[{i}]: ожидается объект")
+    client_id = item.get("client_id")
+    if not isinstance(client_id, str) or not 0 < len(client_id) <= 64:
+        raise ValueError(f"creates[{i}]: client_id — строка до 64 символов")
+    if item.get("type") not in ledger.TYPES:
+        raise ValueError(f"creates[{i}]: неизвестный тип операции")
+    try:
+        amount_minor = to_minor(str(item.get("amount", "")))
+    except ValueError as exc:
+        raise ValueError(f"creates[{i}]: некорректная сумма") from exc
+    category = item.get("category")
+    if not isinstance(category, str) or not category.strip():
+        raise ValueError(f"creates[{i}]: укажите категорию")
+    date = None
+    if item.get("date"):
+        try:
+            date = datetime.fromisoformat(item["date"])
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"creates[{i}]: дата в формате ISO 8601") from exc
+        if date.tzinfo is not None:
+            raise ValueError(f"creates[{i}]: дата без часового пояса (UTC)")
+    try:
+        currency = fx.normalize(item.get("currency"))
+    except ValueError as exc:
+        raise ValueError(f"creates[{i}]: {exc}") from exc
+    return {
+        "client_id": client_id,
+        "ttype": item["type"],
+        "amount_minor": amount_minor,
+        "currency": currency,
+        "category_name": category,
+        "description": item.get("description"),
+        "date": date,
+    }
+
+
+def apply_creates(user, items):
+    """
+    Создаёт операции пачкой в одном коммите. Повтор с тем же client_id
+    не создаёт дубль, а возвращает существующую операцию.
+    Возвращает [{'client_id', 'id', 'status': 'created' | 'exists'}]
+    """
+    if not isinstance(items, list):
+        raise ValueError("creates — список")
+    if len(items) > MAX_BATCH:
+        raise ValueError(f"Не больше {MAX_BATCH} операций за запрос")
+    parsed = [_parse_create(i, item) for i, item in enumerate(items)]
+    # суммы в валюте — в базовую одним проходом по курсам, до начала записи
+    bases = fx.to_base_many([(p["currency"], p["date"], p["amount_minor"]) for p in parsed])
+    for i, (p, base_minor) in enumerate(zip(parsed, bases)):
+        if base_minor is None:
+            raise ValueError(f"creates[{i}]: нет курса {p['currency']} на дату операции")
+        p["base_minor"] = base_minor
+
+    def work():
+        client_ids = {p["client_id"] for p in parsed}
+        known = dict(
+            Transaction.query
+            .filter(Transaction.user_id == user.id, Transaction.client_id.in_(client_ids))
+            .with_entities(Transaction.client_id, Transaction.id)
+        )
+        results, created = [], []
+        for p in parsed:
+            if p["client_id"] in known:
+                results.append({"client_id": p["client_id"], "id": known[p["client_id"]], "status": "exists"})
+                continue
+            t = ledger.new_transaction(
+                user, p["ttype"], p["amount_minor"], p["category_name"],
+                description=p["description"], date=p["date"], client_id=p["client_id"],
+                currency=p["currency"], base_minor=p["base_minor"],
+            )
+            known[p["client_id"]] = t.id
+            created.append(t)
+            results.append({"client_id": p["client_id"], "id": t.id, "status": "created"})
+        return results, created
+
+    try:
+        results, created = run_with_retry(work)
+    except IntegrityError:
+        # тот же client_id одновременно пришёл в другом запросе — теперь он в базе
+        db.session.rollback()
+        results, created = run_with_retry(work)
+
+    ledger.after_commit(user, created)
+    return results
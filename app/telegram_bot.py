@@ -0,0 +1,336 @@
+"""
+Быстрый ввод операций из Telegram: «кафе 450», «такси 320,50 до дома», «+зарплата 50000»,
+«кафе 12 usd» / «кафе 12$» (в валюте, по курсу app/fx.py)
+
+Бот (flask telegram-bot) — отдельный процесс на asyncio (python-telegram-bot,
+long polling). Чат привязывается к пользователю одноразовым кодом со страницы
+/auth/telegram: «/start КОД».
+
+Записи идут с отложенной записью: обработчик разбирает сообщение, кладёт его
+в очередь WriteBehind и ждёт; очередь раз в TELEGRAM_FLUSH_INTERVAL секунд
+(или при TELEGRAM_FLUSH_SIZE сообщениях) пишет всё накопленное одной
+транзакцией в потоке рядом с циклом событий — чаты не выстраиваются в
+очередь за отдельными коммитами SQLite. Ответ «записано» уходит только
+после коммита.
+
+Для офлайн-проверки: scripts/fake_telegram_server.py и TELEGRAM_API_URL.
+"""
+
+import asyncio
+import logging
+import re
+import secrets
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+
+from . import db, categories, fx, ledger, metrics
+from .database import run_with_retry
+from .models import TelegramLink, User
+from .money import format_money, to_minor
+
+logger = logging.getLogger(__name__)
+
+# соединений с Bot API для ответов (long polling идёт отдельным)
+BOT_CONNECTIONS = 32
+
+HELP = (
+    "Пишите расход так: «кафе 450» или «такси 320,50 до дома».\n"
+    "Доход — с плюсом: «+зарплата 50000». В валюте: «кафе 12 usd».\n"
+    "Привязать чат: /start КОД со страницы «Telegram» в приложении."
+)
+
+# сумма: 450, 320,50, 1200.5, +50000, 450₽ / 450р / 450руб, 12$ / 12€
+_AMOUNT = re.compile(r"^([+-]?)(\d+(?:[.,]\d{1,2})?)(₽|р\.?|руб\.?|\$|€)?$", re.IGNORECASE)
+# код валюты словом после суммы: «12 usd»
+_CURRENCY = re.compile(r"^[A-Za-z]{3}$")
+_SYMBOLS = {"$": "USD", "€": "EUR"}
+
+metrics.describe("telegram_messages_total", "counter", "Сообщения боту (result=saved|unlinked|invalid|error)")
+metrics.describe("telegram_flush_size", "histogram", "Операций в одном коммите бота", (1, 2, 5, 10, 20, 50, 100, 200, 500))
+
+
+def parse(text):
+    """
+    'кафе 450 обед' -> {'type': 'expense', 'amount_minor': 45000, 'currency': None,
+    'category': 'кафе', 'description': 'обед'}; None, если суммы или категории нет
+    """
+    words = (text or "").split()
+    for i, word in enumerate(words):
+        match = _AMOUNT.match(word)
+        if match:
+            break
+    else:
+        return None
+
+    sign, number, unit = match.groups()
+    amount_minor = to_minor(number)
+    # категория — слова до суммы, а если сумма первая — слово после неё
+    before, after = words[:i], words[i + 1:]
+    currency = _SYMBOLS.get(unit)
+    if currency is None and after and _CURRENCY.match(after[0]):
+        currency, after = after[0].upper(), after[1:]
+    if not before and after:
+        before, after = after[:1], after[1:]
+    category = " ".join(before)
+    ttype = "income" if sign == "+" else "expense"
+    if category.startswith("+"):
+        category, ttype = category[1:], "income"
+    if amount_minor <= 0 or not categories.normalize_name(category):
+        return None
+    return {
+        "type": ttype,
+        "amount_minor": amount_minor,
+        "currency": currency,
+        "category": category,
+        "description": " ".join(after) or None,
+    }
+
+
+# ---------- ПРИВЯЗКА ЧАТА ----------
+
+def link_code(user):
+    """Новый одноразовый код привязки пользователя (действует TELEGRAM_LINK_TTL_MINUTES)"""
+    link = db.session.get(TelegramLink, user.id) or TelegramLink(user_id=user.id)
+    link.code = secrets.token_hex(4).upper()
+    link.code_expires_at = datetime.utcnow() + timedelta(minutes=current_app.config["TELEGRAM_LINK_TTL_MINUTES"])
+    db.session.add(link)
+    db.session.commit()
+    return link
+
+
+def unlink(user):
+    link = db.session.get(TelegramLink, user.id)
+    if link is not None:
+        db.session.delete(link)
+        db.session.commit()
+
+
+def _link_chat(code, chat_id):
+    """Привязывает чат по коду: имя пользователя или None, если код неверный или истёк"""
+    def work():
+        link = TelegramLink.query.filter_by(code=code.strip().upper()).first()
+        if link is None or link.code_expires_at < datetime.utcnow():
+            return None
+        # чат ведёт одного пользователя: прежняя привязка этого чата снимается
+        TelegramLink.query.filter(TelegramLink.chat_id == chat_id, TelegramLink.user_id != link.user_id).delete()
+        link.chat_id = chat_id
+        link.code = None
+        link.code_expires_at = None
+        link.linked_at = datetime.utcnow()
+        user = db.session.get(User, link.user_id)
+        return user.name or user.email
+
+    return run_with_retry(work)
+
+
+# ---------- ОТЛОЖЕННАЯ ЗАПИСЬ ----------
+
+class WriteBehind:
+    """
+    Очередь разобранных сообщений: add() ждёт, пока flush-задача не запишет
+    порцию одним коммитом, и возвращает сохранённую операцию, None (чат не
+    привязан) или {'error'} (нет курса валюты). Ошибка записи порции —
+    исключение у каждого ожидающего
+    """
+
+    def __init__(self, app, interval, size):
+        self.app = app
+        self.interval = interval
+        self.size = size
+        self.pending = []   # (chat_id, разобранное сообщение, future)
+        self.wake = asyncio.Event()
+        self.closed = False
+
+    async def add(self, chat_id, entry):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((chat_id, entry, future))
+        if len(self.pending) >= self.size:
+            self.wake.set()
+        return await future
+
+    async def run(self):
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self.wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def close(self):
+        self.closed = True
+        self.wake.set()
+        await self.flush()
+
+    async def flush(self):
+        self.wake.clear()
+        while self.pending:
+            batch, self.pending = self.pending[:self.size], self.pending[self.size:]
+            try:
+                # SQLite синхронный — пишем в потоке, цикл событий продолжает принимать сообщения
+                results = await asyncio.to_thread(self._commit, [(chat_id, entry) for chat_id, entry, _ in batch])
+            except Exception as exc:
+                logger.exception("Не удалось записать %s операций из Telegram", len(batch))
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _commit(self, batch):
+        """[(chat_id, сообщение)] -> [операция | None] одной транзакцией"""
+        with self.app.app_context():
+            chat_ids = {chat_id for chat_id, _ in batch}
+            users = dict(
+                db.session.query(TelegramLink.chat_id, User)
+                .join(User, User.id == TelegramLink.user_id)
+                .filter(TelegramLink.chat_id.in_(chat_ids))
+                .all()
+            )
+
+            # суммы в валюте — в базовую одним проходом по курсам
+            currencies = [fx.normalize(entry["currency"]) for _, entry in batch]
+            bases = fx.to_base_many([
+                (currency, None, entry["amount_minor"]) for currency, (_, entry) in zip(currencies, batch)
+            ])
+
+            def work():
+                created = [
+                    ledger.new_transaction(
+                        users[chat_id], entry["type"], entry["amount_minor"], entry["category"],
+                        description=entry["description"], currency=currency, base_minor=base_minor,
+                    ) if chat_id in users and base_minor is not None else None
+                    for (chat_id, entry), currency, base_minor in zip(batch, currencies, bases)
+                ]
+                # ответы — до коммита: после него атрибуты операций пришлось бы перечитывать
+                results = []
+                for (chat_id, _), currency, base_minor, t in zip(batch, currencies, bases, created):
+                    if chat_id not in users:
+                        results.append(None)
+                    elif base_minor is None:
+                        results.append({"error": f"Нет курса {currency} — сумма не записана."})
+                    else:
+                        results.append({
+                            "type": t.type, "category": t.category, "amount_minor": t.amount_minor,
+                            "currency": t.currency, "original_minor": t.original_minor,
+                            "alerts": len(getattr(t, "budget_alerts", ()) or ()),
+                        })
+                return created, results
+
+            created, results = run_with_retry(work)
+            saved = [t for t in created if t is not None]
+            metrics.observe("telegram_flush_size", len(saved))
+
+            # обновления после коммита — по пользователю, как у веб-формы. Операции уже
+            # записаны: ошибка кэшей только в лог, иначе пользователь отправит сообщение повторно
+            by_user = {}
+            for (chat_id, _), t in zip(batch, created):
+                if t is not None:
+                    by_user.setdefault(chat_id, []).append(t)
+            for chat_id, transactions in by_user.items():
+                try:
+                    ledger.after_commit(users[chat_id], transactions)
+                except Exception:
+                    logger.exception("Обновления после записи из Telegram не выполнены (чат %s)", chat_id)
+            return results
+
+
+# ---------- БОТ ----------
+
+def build_application(app, writer):
+    """Приложение python-telegram-bot с обработчиками; API — TELEGRAM_API_URL"""
+    from telegram.ext import Application, CommandHandler, MessageHandler, filters
+
+    async def start(update, context):
+        chat_id = update.effective_chat.id
+        if not context.args:
+            await update.message.reply_text(HELP)
+            return
+        name = await asyncio.to_thread(_in_app, app, _link_chat, context.args[0], chat_id)
+        if name is None:
+            await update.message.reply_text("Код не подошёл или устарел — получите новый в приложении.")
+        else:
+            await update.message.reply_text(f"Чат привязан к {name}. {HELP.splitlines()[0]}")
+
+    async def help_command(update, context):
+        await update.message.reply_text(HELP)
+
+    async def on_text(update, context):
+        entry = parse(update.message.text)
+        if entry is None:
+            metrics.inc("telegram_messages_total", result="invalid")
+            await update.message.reply_text(HELP)
+            return
+        try:
+            saved = await writer.add(update.effective_chat.id, entry)
+        except Exception:
+            metrics.inc("telegram_messages_total", result="error")
+            await update.message.reply_text("Не удалось сохранить, попробуйте ещё раз.")
+            return
+        if saved is None:
+            metrics.inc("telegram_messages_total", result="unlinked")
+            await update.message.reply_text("Чат не привязан. " + HELP.splitlines()[-1])
+            return
+        if "error" in saved:
+            metrics.inc("telegram_messages_total", result="invalid")
+            await update.message.reply_text(saved["error"])
+            return
+        metrics.inc("telegram_messages_total", result="saved")
+        sign = "+" if saved["type"] == "income" else "−"
+        reply = f"Записано: {saved['category']} {sign}{format_money(saved['amount_minor'])} ₽"
+        if saved["currency"]:
+            reply += f" ({format_money(saved['original_minor'])} {saved['currency']})"
+        if saved["alerts"]:
+            reply += "\nВнимание: превышен порог бюджета."
+        await update.message.reply_text(reply)
+
+    async def post_init(application):
+        application.bot_data["writer_task"] = asyncio.create_task(writer.run())
+
+    async def post_shutdown(application):
+        # недописанное — одним последним коммитом
+        await writer.close()
+        application.bot_data["writer_task"].cancel()
+
+    config = app.config
+    application = (
+        Application.builder()
+        .token(config["TELEGRAM_BOT_TOKEN"])
+        .base_url(f"{config['TELEGRAM_API_URL'].rstrip('/')}/bot")
+        # сообщения разных чатов обрабатываются параллельно и попадают в одну порцию записи
+        .concurrent_updates(True)
+        # ответы чатам тоже параллельно: по умолчанию у python-telegram-bot одно соединение
+        .connection_pool_size(BOT_CONNECTIONS)
+        .pool_timeout(10)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
+    return application
+
+
+def _in_app(app, func, *args):
+    with app.app_context():
+        return func(*args)
+
+
+def run(app):
+    """Запускает бота до Ctrl+C / SIGTERM"""
+    writer = WriteBehind(app, app.config["TELEGRAM_FLUSH_INTERVAL"], app.config["TELEGRAM_FLUSH_SIZE"])
+    build_application(app, writer).run_polling()
+
+
+def init_app(app):
+    @app.cli.command("telegram-bot")
+    def telegram_bot():
+        """Запускает Telegram-бота для ввода операций (отдельный процесс)."""
+        if not current_app.config["TELEGRAM_BOT_TOKEN"]:
+            raise click.ClickException("Не задан TELEGRAM_BOT_TOKEN")
+        logging.basicConfig(level=logging.INFO)
+        run(current_app._get_current_object())
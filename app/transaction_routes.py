@@ -1,8 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+import json
+import re
+from datetime import date, datetime
+
+from flask import Blueprint, Response, abort, current_app, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import func
-from .models import Transaction
-from . import db
+from .models import Transaction, Category
+from .database import run_with_retry
+from .money import to_minor, format_money
+from .scope import scope_key, transactions_query
+from . import db, categories, categorizer, analytics, budgets, fx, recurring, search, history, ledger, live, sync
 
 transaction_bp = Blueprint("transactions", __name__, url_prefix="/app")
 
@@ -12,21 +18,10 @@ transaction_bp = Blueprint("transactions", __name__, url_prefix="/app")
 def dashboard():
     # если пользователь в семье — показываем семейные операции,
     # иначе только его личные
-    if current_user.family_id:
-        q = Transaction.query.filter_by(family_id=current_user.family_id)
-    else:
-        q = Transaction.query.filter_by(user_id=current_user.id)
+    q = transactions_query(current_user)
 
-    total_income = (
-        q.filter_by(type="income")
-         .with_entities(func.sum(Transaction.amount))
-         .scalar() or 0
-    )
-    total_expense = (
-        q.filter_by(type="expense")
-         .with_entities(func.sum(Transaction.amount))
-         .scalar() or 0
-    )
+    # суммы в копейках (целые), в рубли переводит фильтр money в шаблоне
+    totals = analytics.totals(current_user)
 
     last_transactions = (
         q.order_by(Transaction.date.desc())
@@ -36,23 +31,357 @@ def dashboard():
 
     return render_template(
         "dashboard.html",
-        total_income=total_income,
-        total_expense=total_expense,
+        total_income=totals["income"],
+        total_expense=totals["expense"],
         last_transactions=last_transactions,
+        currencies=fx.currencies(),
+        budget_status=budgets.status(current_user),
+        budget_alerts=budgets.alerts(current_user, limit=5),
+        live_sse=current_app.config["LIVE_SSE_ENABLED"],
+        live_last_id=live.last_id(),
+        live_poll_ms=int(current_app.config["LIVE_CLIENT_POLL_SECONDS"] * 1000),
+    )
+
+
+@transaction_bp.route("/budgets", methods=["GET", "POST"])
+@login_required
+def budgets_page():
+    """Месячные лимиты по категориям"""
+    if request.method == "POST":
+        try:
+            limit_minor = to_minor(request.form["limit"])
+        except ValueError:
+            flash("Некорректная сумма лимита")
+            return redirect(url_for("transactions.budgets_page"))
+
+        def work():
+            budgets.set_budget(
+                current_user, request.form["category"], limit_minor,
+                request.form.get("thresholds", "").strip() or None,
+            )
+
+        try:
+            run_with_retry(work)
+        except ValueError as exc:
+            db.session.rollback()
+            flash(str(exc))
+        else:
+            flash("Лимит сохранён")
+        return redirect(url_for("transactions.budgets_page"))
+
+    return render_template(
+        "budgets.html",
+        budget_status=budgets.status(current_user),
+        budget_alerts=budgets.alerts(current_user),
+        default_thresholds=current_app.config["BUDGET_ALERT_THRESHOLDS"],
+    )
+
+
+@transaction_bp.route("/budgets/<int:budget_id>/delete", methods=["POST"])
+@login_required
+def delete_budget(budget_id):
+    run_with_retry(lambda: budgets.remove_budget(current_user, budget_id))
+    flash("Лимит удалён")
+    return redirect(url_for("transactions.budgets_page"))
+
+
+@transaction_bp.route("/history")
+@login_required
+def history_page():
+    """Вся история операций с фильтрами, постранично"""
+    try:
+        filters = history.parse_filters(request.args)
+        rows, next_cursor = history.page(current_user, filters, request.args.get("after"))
+    except ValueError as exc:
+        flash(str(exc))
+        return redirect(url_for("transactions.history_page"))
+
+    members = current_user.family.members if current_user.family_id else [current_user]
+    category_options = (
+        Category.query.filter_by(scope=scope_key(current_user))
+        .order_by(Category.name_norm)
+        .all()
+    )
+    # параметры фильтра без курсора — для ссылок «дальше» и «в начало»
+    filter_args = {k: v for k, v in request.args.items() if k != "after" and v}
+    return render_template(
+        "history.html",
+        transactions=rows,
+        next_cursor=next_cursor,
+        filter_args=filter_args,
+        members=members,
+        categories=category_options,
     )
 
 
 @transaction_bp.route("/add", methods=["POST"])
 @login_required
 def add_transaction():
-    t = Transaction(
-        user_id=current_user.id,
-        family_id=current_user.family_id,  # если нет семьи — будет None
-        type=request.form["type"],
-        amount=float(request.form["amount"]),
-        category=request.form["category"],
-        description=request.form.get("description"),
-    )
-    db.session.add(t)
-    db.session.commit()
+    try:
+        amount_minor = to_minor(request.form["amount"])
+    except ValueError:
+        flash("Некорректная сумма")
+        return redirect(url_for("transactions.dashboard"))
+
+    if not categories.normalize_name(request.form["category"]):
+        flash("Укажите категорию")
+        return redirect(url_for("transactions.dashboard"))
+
+    # операция в валюте: курс на сегодня, до начала записи
+    try:
+        currency = fx.normalize(request.form.get("currency"))
+        base_minor = fx.to_base(currency, None, amount_minor) if currency else None
+    except ValueError as exc:
+        flash(str(exc))
+        return redirect(url_for("transactions.dashboard"))
+
+    def work():
+        return ledger.new_transaction(
+            current_user,
+            request.form["type"],
+            amount_minor,
+            request.form["category"],
+            description=request.form.get("description"),
+            currency=currency,
+            base_minor=base_minor,
+        )
+
+    # при нескольких воркерах SQLite может быть занят другим коммитом
+    t = run_with_retry(work)
+    ledger.after_commit(current_user, [t])
     return redirect(url_for("transactions.dashboard"))
+
+
+@transaction_bp.route("/recurring", methods=["GET", "POST"])
+@login_required
+def recurring_page():
+    """Регулярные операции: аренда, зарплата, подписки"""
+    if request.method == "POST":
+        try:
+            amount_minor = to_minor(request.form["amount"])
+            start_date = date.fromisoformat(request.form["start_date"])
+            until_date = date.fromisoformat(request.form["until_date"]) if request.form.get("until_date") else None
+            interval = int(request.form.get("interval") or 1)
+        except ValueError:
+            flash("Проверьте сумму, даты и интервал")
+            return redirect(url_for("transactions.recurring_page"))
+
+        def work():
+            return recurring.create_rule(
+                current_user, request.form["type"], amount_minor, request.form["category"],
+                request.form["freq"], start_date, interval=interval, until_date=until_date,
+                description=request.form.get("description") or None,
+            ).id
+
+        try:
+            rule_id = run_with_retry(work)
+        except ValueError as exc:
+            db.session.rollback()
+            flash(str(exc))
+            return redirect(url_for("transactions.recurring_page"))
+
+        # уже наступившие даты (правило «с прошлого месяца») — сразу, не дожидаясь планировщика
+        created = recurring.materialize(rule_ids=[rule_id])
+        flash(f"Правило сохранено, создано операций: {len(created)}" if created else "Правило сохранено")
+        return redirect(url_for("transactions.recurring_page"))
+
+    rules = recurring.active_rules(current_user)
+    return render_template(
+        "recurring.html",
+        rules=[(rule, recurring.next_date(rule)) for rule in rules],
+        upcoming=recurring.upcoming(current_user),
+        freqs=recurring.FREQS,
+        today=datetime.utcnow().date(),
+    )
+
+
+@transaction_bp.route("/recurring/<int:rule_id>/stop", methods=["POST"])
+@login_required
+def stop_recurring(rule_id):
+    run_with_retry(lambda: recurring.deactivate(current_user, rule_id))
+    flash("Правило остановлено")
+    return redirect(url_for("transactions.recurring_page"))
+
+
+@transaction_bp.route("/live")
+@login_required
+def live_updates():
+    """SSE-канал семьи: событие transaction на каждую новую операцию"""
+    if not current_app.config["LIVE_SSE_ENABLED"]:
+        abort(404)
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    return Response(
+        live.stream(scope_key(current_user), last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@transaction_bp.route("/live/events")
+@login_required
+def live_events():
+    """События семьи после after — для опроса дашбордом, когда SSE выключен"""
+    after = request.args.get("after", 0, type=int)
+    events = live.missed_events(scope_key(current_user), after)
+    return jsonify({
+        "events": [{"id": event_id, "kind": kind, "data": json.loads(payload)} for event_id, kind, payload in events],
+        "last_id": events[-1][0] if events else after,
+    })
+
+
+@transaction_bp.route("/api/categories")
+@login_required
+def category_autocomplete():
+    """Автодополнение категории в форме добавления операции"""
+    limit = max(1, min(request.args.get("limit", 10, type=int), 50))
+    names = categories.autocomplete(scope_key(current_user), request.args.get("q", ""), limit)
+    return jsonify({"categories": names})
+
+
+@transaction_bp.route("/api/categories/suggest")
+@login_required
+def category_suggest():
+    """Вероятные категории по комментарию (и магазину) — локальная модель, без LLM"""
+    ttype = request.args.get("type", "expense")
+    if ttype not in ledger.TYPES:
+        return jsonify({"error": "Неизвестный тип операции"}), 400
+    limit = max(1, min(request.args.get("limit", 3, type=int), 10))
+    suggestions = categorizer.suggest(
+        scope_key(current_user), ttype,
+        request.args.get("description", ""), request.args.get("merchant"), limit,
+    )
+    return jsonify({"suggestions": suggestions})
+
+
+@transaction_bp.route("/api/search")
+@login_required
+def search_transactions():
+    """Поиск по описанию, магазину и товарам чека, по релевантности"""
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    rows, has_next = search.search(current_user, request.args.get("q", ""), page, per_page)
+    return jsonify({
+        "results": [
+            {
+                "id": row["id"],
+                "date": row["date"],
+                "type": row["type"],
+                "amount": format_money(row["amount_minor"]),
+                "category": row["category"],
+                "description": row["description"],
+                "merchant_name": row["merchant_name"],
+                "snippet": row["snippet"],
+            }
+            for row in rows
+        ],
+        "page": page,
+        "per_page": per_page,
+        "has_next": has_next,
+    })
+
+
+@transaction_bp.route("/api/history")
+@login_required
+def history_api():
+    """История операций: ?after=<next_cursor> для следующей страницы"""
+    limit = max(1, min(request.args.get("limit", 50, type=int), 200))
+    try:
+        filters = history.parse_filters(request.args)
+        rows, next_cursor = history.page(current_user, filters, request.args.get("after"), limit)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    return jsonify({
+        "transactions": [
+            {
+                "id": t.id,
+                "date": t.date.isoformat(),
+                "type": t.type,
+                "amount": format_money(t.amount_minor),
+                "category": t.category,
+                "category_id": t.category_id,
+                "user_id": t.user_id,
+                "description": t.description,
+            }
+            for t in rows
+        ],
+        "next_cursor": next_cursor,
+    })
+
+
+@transaction_bp.route("/api/sync", methods=["GET"])
+@login_required
+def sync_pull():
+    """Изменения после ?cursor= (без курсора — вся история постранично)"""
+    limit = max(1, min(request.args.get("limit", 500, type=int), 1000))
+    try:
+        return jsonify(sync.changes(current_user, request.args.get("cursor"), limit))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+
+@transaction_bp.route("/api/sync", methods=["POST"])
+@login_required
+def sync_push():
+    """
+    Пачка операций, созданных на клиенте: {"creates": [{client_id, type, amount,
+    category, description?, date?}, ...]} — всё в одном коммите, повтор безопасен
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        results = sync.apply_creates(current_user, payload.get("creates", []))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"results": results})
+
+
+_MONTH = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+@transaction_bp.route("/api/budgets", methods=["GET"])
+@login_required
+def budgets_api():
+    """Лимиты с расходами и уведомления за ?month=ГГГГ-ММ (по умолчанию текущий)"""
+    month = request.args.get("month")
+    if month and not _MONTH.match(month):
+        return jsonify({"error": "month в формате ГГГГ-ММ"}), 400
+    return jsonify({
+        "budgets": [budgets.serialize_status(row) for row in budgets.status(current_user, month)],
+        "alerts": [budgets.serialize_alert(a) for a in budgets.alerts(current_user, month)],
+    })
+
+
+@transaction_bp.route("/api/budgets", methods=["POST"])
+@login_required
+def budgets_api_set():
+    """{"category": ..., "limit": "15000", "thresholds": "80,100"?} — создать или изменить лимит"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        limit_minor = to_minor(str(payload.get("limit", "")))
+        if not categories.normalize_name(payload.get("category")):
+            raise ValueError("Укажите категорию")
+
+        def work():
+            budget = budgets.set_budget(current_user, payload["category"], limit_minor,
+                                        payload.get("thresholds"))
+            return budget.id
+
+        budget_id = run_with_retry(work)
+    except ValueError as exc:
+        db.session.rollback()
+        return jsonify({"error": str(exc)}), 400
+
+    row = next(r for r in budgets.status(current_user) if r["id"] == budget_id)
+    return jsonify({"budget": budgets.serialize_status(row)})
+
+
+@transaction_bp.route("/api/budgets/<int:budget_id>", methods=["DELETE"])
+@login_required
+def budgets_api_delete(budget_id):
+    if not run_with_retry(lambda: budgets.remove_budget(current_user, budget_id)):
+        return jsonify({"error": "Лимит не найден"}), 404
+    return jsonify({"deleted": budget_id})
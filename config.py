@@ -8,4 +8,109 @@ class Config:
         "sqlite:///" + os.path.join(basedir, "app.db")
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # PRAGMA для каждого нового соединения SQLite (см. app/database.py)
+    SQLITE_PRAGMAS = {}
+    # Повторы коммита при «database is locked»
+    DB_LOCK_RETRIES = int(os.environ.get("DB_LOCK_RETRIES", "3"))
+    DB_LOCK_RETRY_DELAY = float(os.environ.get("DB_LOCK_RETRY_DELAY", "0.05"))
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+
+    # Ограничение попыток входа (отключается для нагрузочного теста)
+    LOGIN_RATE_LIMIT_ENABLED = os.environ.get("LOGIN_RATE_LIMIT_ENABLED", "1") != "0"
+
+    # Метрики: каталог для снимков воркеров gunicorn (без него — только текущий процесс).
+    # Каталог стоит очищать при каждом перезапуске сервиса.
+    METRICS_DIR = os.environ.get("METRICS_DIR")
+    METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "1.0"))
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")  # если задан — /metrics требует Bearer-токен
+
+    # Профилирование запросов (заголовок X-Profile с токеном из `flask profile-token` или выборка)
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(basedir, "profiles"))
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_TOKEN_MAX_AGE = int(os.environ.get("PROFILE_TOKEN_MAX_AGE", "3600"))
+
+    # Детектор N+1: по умолчанию работает только в debug-режиме
+    QUERY_DETECTOR_ENABLED = (
+        os.environ["QUERY_DETECTOR_ENABLED"] != "0" if "QUERY_DETECTOR_ENABLED" in os.environ else None
+    )
+    QUERY_DETECTOR_THRESHOLD = int(os.environ.get("QUERY_DETECTOR_THRESHOLD", "5"))
+
+    # Колоночный кэш операций для аналитики (app/analytics_cache.py), память на процесс
+    ANALYTICS_CACHE_ENABLED = os.environ.get("ANALYTICS_CACHE_ENABLED", "0") == "1"
+    ANALYTICS_CACHE_MAX_BYTES = int(os.environ.get("ANALYTICS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Кэш прореженных рядов для графиков (app/charts.py): записи других воркеров видны через TTL
+    CHART_CACHE_TTL = float(os.environ.get("CHART_CACHE_TTL", "60"))
+    CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", "256"))
+
+    # Живые обновления дашборда (app/live.py). SSE держит поток воркера на каждую вкладку —
+    # включать только под gunicorn --worker-class gthread; иначе дашборд опрашивает события
+    LIVE_SSE_ENABLED = os.environ.get("LIVE_SSE_ENABLED", "0") == "1"
+    LIVE_CLIENT_POLL_SECONDS = float(os.environ.get("LIVE_CLIENT_POLL_SECONDS", "10"))
+    LIVE_POLL_INTERVAL = float(os.environ.get("LIVE_POLL_INTERVAL", "0.5"))
+    LIVE_HEARTBEAT = float(os.environ.get("LIVE_HEARTBEAT", "15"))
+    LIVE_EVENT_KEEP = int(os.environ.get("LIVE_EVENT_KEEP", "10000"))
+
+    # Пороги уведомлений о бюджете по умолчанию, в процентах от лимита (app/budgets.py)
+    BUDGET_ALERT_THRESHOLDS = os.environ.get("BUDGET_ALERT_THRESHOLDS", "80,100")
+
+    # Перенос старых операций в архив (flask archive-cold, app/archive.py)
+    ARCHIVE_AFTER_MONTHS = int(os.environ.get("ARCHIVE_AFTER_MONTHS", "24"))
+    ARCHIVE_CHUNK_SIZE = int(os.environ.get("ARCHIVE_CHUNK_SIZE", "2000"))
+    ARCHIVE_PAUSE = float(os.environ.get("ARCHIVE_PAUSE", "0.05"))  # секунд между порциями
+
+    # Заполнение данных порциями (app/backfill.py): размер порции подстраивается так,
+    # чтобы одна транзакция записи держала блокировку около BACKFILL_TARGET_SECONDS
+    BACKFILL_CHUNK_SIZE = int(os.environ.get("BACKFILL_CHUNK_SIZE", "2000"))
+    BACKFILL_TARGET_SECONDS = float(os.environ.get("BACKFILL_TARGET_SECONDS", "0.2"))
+    BACKFILL_PAUSE = float(os.environ.get("BACKFILL_PAUSE", "0.05"))
+
+    # Подсказка категории (app/categorizer.py): моделей контекстов в памяти процесса
+    CATEGORIZER_CACHE_SCOPES = int(os.environ.get("CATEGORIZER_CACHE_SCOPES", "512"))
+
+    # Комментарий LLM к наблюдениям «Умного анализа» (догружается после страницы)
+    INSIGHTS_LLM_ENABLED = os.environ.get("INSIGHTS_LLM_ENABLED", "1") != "0"
+
+    # Советы LLM (app/advice.py): за сколько последних месяцев, включая текущий
+    ADVICE_MONTHS = int(os.environ.get("ADVICE_MONTHS", "3"))
+    # Ночная генерация (flask advice-pregenerate): одновременных запросов к LLM и запросов в секунду
+    ADVICE_CONCURRENCY = int(os.environ.get("ADVICE_CONCURRENCY", "4"))
+    ADVICE_RATE = float(os.environ.get("ADVICE_RATE", "2"))
+
+    # Валюта, в которой хранятся amount_minor и считаются итоги; курсы остальных — flask fx-load
+    BASE_CURRENCY = os.environ.get("BASE_CURRENCY", "RUB")
+    FX_CACHE_SECONDS = float(os.environ.get("FX_CACHE_SECONDS", "60"))  # как часто сверять кэш курсов с БД
+
+    # Telegram-бот (flask telegram-bot, app/telegram_bot.py). TELEGRAM_API_URL можно направить
+    # на scripts/fake_telegram_server.py; операции пишутся порциями раз в FLUSH_INTERVAL секунд
+    TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+    TELEGRAM_BOT_USERNAME = os.environ.get("TELEGRAM_BOT_USERNAME")  # для ссылки t.me/<бот>?start=КОД
+    TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+    TELEGRAM_FLUSH_INTERVAL = float(os.environ.get("TELEGRAM_FLUSH_INTERVAL", "0.5"))
+    TELEGRAM_FLUSH_SIZE = int(os.environ.get("TELEGRAM_FLUSH_SIZE", "200"))
+    TELEGRAM_LINK_TTL_MINUTES = int(os.environ.get("TELEGRAM_LINK_TTL_MINUTES", "30"))
+
+
+class ProductionConfig(Config):
+    """
+    Профиль для gunicorn с несколькими воркерами на одном SQLite-файле.
+    Включается переменной окружения APP_CONFIG=config.ProductionConfig
+    """
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",           # читатели не ждут писателя
+        "synchronous": "NORMAL",         # в WAL безопасно и без fsync на каждый коммит
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "cache_size": -int(os.environ.get("SQLITE_CACHE_KB", "65536")),  # отрицательное — в КиБ
+        "mmap_size": int(os.environ.get("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024))),
+        "temp_store": "MEMORY",
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "5")),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+        # таймаут ожидания блокировки на уровне драйвера, в секундах
+        "connect_args": {"timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")) / 1000},
+    }
+    DB_LOCK_RETRIES = int(os.environ.get("DB_LOCK_RETRIES", "5"))
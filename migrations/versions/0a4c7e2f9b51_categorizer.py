@@ -0,0 +1,43 @@
+"""naive Bayes counters for category suggestions
+
+Revision ID: 0a4c7e2f9b51
+Revises: f5a8c1e3d720
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a4c7e2f9b51'
+down_revision = 'f5a8c1e3d720'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() вызывает db.create_all(), поэтому таблицы могут уже существовать.
+    # Модель по истории обучается отдельно: flask categorizer-train
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'categorizer_token' not in tables:
+        op.create_table('categorizer_token',
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('type', sa.String(length=10), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(length=40), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('scope', 'type', 'category_id', 'token')
+        )
+    if 'categorizer_state' not in tables:
+        op.create_table('categorizer_state',
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('scope')
+        )
+
+
+def downgrade():
+    op.drop_table('categorizer_state')
+    op.drop_table('categorizer_token')
@@ -0,0 +1,36 @@
+"""live dashboard events shared between workers
+
+Revision ID: 2a6c9f0d8e15
+Revises: 9e4b3c7a1f26
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a6c9f0d8e15'
+down_revision = '9e4b3c7a1f26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() вызывает db.create_all(), поэтому таблица может уже существовать
+    if 'live_event' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('live_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.String(length=24), nullable=False),
+    sa.Column('kind', sa.String(length=32), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_live_event_scope_id', 'live_event', ['scope', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_live_event_scope_id', table_name='live_event')
+    op.drop_table('live_event')
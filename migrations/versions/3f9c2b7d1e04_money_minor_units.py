@@ -0,0 +1,123 @@
+"""money in integer minor units
+
+Revision ID: 3f9c2b7d1e04
+Revises: a7d8475bc955
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2b7d1e04'
+down_revision = 'a7d8475bc955'
+branch_labels = None
+depends_on = None
+
+# Строк на один UPDATE при заполнении новых колонок
+CHUNK_SIZE = 5000
+
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _backfill(table, target, expression):
+    """
+    Заполняет колонку по диапазонам id. Транзакция миграции фиксируется
+    (autocommit_block), и каждый UPDATE порции коммитится сам: блокировка
+    записи не держится на всё заполнение. Уже заполненные строки пропускаются
+    """
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        lo, hi = conn.execute(sa.text(f'SELECT min(id), max(id) FROM "{table}"')).one()
+        if lo is None:
+            return
+        for start in range(lo, hi + 1, CHUNK_SIZE):
+            conn.execute(
+                sa.text(f'UPDATE "{table}" SET {target} = {expression} '
+                        f'WHERE id >= :lo AND id < :hi AND {target} IS NULL'),
+                {"lo": start, "hi": start + CHUNK_SIZE},
+            )
+
+
+def _to_minor(value):
+    # как app.money.to_minor: через repr, 0.285 -> Decimal("0.285") -> 29, а не
+    # ROUND(0.285 * 100) = 28 по двоичному представлению
+    return int((Decimal(repr(value)) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _backfill_minor(table, target, source):
+    """
+    Копейки из float-колонки — в Python, тем же округлением, что и у новых
+    сумм. Каждая порция — своя транзакция (BEGIN/COMMIT поверх autocommit)
+    """
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        lo, hi = conn.execute(sa.text(f'SELECT min(id), max(id) FROM "{table}"')).one()
+        if lo is None:
+            return
+        for start in range(lo, hi + 1, CHUNK_SIZE):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    sa.text(f'SELECT id, {source} FROM "{table}" '
+                            f'WHERE id >= :lo AND id < :hi AND {target} IS NULL'),
+                    {"lo": start, "hi": start + CHUNK_SIZE},
+                ).all()
+                if rows:
+                    conn.execute(
+                        sa.text(f'UPDATE "{table}" SET {target} = :minor WHERE id = :id'),
+                        [{"id": row_id, "minor": _to_minor(value)} for row_id, value in rows],
+                    )
+            except Exception:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+            conn.exec_driver_sql("COMMIT")
+
+
+def upgrade():
+    # порции коммитятся по отдельности: после прерванного запуска колонка уже есть
+    if 'amount_minor' not in _columns('transaction'):
+        with op.batch_alter_table('transaction', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('amount_minor', sa.BigInteger(), nullable=True))
+    _backfill_minor('transaction', 'amount_minor', 'amount')
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.alter_column('amount_minor', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.drop_column('amount')
+
+    # таблица позиций чека могла быть создана через db.create_all(), а не миграцией
+    if 'transaction_item' in _tables():
+        if 'price_minor' not in _columns('transaction_item'):
+            with op.batch_alter_table('transaction_item', schema=None) as batch_op:
+                batch_op.add_column(sa.Column('price_minor', sa.BigInteger(), nullable=True))
+        _backfill_minor('transaction_item', 'price_minor', 'price')
+        with op.batch_alter_table('transaction_item', schema=None) as batch_op:
+            batch_op.alter_column('price_minor', existing_type=sa.BigInteger(), nullable=False)
+            batch_op.drop_column('price')
+
+
+def downgrade():
+    if 'transaction_item' in _tables():
+        if 'price' not in _columns('transaction_item'):
+            with op.batch_alter_table('transaction_item', schema=None) as batch_op:
+                batch_op.add_column(sa.Column('price', sa.Float(), nullable=True))
+        _backfill('transaction_item', 'price', 'price_minor / 100.0')
+        with op.batch_alter_table('transaction_item', schema=None) as batch_op:
+            batch_op.alter_column('price', existing_type=sa.Float(), nullable=False)
+            batch_op.drop_column('price_minor')
+
+    if 'amount' not in _columns('transaction'):
+        with op.batch_alter_table('transaction', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('amount', sa.Float(), nullable=True))
+    _backfill('transaction', 'amount', 'amount_minor / 100.0')
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Float(), nullable=False)
+        batch_op.drop_column('amount_minor')
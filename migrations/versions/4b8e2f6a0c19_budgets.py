@@ -0,0 +1,53 @@
+"""monthly category budgets and threshold alerts
+
+Revision ID: 4b8e2f6a0c19
+Revises: e7a1d4b9c302
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e2f6a0c19'
+down_revision = 'e7a1d4b9c302'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() вызывает db.create_all(), поэтому таблицы могут уже существовать
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'budget' not in tables:
+        op.create_table('budget',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('limit_minor', sa.BigInteger(), nullable=False),
+        sa.Column('thresholds', sa.String(length=64), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('scope', 'category_id', name='uq_budget_scope_category')
+        )
+    if 'budget_alert' not in tables:
+        op.create_table('budget_alert',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('month', sa.String(length=7), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('threshold', sa.Integer(), nullable=False),
+        sa.Column('spent_minor', sa.BigInteger(), nullable=False),
+        sa.Column('limit_minor', sa.BigInteger(), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('scope', 'month', 'category_id', 'threshold', name='uq_budget_alert')
+        )
+
+
+def downgrade():
+    op.drop_table('budget_alert')
+    op.drop_table('budget')
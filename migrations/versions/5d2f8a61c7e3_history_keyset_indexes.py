@@ -0,0 +1,36 @@
+"""composite indexes for keyset-paginated history
+
+Revision ID: 5d2f8a61c7e3
+Revises: c41a7e9d2b53
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2f8a61c7e3'
+down_revision = 'c41a7e9d2b53'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_transaction_family_date_id': ['family_id', 'date', 'id'],
+    'ix_transaction_family_type_date_id': ['family_id', 'type', 'date', 'id'],
+    'ix_transaction_user_date_id': ['user_id', 'date', 'id'],
+    'ix_transaction_category_date_id': ['category_id', 'date', 'id'],
+}
+
+
+def upgrade():
+    # на новой БД индексы уже создал db.create_all()
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'transaction', columns, unique=False, if_not_exists=True)
+    # составной индекс по category_id покрывает и поиск по внешнему ключу
+    op.drop_index('ix_transaction_category_id', table_name='transaction', if_exists=True)
+
+
+def downgrade():
+    op.create_index('ix_transaction_category_id', 'transaction', ['category_id'], unique=False)
+    for name in INDEXES:
+        op.drop_index(name, table_name='transaction')
@@ -0,0 +1,61 @@
+"""recurring transaction rules
+
+Revision ID: 6c3d9a7e2b40
+Revises: 4b8e2f6a0c19
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c3d9a7e2b40'
+down_revision = '4b8e2f6a0c19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ADD COLUMN без пересборки таблицы: триггеры полнотекстового индекса не мешают
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('transaction')}
+    if 'recurring_rule_id' not in columns:
+        with op.batch_alter_table('transaction', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('recurring_rule_id', sa.Integer(), nullable=True))
+    op.create_index('uq_transaction_recurring_date', 'transaction', ['recurring_rule_id', 'date'], unique=True, if_not_exists=True)
+
+    # create_app() вызывает db.create_all(), поэтому таблица может уже существовать
+    if 'recurring_rule' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('recurring_rule',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('family_id', sa.Integer(), nullable=True),
+        sa.Column('type', sa.String(length=10), nullable=False),
+        sa.Column('amount_minor', sa.BigInteger(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('freq', sa.String(length=8), nullable=False),
+        sa.Column('interval', sa.Integer(), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('until_date', sa.Date(), nullable=True),
+        sa.Column('materialized_through', sa.Date(), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+        sa.ForeignKeyConstraint(['family_id'], ['family.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_recurring_rule_due', 'recurring_rule', ['active', 'materialized_through'], unique=False)
+        op.create_index('ix_recurring_rule_scope', 'recurring_rule', ['scope'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_recurring_rule_scope', table_name='recurring_rule')
+    op.drop_index('ix_recurring_rule_due', table_name='recurring_rule')
+    op.drop_table('recurring_rule')
+
+    op.drop_index('uq_transaction_recurring_date', table_name='transaction')
+    # DROP COLUMN в SQLite 3.35+ тоже без пересборки таблицы
+    op.execute('ALTER TABLE "transaction" DROP COLUMN recurring_rule_id')
@@ -0,0 +1,31 @@
+"""indexes for large-expense range queries
+
+Revision ID: 7e1b5c3a9d28
+Revises: 0a4c7e2f9b51
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7e1b5c3a9d28'
+down_revision = '0a4c7e2f9b51'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_transaction_family_type_amount': ['family_id', 'type', 'amount_minor'],
+    'ix_transaction_user_type_amount': ['user_id', 'type', 'amount_minor'],
+}
+
+
+def upgrade():
+    # на новой БД индексы уже создал db.create_all()
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'transaction', columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name='transaction')
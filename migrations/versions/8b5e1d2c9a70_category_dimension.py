@@ -0,0 +1,111 @@
+"""category dimension table
+
+Revision ID: 8b5e1d2c9a70
+Revises: 3f9c2b7d1e04
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e1d2c9a70'
+down_revision = '3f9c2b7d1e04'
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 5000
+_SPACES = re.compile(r"\s+")
+
+
+# Копия правил из app/categories.py на момент миграции
+def _clean_name(name):
+    name = _SPACES.sub(" ", (name or "").strip())[:64]
+    return name[:1].upper() + name[1:]
+
+
+def _normalize_name(name):
+    return _SPACES.sub(" ", (name or "").strip()).casefold().replace("ё", "е")[:64]
+
+
+def upgrade():
+    # create_app() вызывает db.create_all(), поэтому новая таблица может уже существовать
+    if 'category' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('category',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('name_norm', sa.String(length=64), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('scope', 'name_norm', name='uq_category_scope_name')
+        )
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_transaction_category_id', 'category', ['category_id'], ['id'])
+        batch_op.create_index(batch_op.f('ix_transaction_category_id'), ['category_id'], unique=False)
+
+    # Нормализация (casefold кириллицы) в SQLite недоступна — считаем её в Python
+    # по DISTINCT-значениям, а сами операции обновляем пачками через таблицу соответствий.
+    conn = op.get_bind()
+    category = sa.table('category',
+        sa.column('id', sa.Integer), sa.column('scope', sa.String),
+        sa.column('name', sa.String), sa.column('name_norm', sa.String))
+
+    conn.execute(sa.text(
+        'CREATE TEMP TABLE _category_map ('
+        'scope VARCHAR(24) NOT NULL, raw VARCHAR(64) NOT NULL, '
+        'category_id INTEGER NOT NULL, name VARCHAR(64) NOT NULL, PRIMARY KEY (scope, raw))'
+    ))
+
+    ids = {}
+    raw_values = conn.execute(sa.text(
+        'SELECT DISTINCT family_id, user_id, category FROM "transaction"'
+    )).all()
+    for family_id, user_id, raw in raw_values:
+        scope = f"f{family_id}" if family_id else f"u{user_id}"
+        norm = _normalize_name(raw) or "без категории"
+        key = (scope, norm)
+        if key not in ids:
+            name = _clean_name(raw) or "Без категории"
+            result = conn.execute(category.insert().values(scope=scope, name=name, name_norm=norm))
+            ids[key] = (result.lastrowid, name)
+        category_id, name = ids[key]
+        conn.execute(
+            sa.text('INSERT OR IGNORE INTO _category_map VALUES (:scope, :raw, :cid, :name)'),
+            {"scope": scope, "raw": raw, "cid": category_id, "name": name},
+        )
+
+    lo, hi = conn.execute(sa.text('SELECT min(id), max(id) FROM "transaction"')).one()
+    if lo is not None:
+        lookup = (
+            'FROM _category_map m WHERE m.raw = "transaction".category AND m.scope = '
+            'CASE WHEN "transaction".family_id IS NOT NULL '
+            "THEN 'f' || \"transaction\".family_id ELSE 'u' || \"transaction\".user_id END"
+        )
+        # транзакция миграции фиксируется, каждая порция коммитится сама:
+        # блокировка записи не держится на всю таблицу
+        with op.get_context().autocommit_block():
+            for start in range(lo, hi + 1, CHUNK_SIZE):
+                op.get_bind().execute(
+                    sa.text(
+                        f'UPDATE "transaction" SET '
+                        f'category_id = (SELECT m.category_id {lookup}), '
+                        f'category = coalesce((SELECT m.name {lookup}), category) '
+                        f'WHERE id >= :lo AND id < :hi AND category_id IS NULL'
+                    ),
+                    {"lo": start, "hi": start + CHUNK_SIZE},
+                )
+
+    op.get_bind().execute(sa.text('DROP TABLE _category_map'))
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_transaction_category_id'))
+        batch_op.drop_constraint('fk_transaction_category_id', type_='foreignkey')
+        batch_op.drop_column('category_id')
+
+    op.drop_table('category')
@@ -0,0 +1,42 @@
+"""monthly category aggregates with quantile sketches
+
+Revision ID: 9e4b3c7a1f26
+Revises: 5d2f8a61c7e3
+Create Date: 2026-10-19 14:00:00.000000
+
+Агрегаты заполняет миграция b6d3f9a2c471 (или `flask rollups-rebuild`).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b3c7a1f26'
+down_revision = '5d2f8a61c7e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() вызывает db.create_all(), поэтому таблица может уже существовать
+    if 'monthly_category_stat' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('monthly_category_stat',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.String(length=24), nullable=False),
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('type', sa.String(length=10), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('total_minor', sa.BigInteger(), nullable=False),
+    sa.Column('min_minor', sa.BigInteger(), nullable=True),
+    sa.Column('max_minor', sa.BigInteger(), nullable=True),
+    sa.Column('sketch', sa.LargeBinary(), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('scope', 'month', 'type', 'category_id', name='uq_monthly_category_stat')
+    )
+
+
+def downgrade():
+    op.drop_table('monthly_category_stat')
@@ -0,0 +1,49 @@
+"""sync_seq counter and unique index
+
+Revision ID: a9c4e2f7b518
+Revises: d4f1b8c6e253
+Create Date: 2026-10-20 03:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c4e2f7b518'
+down_revision = 'd4f1b8c6e253'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'sync_counter' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('sync_counter',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    # одинаковые номера от параллельных записей: первая операция номер сохраняет,
+    # остальные получают новые в заполнении sync-seq ниже
+    op.execute(
+        'UPDATE "transaction" SET sync_seq = NULL WHERE sync_seq IS NOT NULL AND id > '
+        '(SELECT min(t.id) FROM "transaction" t WHERE t.sync_seq = "transaction".sync_seq)'
+    )
+    op.execute(
+        'INSERT INTO sync_counter (id, seq) SELECT 1, coalesce(max(seq), 0) FROM ('
+        'SELECT max(sync_seq) AS seq FROM "transaction" '
+        'UNION ALL SELECT max(sync_seq) FROM transaction_tombstone'
+        ') WHERE true ON CONFLICT DO NOTHING'
+    )
+    op.drop_index('ix_transaction_sync_seq', table_name='transaction', if_exists=True)
+    op.create_index('uq_transaction_sync_seq', 'transaction', ['sync_seq'], unique=True, if_not_exists=True)
+
+    from app import backfill
+    backfill.run_from_migration('sync-seq', restart=True)
+
+
+def downgrade():
+    op.drop_index('uq_transaction_sync_seq', table_name='transaction')
+    op.create_index('ix_transaction_sync_seq', 'transaction', ['sync_seq'], unique=False)
+    op.drop_table('sync_counter')
@@ -0,0 +1,34 @@
+"""precomputed LLM advice per scope
+
+Revision ID: b3d9e6f1a472
+Revises: 7e1b5c3a9d28
+Create Date: 2026-10-19 23:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d9e6f1a472'
+down_revision = '7e1b5c3a9d28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() вызывает db.create_all(), поэтому таблица может уже существовать.
+    # Советы заполняются командой flask advice-pregenerate
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'advice' not in tables:
+        op.create_table('advice',
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('generated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('scope')
+        )
+
+
+def downgrade():
+    op.drop_table('advice')
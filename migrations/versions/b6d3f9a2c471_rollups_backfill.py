@@ -0,0 +1,29 @@
+"""fill monthly category aggregates
+
+Revision ID: b6d3f9a2c471
+Revises: a9c4e2f7b518
+Create Date: 2026-10-20 04:00:00.000000
+
+Миграция 9e4b3c7a1f26 только создала monthly_category_stat: на базе с
+историей агрегаты оставались пустыми (или покрывали лишь операции после
+неё), и квантили, бюджеты и советы их недосчитывали.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d3f9a2c471'
+down_revision = 'a9c4e2f7b518'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # порциями по id, каждая — своя короткая транзакция (app/rollups.py)
+    from app import rollups
+    rollups.rebuild_from_migration()
+
+
+def downgrade():
+    # агрегаты остаются: таблицу удаляет откат 9e4b3c7a1f26
+    pass
@@ -0,0 +1,97 @@
+"""full-text search index over transactions
+
+Revision ID: c41a7e9d2b53
+Revises: 8b5e1d2c9a70
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41a7e9d2b53'
+down_revision = '8b5e1d2c9a70'
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 5000
+
+# Копия DDL из app/search.py на момент миграции
+def _fold(expr):
+    # unicode61 не снимает диакритику с кириллицы, поэтому «ё» -> «е» сводим сами
+    return f"replace(replace(coalesce({expr}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+_ROW_SELECT = f"""
+SELECT t.id,
+       CASE WHEN t.family_id IS NOT NULL THEN 'f' || t.family_id ELSE 'u' || t.user_id END,
+       {_fold('t.description')},
+       {_fold('t.merchant_name')},
+       {_fold("(SELECT group_concat(i.item_name, ' ') FROM transaction_item i WHERE i.transaction_id = t.id)")}
+FROM "transaction" t
+"""
+_INSERT = "INSERT INTO transaction_fts(rowid, scope, description, merchant_name, items)"
+
+
+def _refresh(tx_id):
+    return (
+        f"DELETE FROM transaction_fts WHERE rowid = {tx_id}; "
+        f"{_INSERT} {_ROW_SELECT} WHERE t.id = {tx_id};"
+    )
+
+
+DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transaction_fts USING fts5("
+    "scope, description, merchant_name, items, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_fts_ai AFTER INSERT ON \"transaction\" "
+    f"BEGIN {_INSERT} {_ROW_SELECT} WHERE t.id = new.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_fts_au "
+    "AFTER UPDATE OF description, merchant_name, family_id, user_id ON \"transaction\" "
+    f"BEGIN {_refresh('new.id')} END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_fts_ad AFTER DELETE ON \"transaction\" "
+    "BEGIN DELETE FROM transaction_fts WHERE rowid = old.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_item_fts_ai AFTER INSERT ON transaction_item "
+    f"BEGIN {_refresh('new.transaction_id')} END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_item_fts_au AFTER UPDATE ON transaction_item "
+    f"BEGIN {_refresh('old.transaction_id')} {_refresh('new.transaction_id')} END",
+
+    "CREATE TRIGGER IF NOT EXISTS transaction_item_fts_ad AFTER DELETE ON transaction_item "
+    f"BEGIN {_refresh('old.transaction_id')} END",
+]
+
+
+def upgrade():
+    for statement in DDL:
+        op.execute(statement)
+
+    # create_app() мог уже создать индекс — заполняем его заново пачками
+    op.execute("DELETE FROM transaction_fts")
+    # каждая пачка коммитится сама; строки, проиндексированные триггерами за это
+    # время, пропускаются
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        lo, hi = conn.exec_driver_sql('SELECT min(id), max(id) FROM "transaction"').one()
+        if lo is not None:
+            for start in range(lo, hi + 1, CHUNK_SIZE):
+                conn.exec_driver_sql(
+                    f"{_INSERT} {_ROW_SELECT} WHERE t.id >= ? AND t.id < ? "
+                    "AND NOT EXISTS (SELECT 1 FROM transaction_fts f WHERE f.rowid = t.id)",
+                    (start, start + CHUNK_SIZE),
+                )
+    op.execute("INSERT INTO transaction_fts(transaction_fts) VALUES ('optimize')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS transaction_item_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS transaction_item_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS transaction_item_fts_ai")
+    op.execute("DROP TRIGGER IF EXISTS transaction_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS transaction_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS transaction_fts_ai")
+    op.execute("DROP TABLE IF EXISTS transaction_fts")
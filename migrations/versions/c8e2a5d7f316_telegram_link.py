@@ -0,0 +1,37 @@
+"""telegram chat links for the bot
+
+Revision ID: c8e2a5d7f316
+Revises: b3d9e6f1a472
+Create Date: 2026-10-20 00:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2a5d7f316'
+down_revision = 'b3d9e6f1a472'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() вызывает db.create_all(), поэтому таблица может уже существовать
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'telegram_link' not in tables:
+        op.create_table('telegram_link',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=True),
+        sa.Column('code', sa.String(length=16), nullable=True),
+        sa.Column('code_expires_at', sa.DateTime(), nullable=True),
+        sa.Column('linked_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id'),
+        sa.UniqueConstraint('chat_id'),
+        sa.UniqueConstraint('code')
+        )
+
+
+def downgrade():
+    op.drop_table('telegram_link')
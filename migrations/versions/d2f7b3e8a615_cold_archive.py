@@ -0,0 +1,74 @@
+"""archive tables for cold transactions
+
+Revision ID: d2f7b3e8a615
+Revises: 6c3d9a7e2b40
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f7b3e8a615'
+down_revision = '6c3d9a7e2b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() вызывает db.create_all(), поэтому таблицы могут уже существовать
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'transaction_archive' not in tables:
+        op.create_table('transaction_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('family_id', sa.Integer(), nullable=True),
+        sa.Column('type', sa.String(length=10), nullable=False),
+        sa.Column('amount_minor', sa.BigInteger(), nullable=False),
+        sa.Column('category', sa.String(length=64), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('date', sa.DateTime(), nullable=True),
+        sa.Column('receipt_image', sa.String(length=512), nullable=True),
+        sa.Column('merchant_name', sa.String(length=128), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('sync_seq', sa.BigInteger(), nullable=True),
+        sa.Column('client_id', sa.String(length=64), nullable=True),
+        sa.Column('recurring_rule_id', sa.Integer(), nullable=True),
+        sa.Column('items', sa.Text(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_transaction_archive_family_date', 'transaction_archive', ['family_id', 'date'], unique=False)
+        op.create_index('ix_transaction_archive_user_date', 'transaction_archive', ['user_id', 'date'], unique=False)
+    if 'archive_month_stat' not in tables:
+        op.create_table('archive_month_stat',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('month', sa.String(length=7), nullable=False),
+        sa.Column('type', sa.String(length=10), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('total_minor', sa.BigInteger(), nullable=False),
+        sa.Column('min_minor', sa.BigInteger(), nullable=True),
+        sa.Column('max_minor', sa.BigInteger(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('scope', 'month', 'type', 'category_id', name='uq_archive_month_stat')
+        )
+    if 'archive_state' not in tables:
+        op.create_table('archive_state',
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('rows', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('scope')
+        )
+
+
+def downgrade():
+    op.drop_table('archive_state')
+    op.drop_table('archive_month_stat')
+    op.drop_index('ix_transaction_archive_user_date', table_name='transaction_archive')
+    op.drop_index('ix_transaction_archive_family_date', table_name='transaction_archive')
+    op.drop_table('transaction_archive')
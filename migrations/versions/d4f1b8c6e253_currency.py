@@ -0,0 +1,44 @@
+"""per-transaction currency and daily FX rates
+
+Revision ID: d4f1b8c6e253
+Revises: c8e2a5d7f316
+Create Date: 2026-10-20 01:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f1b8c6e253'
+down_revision = 'c8e2a5d7f316'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Только ADD COLUMN: пересоздание "transaction" сломало бы триггеры FTS.
+    # NULL — операция в базовой валюте, существующие строки не трогаем
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    for table in ('transaction', 'transaction_archive'):
+        columns = {c['name'] for c in inspector.get_columns(table)}
+        if 'currency' not in columns:
+            op.add_column(table, sa.Column('currency', sa.String(length=3), nullable=True))
+        if 'original_minor' not in columns:
+            op.add_column(table, sa.Column('original_minor', sa.BigInteger(), nullable=True))
+
+    if 'fx_rate' not in tables:
+        op.create_table('fx_rate',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('rate_micro', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('date', 'currency')
+        )
+
+
+def downgrade():
+    op.drop_table('fx_rate')
+    for table in ('transaction_archive', 'transaction'):
+        op.drop_column(table, 'original_minor')
+        op.drop_column(table, 'currency')
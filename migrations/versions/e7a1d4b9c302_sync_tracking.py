@@ -0,0 +1,75 @@
+"""change tracking for offline sync
+
+Revision ID: e7a1d4b9c302
+Revises: 2a6c9f0d8e15
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a1d4b9c302'
+down_revision = '2a6c9f0d8e15'
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 5000
+
+
+def upgrade():
+    # ADD COLUMN без пересборки таблицы: триггеры полнотекстового индекса не мешают
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('transaction')}
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        if 'updated_at' not in columns:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        if 'sync_seq' not in columns:
+            batch_op.add_column(sa.Column('sync_seq', sa.BigInteger(), nullable=True))
+        if 'client_id' not in columns:
+            batch_op.add_column(sa.Column('client_id', sa.String(length=64), nullable=True))
+
+    # существующим операциям — номера изменений по порядку id; каждая порция
+    # коммитится сама, блокировка записи не держится на всю таблицу
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        lo, hi = conn.execute(sa.text('SELECT min(id), max(id) FROM "transaction"')).one()
+        if lo is not None:
+            for start in range(lo, hi + 1, CHUNK_SIZE):
+                conn.execute(
+                    sa.text('UPDATE "transaction" SET sync_seq = id, updated_at = coalesce(updated_at, date) '
+                            'WHERE id >= :lo AND id < :hi AND sync_seq IS NULL'),
+                    {"lo": start, "hi": start + CHUNK_SIZE},
+                )
+
+    op.create_index('ix_transaction_family_sync_seq', 'transaction', ['family_id', 'sync_seq'], unique=False, if_not_exists=True)
+    op.create_index('ix_transaction_user_sync_seq', 'transaction', ['user_id', 'sync_seq'], unique=False, if_not_exists=True)
+    op.create_index('ix_transaction_sync_seq', 'transaction', ['sync_seq'], unique=False, if_not_exists=True)
+    op.create_index('uq_transaction_user_client_id', 'transaction', ['user_id', 'client_id'], unique=True, if_not_exists=True)
+
+    if 'transaction_tombstone' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('transaction_tombstone',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=24), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.Column('sync_seq', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_transaction_tombstone_scope_seq', 'transaction_tombstone', ['scope', 'sync_seq'], unique=False)
+        op.create_index('ix_transaction_tombstone_seq', 'transaction_tombstone', ['sync_seq'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_transaction_tombstone_seq', table_name='transaction_tombstone')
+    op.drop_index('ix_transaction_tombstone_scope_seq', table_name='transaction_tombstone')
+    op.drop_table('transaction_tombstone')
+
+    op.drop_index('uq_transaction_user_client_id', table_name='transaction')
+    op.drop_index('ix_transaction_sync_seq', table_name='transaction')
+    op.drop_index('ix_transaction_user_sync_seq', table_name='transaction')
+    op.drop_index('ix_transaction_family_sync_seq', table_name='transaction')
+    # DROP COLUMN в SQLite 3.35+ тоже без пересборки таблицы
+    op.execute('ALTER TABLE "transaction" DROP COLUMN client_id')
+    op.execute('ALTER TABLE "transaction" DROP COLUMN sync_seq')
+    op.execute('ALTER TABLE "transaction" DROP COLUMN updated_at')
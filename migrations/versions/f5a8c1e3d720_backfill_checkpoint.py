@@ -0,0 +1,38 @@
+"""checkpoints for chunked backfills
+
+Revision ID: f5a8c1e3d720
+Revises: d2f7b3e8a615
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a8c1e3d720'
+down_revision = 'd2f7b3e8a615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() вызывает db.create_all(), поэтому таблица может уже существовать.
+    # Заполнение данных в следующих миграциях — app.backfill.run_from_migration(name)
+    # после изменения схемы, а не одним UPDATE по всей таблице
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'backfill_checkpoint' not in tables:
+        op.create_table('backfill_checkpoint',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('last_id', sa.BigInteger(), nullable=False),
+        sa.Column('end_id', sa.BigInteger(), nullable=True),
+        sa.Column('rows', sa.BigInteger(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+        )
+
+
+def downgrade():
+    op.drop_table('backfill_checkpoint')
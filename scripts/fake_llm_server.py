@@ -0,0 +1,122 @@
+"""
+Локальная заглушка OpenAI/DeepSeek API для нагрузочных тестов
+Запуск: python scripts/fake_llm_server.py --port 8765 --latency-ms 800
+
+Приложение переключается на неё переменной окружения:
+DEEPSEEK_BASE_URL=http://127.0.0.1:8765 DEEPSEEK_API_KEY=fake
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_ADVICE = (
+    "1. Проверьте подписки — часть из них можно отключить.\n"
+    "2. Планируйте покупки продуктов на неделю вперёд.\n"
+    "3. Откладывайте 10% дохода в день зарплаты."
+)
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """Отвечает на POST .../chat/completions в формате OpenAI"""
+
+    # Настраиваются через make_server()
+    latency_ms = 500
+    jitter_ms = 100
+    error_rate = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"message": "invalid json"}})
+            return
+
+        # Имитируем время генерации ответа
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000.0
+        time.sleep(delay)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self._send(500, {"error": {"message": "fake upstream error"}})
+            return
+
+        prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        prompt_tokens = max(1, prompt_chars // 4)
+        completion_tokens = max(1, len(FAKE_ADVICE) // 4)
+
+        self._send(200, {
+            "id": f"chatcmpl-fake-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "deepseek-chat"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": FAKE_ADVICE},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _send(self, status, data):
+        raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        # Не засоряем вывод нагрузочного теста
+        pass
+
+
+def make_server(host="127.0.0.1", port=0, latency_ms=500, jitter_ms=100, error_rate=0.0):
+    """Создаёт сервер (port=0 — выбрать свободный порт)"""
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,), {
+        "latency_ms": latency_ms,
+        "jitter_ms": jitter_ms,
+        "error_rate": error_rate,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Запускает сервер в фоновом потоке, возвращает (server, base_url)"""
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка LLM API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"🤖 Fake LLM слушает http://{args.host}:{args.port} (задержка ~{args.latency_ms:.0f} мс)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
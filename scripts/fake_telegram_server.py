@@ -0,0 +1,188 @@
+"""
+Локальная заглушка Telegram Bot API для офлайн-проверки бота (app/telegram_bot.py)
+Запуск: python scripts/fake_telegram_server.py --port 8766
+
+Бот переключается на неё переменными окружения:
+TELEGRAM_API_URL=http://127.0.0.1:8766 TELEGRAM_BOT_TOKEN=fake flask telegram-bot
+
+Кроме методов бота (getMe, getUpdates, sendMessage, ...), есть служебные:
+POST /test/send {"chat_id": 1, "text": "кафе 450"} — сообщение «от пользователя»,
+GET /test/sent — что бот отправил в ответ
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+BOT = {"id": 1000000, "is_bot": True, "first_name": "Family Budget", "username": "family_budget_fake_bot"}
+
+
+class FakeTelegramState:
+    """Очередь обновлений для бота и отправленные им сообщения"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.updates = []
+        self.sent = []
+        self.next_update_id = 1
+        self.next_message_id = 1
+
+    def push(self, chat_id, text):
+        """Сообщение пользователя chat_id боту; возвращает update_id"""
+        with self.cond:
+            message = {
+                "message_id": self.next_message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+                "text": text,
+            }
+            if text.startswith("/"):
+                command = text.split()[0]
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+            update = {"update_id": self.next_update_id, "message": message}
+            self.next_update_id += 1
+            self.next_message_id += 1
+            self.updates.append(update)
+            self.cond.notify_all()
+            return update["update_id"]
+
+    def get_updates(self, offset, timeout):
+        """Long polling: ждёт до timeout секунд, пока не появятся обновления с id >= offset"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            # offset подтверждает всё, что раньше
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self.cond.wait(left)
+            return list(self.updates)
+
+    def send(self, chat_id, text):
+        with self.cond:
+            message = {
+                "message_id": self.next_message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT,
+                "text": text,
+            }
+            self.next_message_id += 1
+            self.sent.append(message)
+            self.cond.notify_all()
+            return message
+
+    def wait_sent(self, count, timeout=10):
+        """Ждёт, пока бот отправит count сообщений; возвращает все отправленные"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while len(self.sent) < count and time.monotonic() < deadline:
+                self.cond.wait(deadline - time.monotonic())
+            return list(self.sent)
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """Отвечает на /bot<токен>/<метод> в формате Bot API"""
+
+    state = None  # FakeTelegramState, задаётся в make_server()
+    # keep-alive: бот держит пул соединений, а не открывает новое на каждый ответ
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/test/sent":
+            self._send(200, self.state.sent)
+            return
+        self._method(self._params())
+
+    def do_POST(self):
+        params = self._params()
+        if self.path.rstrip("/") == "/test/send":
+            self._send(200, {"update_id": self.state.push(int(params["chat_id"]), params["text"])})
+            return
+        self._method(params)
+
+    def _params(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        if not body:
+            return {}
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(body)
+        # python-telegram-bot шлёт форму, вложенные значения — строками JSON
+        return {key: values[0] for key, values in parse_qs(body).items()}
+
+    def _method(self, params):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            self._send(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            return
+        method = parts[1].lower()
+
+        if method == "getme":
+            result = BOT
+        elif method == "getupdates":
+            result = self.state.get_updates(int(params.get("offset") or 0), float(params.get("timeout") or 0))
+        elif method == "sendmessage":
+            result = self.state.send(int(params["chat_id"]), params["text"])
+        elif method in ("deletewebhook", "setmycommands", "close", "logout"):
+            result = True
+        elif method == "getwebhookinfo":
+            result = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        else:
+            self._send(404, {"ok": False, "error_code": 404, "description": f"Method {parts[1]} not found"})
+            return
+        self._send(200, {"ok": True, "result": result})
+
+    def _send(self, status, data):
+        raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    # очередь подключений больше стандартных 5: бот открывает десятки соединений разом
+    request_queue_size = 128
+
+
+def make_server(host="127.0.0.1", port=0):
+    """Создаёт сервер (port=0 — выбрать свободный порт); состояние — server.state"""
+    state = FakeTelegramState()
+    handler = type("ConfiguredFakeTelegramHandler", (FakeTelegramHandler,), {"state": state})
+    server = _Server((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Запускает сервер в фоновом потоке, возвращает (server, base_url)"""
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port)
+    print(f"📨 Fake Telegram слушает http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
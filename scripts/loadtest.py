@@ -0,0 +1,353 @@
+"""
+Нагрузочный тест: поднимает gunicorn с run:app и заглушку LLM,
+гоняет конкурентных «пользователей» и печатает пропускную способность,
+p50/p95/p99 по маршрутам и долю ошибок.
+
+Запуск:
+    python scripts/loadtest.py --users 30 --duration 60 --workers 4
+    python scripts/loadtest.py --url http://127.0.0.1:8000 --llm-latency-ms 0   # уже запущенный сервер
+
+Смесь операций задаётся так: --mix dashboard=50,add=30,login=10,simulator=10
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_llm_server import start_in_thread  # noqa: E402
+
+DEFAULT_MIX = "dashboard=50,add=30,login=10,simulator=10"
+PASSWORD = "LoadTest1!"
+CATEGORIES = ["Продукты", "Кафе", "Транспорт", "Развлечения", "Жильё", "Здоровье"]
+INCOME_CATEGORIES = ["Зарплата", "Подработка"]
+
+
+# ---------- СБОР СТАТИСТИКИ ----------
+
+class Stats:
+    """Потокобезопасный сборщик задержек и ошибок по маршрутам"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route, seconds, status):
+        ok = status is not None and status < 400
+        with self.lock:
+            self.latencies[route].append(seconds)
+            self.statuses[route][status or "exc"] += 1
+            if not ok:
+                self.errors[route] += 1
+
+
+def percentile(sorted_values, p):
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def build_report(stats, elapsed):
+    routes = {}
+    total = 0
+    total_errors = 0
+    for route, values in sorted(stats.latencies.items()):
+        values = sorted(values)
+        n = len(values)
+        errors = stats.errors.get(route, 0)
+        total += n
+        total_errors += errors
+        routes[route] = {
+            "requests": n,
+            "rps": n / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000 if values else 0.0,
+            "error_rate": errors / n if n else 0.0,
+            "statuses": {str(k): v for k, v in stats.statuses[route].items()},
+        }
+    return {
+        "elapsed_s": elapsed,
+        "requests": total,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "error_rate": total_errors / total if total else 0.0,
+        "routes": routes,
+    }
+
+
+def print_report(report):
+    print()
+    print(f"Длительность: {report['elapsed_s']:.1f} с, запросов: {report['requests']}, "
+          f"пропускная способность: {report['throughput_rps']:.1f} req/s, "
+          f"ошибок: {report['error_rate'] * 100:.2f}%")
+    print()
+    header = f"{'маршрут':<14}{'запросов':>10}{'req/s':>9}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}{'ошибки':>9}"
+    print(header)
+    print("-" * len(header))
+    for route, r in report["routes"].items():
+        print(f"{route:<14}{r['requests']:>10}{r['rps']:>9.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}{r['error_rate'] * 100:>8.2f}%")
+
+
+# ---------- СИМУЛИРУЕМЫЙ ПОЛЬЗОВАТЕЛЬ ----------
+
+class VirtualUser:
+    def __init__(self, base_url, stats, rng, think_ms):
+        self.base_url = base_url
+        self.stats = stats
+        self.rng = rng
+        self.think_ms = think_ms
+        self.email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        self.client = httpx.Client(base_url=base_url, timeout=60.0, follow_redirects=False)
+
+    def request(self, route, method, path, **kwargs):
+        started = time.perf_counter()
+        status = None
+        try:
+            response = self.client.request(method, path, **kwargs)
+            status = response.status_code
+            return response
+        except httpx.HTTPError:
+            return None
+        finally:
+            self.stats.record(route, time.perf_counter() - started, status)
+
+    # --- подготовка ---
+
+    def register(self):
+        self.request("register", "POST", "/auth/register", data={
+            "name": "Нагрузка",
+            "email": self.email,
+            "password": PASSWORD,
+            "confirm_password": PASSWORD,
+        })
+
+    def create_family(self):
+        self.request("family", "POST", "/family/manage", data={"name": f"Семья {self.email[5:11]}"})
+        page = self.request("family", "GET", "/family/manage")
+        if page is None:
+            return None
+        match = re.search(r'value="([0-9A-F]{8})" readonly', page.text)
+        return match.group(1) if match else None
+
+    def join_family(self, code):
+        self.request("family", "POST", "/family/join", data={"invite_code": code})
+
+    # --- сценарии смеси ---
+
+    def dashboard(self):
+        self.request("dashboard", "GET", "/app/dashboard")
+
+    def add(self):
+        if self.rng.random() < 0.15:
+            ttype, category = "income", self.rng.choice(INCOME_CATEGORIES)
+            amount = self.rng.randint(20000, 150000)
+        else:
+            ttype, category = "expense", self.rng.choice(CATEGORIES)
+            amount = round(self.rng.lognormvariate(7, 1), 2)
+        self.request("add", "POST", "/app/add", data={
+            "type": ttype,
+            "amount": str(amount),
+            "category": category,
+            "description": "нагрузочный тест",
+        })
+
+    def login(self):
+        self.client.cookies.clear()
+        self.request("login", "POST", "/auth/login", data={"email": self.email, "password": PASSWORD})
+
+    def simulator(self):
+        self.request("simulator", "POST", "/analysis/simulator/gpt", data={
+            "reduce_category": self.rng.choice(CATEGORIES),
+            "reduce_percent": str(self.rng.choice([10, 20, 30])),
+            "increase_income": str(self.rng.choice([0, 5000, 10000])),
+            "simulation_months": "6",
+        })
+
+    def stats_page(self):
+        self.request("stats", "GET", "/analysis/stats")
+
+    def smart(self):
+        self.request("smart", "GET", "/analysis/smart")
+
+    ACTIONS = {
+        "dashboard": dashboard,
+        "add": add,
+        "login": login,
+        "simulator": simulator,
+        "stats": stats_page,
+        "smart": smart,
+    }
+
+    def run(self, mix, deadline):
+        names = list(mix)
+        weights = [mix[n] for n in names]
+        while time.monotonic() < deadline:
+            action = self.rng.choices(names, weights)[0]
+            self.ACTIONS[action](self)
+            if self.think_ms:
+                time.sleep(self.rng.expovariate(1000.0 / self.think_ms))
+
+
+# ---------- ЗАПУСК СЕРВЕРА ----------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + "/", timeout=2).status_code < 500:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def start_gunicorn(args, env):
+    port = free_port()
+    # Таблицы создаём заранее, чтобы воркеры не гонялись за create_all()
+    subprocess.run([sys.executable, "-c", "from app import create_app; create_app()"],
+                   cwd=ROOT, env=env, check=True)
+    cmd = [
+        sys.executable, "-m", "gunicorn",
+        "-w", str(args.workers),
+        "-k", args.worker_class,
+        "--threads", str(args.threads),
+        "-b", f"127.0.0.1:{port}",
+        "--timeout", "120",
+        "--log-level", "warning",
+        "run:app",
+    ]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    if not wait_ready(base_url):
+        proc.terminate()
+        raise SystemExit("❌ gunicorn не запустился за 30 секунд")
+    return proc, base_url
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in VirtualUser.ACTIONS:
+            raise SystemExit(f"❌ Неизвестное действие в --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест Family Budget")
+    parser.add_argument("--users", type=int, default=20, help="число одновременных пользователей")
+    parser.add_argument("--duration", type=float, default=30, help="длительность, секунд")
+    parser.add_argument("--family-size", type=int, default=3, help="пользователей в одной семье")
+    parser.add_argument("--think-ms", type=float, default=200, help="средняя пауза между действиями")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--workers", type=int, default=2, help="воркеров gunicorn")
+    parser.add_argument("--worker-class", default="sync")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--url", help="не запускать gunicorn, а нагружать уже работающий сервер")
+    parser.add_argument("--database-url", help="по умолчанию — временный SQLite-файл")
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", dest="json_path", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+
+    llm_server, llm_url = start_in_thread(
+        latency_ms=args.llm_latency_ms,
+        jitter_ms=args.llm_jitter_ms,
+        error_rate=args.llm_error_rate,
+    )
+
+    proc = None
+    tmpdir = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="fb-load-")
+        env = dict(os.environ)
+        env.update({
+            "DATABASE_URL": args.database_url or "sqlite:///" + os.path.join(tmpdir, "load.db"),
+            "DEEPSEEK_BASE_URL": llm_url,
+            "DEEPSEEK_API_KEY": "fake",
+            "LOGIN_RATE_LIMIT_ENABLED": "0",
+        })
+        proc, base_url = start_gunicorn(args, env)
+
+    print(f"🚀 {args.users} пользователей → {base_url} на {args.duration:.0f} с "
+          f"(LLM ~{args.llm_latency_ms:.0f} мс, смесь: {args.mix})")
+
+    try:
+        stats = Stats()
+        users = [VirtualUser(base_url, stats, random.Random(rng.random()), args.think_ms)
+                 for _ in range(args.users)]
+
+        # Регистрация и рассадка по семьям не попадают в замер
+        for i in range(0, len(users), max(1, args.family_size)):
+            group = users[i:i + args.family_size]
+            for u in group:
+                u.register()
+            code = group[0].create_family() if len(group) > 1 else None
+            if code:
+                for u in group[1:]:
+                    u.join_family(code)
+
+        stats = Stats()
+        for u in users:
+            u.stats = stats
+
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = [threading.Thread(target=u.run, args=(mix, deadline)) for u in users]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+
+        report = build_report(stats, elapsed)
+        print_report(report)
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=2)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        llm_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
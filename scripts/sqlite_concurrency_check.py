@@ -0,0 +1,139 @@
+"""
+Проверка конкурентного доступа к SQLite: стандартный профиль против ProductionConfig
+Запуск: python scripts/sqlite_concurrency_check.py
+
+1) Писатель держит эксклюзивную блокировку hold секунд, читатели в это
+   время делают SELECT — меряем их максимальную задержку.
+   В режиме rollback journal читатели ждут писателя, в WAL — нет.
+2) Несколько потоков одновременно добавляют операции через run_with_retry —
+   считаем, сколько записей не прошло из-за «database is locked».
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import text  # noqa: E402
+
+import config  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.database import run_with_retry  # noqa: E402
+from app.models import User, Transaction  # noqa: E402
+
+
+def make_app(base, path):
+    cfg = type(base.__name__ + "Check", (base,), {
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + path,
+        "METRICS_DIR": None,
+    })
+    app = create_app(cfg)
+    with app.app_context():
+        user = User(email="check@example.com", password_hash="-", name="check")
+        db.session.add(user)
+        db.session.commit()
+        app.config["CHECK_USER_ID"] = user.id
+    return app
+
+
+def readers_vs_writer(app, hold, readers):
+    latencies = []
+    lock = threading.Lock()
+    writer_ready = threading.Event()
+    stop = threading.Event()
+
+    def writer():
+        with app.app_context():
+            raw = db.engine.raw_connection()
+            try:
+                cur = raw.cursor()
+                cur.execute("BEGIN EXCLUSIVE")
+                cur.execute(
+                    'INSERT INTO "transaction" (user_id, type, amount_minor, category) VALUES (?, ?, ?, ?)',
+                    (app.config["CHECK_USER_ID"], "expense", 100, "check"),
+                )
+                writer_ready.set()
+                time.sleep(hold)
+                raw.commit()
+            finally:
+                raw.close()
+                stop.set()
+
+    def reader():
+        writer_ready.wait()
+        with app.app_context():
+            while not stop.is_set():
+                started = time.perf_counter()
+                with db.engine.connect() as conn:
+                    conn.execute(text('SELECT count(*) FROM "transaction"')).scalar()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return max(latencies) if latencies else 0.0, len(latencies)
+
+
+def concurrent_writers(app, writers, per_writer):
+    failures = []
+    lock = threading.Lock()
+
+    def worker():
+        with app.app_context():
+            for _ in range(per_writer):
+                def work():
+                    t = Transaction(user_id=app.config["CHECK_USER_ID"], type="expense",
+                                    amount_minor=100, category="check")
+                    db.session.add(t)
+                    return t
+                try:
+                    run_with_retry(work)
+                except Exception as e:  # noqa: BLE001 — считаем любые отказы
+                    with lock:
+                        failures.append(str(e).splitlines()[0])
+
+    threads = [threading.Thread(target=worker) for _ in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка конкурентности SQLite")
+    parser.add_argument("--hold", type=float, default=1.0, help="сколько писатель держит блокировку, с")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--per-writer", type=int, default=50)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="fb-sqlite-")
+    for base in (config.Config, config.ProductionConfig):
+        app = make_app(base, os.path.join(tmpdir, base.__name__ + ".db"))
+        with app.app_context():
+            mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+
+        max_read, reads = readers_vs_writer(app, args.hold, args.readers)
+        elapsed, failures = concurrent_writers(app, args.writers, args.per_writer)
+        total = args.writers * args.per_writer
+
+        print(f"\n{base.__name__} (journal_mode={mode})")
+        print(f"  чтение при удержании записи {args.hold:.1f} с: max {max_read * 1000:.1f} мс, чтений: {reads}")
+        print(f"  {args.writers} писателей × {args.per_writer}: {elapsed:.2f} с, "
+              f"отказов: {len(failures)}/{total}")
+        if failures:
+            print(f"  пример ошибки: {failures[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+# клиент LLM создаётся при импорте app.ai_service
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+
+import config  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Приложение с профилем gunicorn (WAL, повторы записи) на временном файле SQLite"""
+    settings = type("TestConfig", (config.ProductionConfig,), {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "LOGIN_RATE_LIMIT_ENABLED": False,
+    })
+    app = create_app(settings)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def user(app):
+    with app.app_context():
+        u = User(email="test@example.com", password_hash="x", name="Тест")
+        db.session.add(u)
+        db.session.commit()
+        return u.id
@@ -0,0 +1,28 @@
+from app import backfill, db, ledger
+from app.database import run_with_retry
+from app.models import CategorizerToken, Transaction, User
+
+
+def test_training_wipes_model_even_without_descriptions(app, user):
+    with app.app_context():
+        u = db.session.get(User, user)
+        run_with_retry(lambda: ledger.new_transaction(u, "expense", 100, "Кафе", description="кофе с собой"))
+        assert CategorizerToken.query.count() > 0
+
+        # описаний в истории больше нет — ни одной порции, но старая модель стирается
+        Transaction.query.update({"description": None})
+        db.session.commit()
+        assert backfill.run("categorizer", restart=True) == 0
+        assert CategorizerToken.query.count() == 0
+
+
+def test_training_rebuilds_counts(app, user):
+    app.config["BACKFILL_CHUNK_SIZE"] = 2
+    with app.app_context():
+        u = db.session.get(User, user)
+        for text in ("кофе с собой", "кофе латте", "такси домой"):
+            run_with_retry(lambda: ledger.new_transaction(u, "expense", 100, "Кафе", description=text))
+        learned = {(t.token, t.count) for t in CategorizerToken.query}
+
+        assert backfill.run("categorizer", restart=True) == 3
+        assert {(t.token, t.count) for t in CategorizerToken.query} == learned
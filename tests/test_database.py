@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.database import run_with_retry
+from app.models import Transaction, User
+
+
+def _hold_write_lock(app):
+    """Отдельное соединение, взявшее блокировку записи SQLite, и вставленная им строка"""
+    path = db.engine.url.database
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(
+        'INSERT INTO "transaction" (user_id, type, amount_minor, category) VALUES (?, ?, ?, ?)',
+        (db.session.query(User.id).scalar(), "expense", 100, "Блокировка"),
+    )
+    return conn
+
+
+def test_wal_reads_do_not_wait_for_writer(app, user):
+    with app.app_context():
+        assert db.session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        writer = _hold_write_lock(app)
+        db.session.remove()
+        try:
+            started = time.monotonic()
+            with db.engine.connect() as conn:
+                count = conn.execute(text('SELECT count(*) FROM "transaction"')).scalar()
+            elapsed = time.monotonic() - started
+        finally:
+            writer.execute("COMMIT")
+            writer.close()
+
+        # читатель видит последний коммит и не ждёт busy_timeout (5 с)
+        assert count == 0
+        assert elapsed < 1
+
+
+def test_run_with_retry_recovers_from_database_locked(app, user):
+    with app.app_context():
+        u = db.session.get(User, user)
+        writer = _hold_write_lock(app)
+        db.session.remove()
+        # короткое ожидание блокировки, чтобы первая попытка получила «database is locked»
+        db.session.execute(text("PRAGMA busy_timeout = 50"))
+        threading.Timer(0.2, lambda: (writer.execute("COMMIT"), writer.close())).start()
+        attempts = []
+
+        def work():
+            attempts.append(1)
+            db.session.add(Transaction(user_id=u.id, type="expense", amount_minor=200, category="Еда"))
+
+        run_with_retry(work, retries=10, base_delay=0.05)
+
+        assert len(attempts) > 1
+        assert sorted(t.category for t in Transaction.query) == ["Блокировка", "Еда"]
+
+
+def test_run_with_retry_gives_up_on_other_errors(app):
+    with app.app_context():
+        attempts = []
+
+        def work():
+            attempts.append(1)
+            raise OperationalError("INSERT", {}, sqlite3.OperationalError("no such table: missing"))
+
+        with pytest.raises(OperationalError):
+            run_with_retry(work, retries=3, base_delay=0)
+        assert attempts == [1]
@@ -0,0 +1,61 @@
+import json
+
+from app import analytics, db, ledger, live
+from app.database import run_with_retry
+from app.models import LiveEvent, User
+
+
+def _login(app):
+    client = app.test_client()
+    client.post("/auth/register", data=dict(email="a@b.cd", password="Passw0rd!",
+                                            confirm_password="Passw0rd!", name="Ал"))
+    client.post("/auth/login", data=dict(email="a@b.cd", password="Passw0rd!"))
+    return client
+
+
+def test_event_written_in_the_same_commit(app, user):
+    with app.app_context():
+        u = db.session.get(User, user)
+        run_with_retry(lambda: ledger.new_transaction(u, "expense", 45000, "Кафе"))
+        assert LiveEvent.query.count() == 1
+
+        ledger.new_transaction(u, "expense", 100, "Кафе")
+        db.session.rollback()
+        db.session.commit()
+        assert LiveEvent.query.count() == 1
+
+
+def test_dashboard_polls_events_when_sse_is_off(app):
+    client = _login(app)
+    assert client.get("/app/live").status_code == 404
+    page = client.get("/app/dashboard").get_data(as_text=True)
+    assert "false && window.EventSource" in page and "live/events" in page
+
+    client.post("/app/add", data=dict(type="expense", amount="450", category="Кафе", description="обед"))
+    data = client.get("/app/live/events?after=0").get_json()
+    assert [e["kind"] for e in data["events"]] == ["transaction"]
+    event = data["events"][0]["data"]
+    assert event["transactions"][0]["amount"] == "450.00"
+    assert event["totals"]["expense"] == "450.00"
+    assert data["last_id"] == data["events"][0]["id"]
+    assert client.get(f"/app/live/events?after={data['last_id']}").get_json()["events"] == []
+
+
+def test_subscription_starts_after_existing_events(app, user):
+    with app.app_context():
+        u = db.session.get(User, user)
+        run_with_retry(lambda: ledger.new_transaction(u, "expense", 100, "Кафе"))
+        q = live.broker.subscribe("u1", app)
+        try:
+            assert live.broker.last_id == live.last_id() == 1
+        finally:
+            live.broker.unsubscribe("u1", q)
+
+
+def test_event_totals_match_analytics(app, user):
+    with app.app_context():
+        u = db.session.get(User, user)
+        for amount, ttype in ((45000, "expense"), (100000, "income"), (1250, "expense")):
+            run_with_retry(lambda: ledger.new_transaction(u, ttype, amount, "Кафе"))
+        event = json.loads(LiveEvent.query.order_by(LiveEvent.id.desc()).first().payload)
+        assert event["totals"] == ledger.format_totals(analytics.totals(u))
@@ -0,0 +1,21 @@
+import sys
+
+import pytest
+
+
+def test_profiler_released_after_exception(app, tmp_path):
+    app.config.update(PROFILE_SAMPLE_RATE=1.0, PROFILE_DIR=str(tmp_path / "profiles"))
+
+    @app.route("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    client = app.test_client()
+    with pytest.raises(RuntimeError):
+        client.get("/boom")
+    assert sys.getprofile() is None
+
+    # следующий запрос в том же потоке снова профилируется
+    response = client.get("/")
+    assert response.headers.get("X-Profile-Id") == response.headers["X-Request-ID"]
+    assert len(list((tmp_path / "profiles").iterdir())) == 1
@@ -0,0 +1,29 @@
+from datetime import date
+
+from app import db, recurring
+from app.database import run_with_retry
+from app.models import User
+
+
+def test_monthly_estimate_respects_until_date(app, user):
+    with app.app_context():
+        u = db.session.get(User, user)
+
+        def work():
+            recurring.create_rule(u, "income", 100000, "Зарплата", "month", date(2026, 1, 5))
+            # закончилось до прогноза
+            recurring.create_rule(u, "expense", 50000, "Аренда", "month", date(2025, 1, 1),
+                                  until_date=date(2026, 9, 1))
+            # в окне 12 месяцев остаются три списания: 1 ноября, 1 декабря, 1 января
+            recurring.create_rule(u, "expense", 12000, "Кредит", "month", date(2025, 1, 1),
+                                  until_date=date(2027, 1, 15))
+            # заканчивается после окна — полная месячная ставка
+            recurring.create_rule(u, "expense", 3000, "Связь", "month", date(2025, 1, 1),
+                                  until_date=date(2030, 1, 1))
+
+        run_with_retry(work)
+
+        assert recurring.monthly_estimate(u, today=date(2026, 10, 19)) == {
+            "income": 100000,
+            "expense": round(12000 * 3 / 12) + 3000,
+        }
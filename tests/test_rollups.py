@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from app import db, ledger, rollups
+from app.database import run_with_retry
+from app.models import MonthlyCategoryStat, User
+from app.sketch import QuantileSketch
+
+
+def _snapshot():
+    return {
+        (r.scope, r.month, r.type, r.category_id): (r.count, r.total_minor, r.min_minor, r.max_minor,
+                                                    QuantileSketch.from_bytes(r.sketch).quantile(0.5))
+        for r in MonthlyCategoryStat.query
+    }
+
+
+def test_rebuild_in_chunks_matches_write_path(app, user):
+    app.config["BACKFILL_CHUNK_SIZE"] = 7
+    app.config["BACKFILL_PAUSE"] = 0
+    with app.app_context():
+        u = db.session.get(User, user)
+
+        def work():
+            for i in range(60):
+                ledger.new_transaction(u, ("expense", "income")[i % 5 == 0], 100 + 37 * i,
+                                       ("Еда", "Кафе", "Такси")[i % 3], date=datetime(2026, 1 + i % 4, 1 + i % 27))
+
+        run_with_retry(work)
+        expected = _snapshot()
+        assert sum(count for count, *_ in expected.values()) == 60
+
+        # агрегаты, испорченные и неполные, пересчитываются с нуля
+        MonthlyCategoryStat.query.filter(MonthlyCategoryStat.type == "income").delete()
+        MonthlyCategoryStat.query.update({"count": 1})
+        db.session.commit()
+
+        assert rollups.rebuild() == 60
+        assert _snapshot() == expected
+
+        assert rollups.rebuild(f"u{user}") == 60
+        assert rollups.rebuild("u999") == 0
+        assert _snapshot() == expected
@@ -0,0 +1,65 @@
+import threading
+
+from app import db, ledger, sync
+from app.database import run_with_retry
+from app.models import Transaction, TransactionTombstone, User
+
+WRITES = 100
+
+
+def _writer(app, user_id, barrier, errors):
+    with app.app_context():
+        try:
+            user = db.session.get(User, user_id)
+            barrier.wait()
+            for i in range(WRITES):
+                run_with_retry(lambda: ledger.new_transaction(user, "expense", 100 + i, "Еда"))
+        except Exception as exc:  # noqa: BLE001 — ошибка потока проверяется в тесте
+            errors.append(exc)
+        finally:
+            db.session.remove()
+
+
+def test_concurrent_writers_get_unique_sync_seq(app, user):
+    barrier = threading.Barrier(2)
+    errors = []
+    threads = [threading.Thread(target=_writer, args=(app, user, barrier, errors)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+    with app.app_context():
+        seqs = [s for (s,) in db.session.query(Transaction.sync_seq)]
+    assert len(seqs) == 2 * WRITES
+    assert None not in seqs
+    assert len(set(seqs)) == len(seqs)
+
+
+def test_update_and_delete_take_new_numbers(app, user):
+    with app.app_context():
+        u = db.session.get(User, user)
+        first = run_with_retry(lambda: ledger.new_transaction(u, "expense", 100, "Еда"))
+        second = run_with_retry(lambda: ledger.new_transaction(u, "expense", 200, "Еда"))
+        assert second.sync_seq == first.sync_seq + 1
+
+        first.amount_minor = 150
+        db.session.commit()
+        assert first.sync_seq == second.sync_seq + 1
+
+        cursor = sync.encode_cursor(u, first.sync_seq)
+        first_id, updated_seq = first.id, first.sync_seq
+        db.session.delete(first)
+        db.session.commit()
+        tombstone = TransactionTombstone.query.filter_by(transaction_id=first_id).one()
+        assert tombstone.scope == f"u{user}"
+        assert tombstone.sync_seq == updated_seq + 1
+
+        pulled = sync.changes(u, cursor)
+        assert pulled["changes"] == []
+        assert pulled["deleted"] == [first_id]
+        assert sync.decode_cursor(u, pulled["cursor"]) == tombstone.sync_seq
+
+        third = run_with_retry(lambda: ledger.new_transaction(u, "expense", 300, "Еда"))
+        assert third.sync_seq == tombstone.sync_seq + 1
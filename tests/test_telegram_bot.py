@@ -0,0 +1,20 @@
+from app import db, ledger, telegram_bot
+from app.models import TelegramLink, Transaction
+
+
+def test_post_commit_failure_does_not_fail_saved_messages(app, user, monkeypatch):
+    with app.app_context():
+        db.session.add(TelegramLink(user_id=user, chat_id=42))
+        db.session.commit()
+
+    def broken(user, transactions):
+        raise RuntimeError("кэш недоступен")
+
+    monkeypatch.setattr(ledger, "after_commit", broken)
+    writer = telegram_bot.WriteBehind(app, interval=0.1, size=10)
+    results = writer._commit([(42, telegram_bot.parse("кафе 450 обед")), (7, telegram_bot.parse("такси 300"))])
+
+    assert results[0]["amount_minor"] == 45000 and results[0]["category"] == "Кафе"
+    assert results[1] is None
+    with app.app_context():
+        assert Transaction.query.count() == 1